@@ -0,0 +1,85 @@
+import os
+import sys
+
+from vanna.base import VannaBase
+from vanna.chromadb import ChromaDB_VectorStore
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+from llm_transport import LLMTransportError, get_transport
+from sql_streaming import StreamingSQLMixin
+from result_summary import DigestSummaryMixin
+from prompt_builder import CompactPromptMixin
+from embedding_cache import with_embedding_cache
+from sql_templates import TemplateSQLMixin
+from instrumentation import instrument
+from vector_store import NumpyVectorStore
+
+
+class LMStudioChat(VannaBase):
+    """Chat half of the Vanna classes below: LM Studio's OpenAI-compatible API through the pooled transport."""
+
+    def __init__(self, config=None):
+        self.config = config or {}
+        self.model = self.config.get('model', 'Mistral-Nemo-Instruct-2407')
+        self.transport = get_transport(self.config.get('base_url', "http://127.0.0.1:1234/v1"))
+    
+    def system_message(self, message):
+        """Format a system message for the LLM"""
+        return {"role": "system", "content": message}
+    
+    def user_message(self, message):
+        """Format a user message for the LLM"""
+        return {"role": "user", "content": message}
+    
+    def assistant_message(self, message):
+        """Format an assistant message for the LLM"""
+        return {"role": "assistant", "content": message}
+    
+    def submit_prompt(self, messages, model=None, temperature=0.0, max_tokens=4000, stream=False, **kwargs):
+        """Submit a prompt to the LLM Studio API; with stream=True, returns an iterator of tokens"""
+        model = model or self.model
+        if stream:
+            return self._stream_prompt(messages, model, temperature, max_tokens)
+        
+        try:
+            return self.transport.chat(
+                messages,
+                model=model,
+                temperature=temperature,
+                max_tokens=max_tokens
+            )
+        except LLMTransportError as e:
+            print(f"Error with LLM Studio API: {e}")
+            return "I couldn't process that request. Please check your LLM Studio server connection."
+
+    def _stream_prompt(self, messages, model, temperature, max_tokens):
+        try:
+            yield from self.transport.stream_chat(
+                messages,
+                model=model,
+                temperature=temperature,
+                max_tokens=max_tokens
+            )
+        except LLMTransportError as e:
+            print(f"Error with LLM Studio API: {e}")
+
+
+@instrument
+class LLMStudioVanna(TemplateSQLMixin, CompactPromptMixin, DigestSummaryMixin, StreamingSQLMixin, ChromaDB_VectorStore, LMStudioChat):
+    def __init__(self, config=None):
+        # Training and retrieval embeddings go through the on-disk embedding cache.
+        ChromaDB_VectorStore.__init__(self, config=with_embedding_cache(config))
+        LMStudioChat.__init__(self, config=config)
+
+
+@instrument
+class SharedIndexVanna(TemplateSQLMixin, CompactPromptMixin, DigestSummaryMixin, StreamingSQLMixin, NumpyVectorStore, LMStudioChat):
+    """
+    LLMStudioVanna on a NumpyVectorStore instead of Chroma, for the pre-forked
+    serving mode (serving.py): one writer process trains it and publishes
+    snapshots, the workers open it with read_only=True and follow them.
+    """
+
+    def __init__(self, config=None):
+        NumpyVectorStore.__init__(self, config=config)
+        LMStudioChat.__init__(self, config=config)
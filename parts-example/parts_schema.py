@@ -0,0 +1,40 @@
+# The parts database schema, kept free of other imports so data generation
+# and benchmarks can load it without the Vanna stack.
+
+PARTS_DDL = [
+    """CREATE TABLE manufacturers (
+    manufacturer_id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    country TEXT,
+    contact_email TEXT,
+    quality_rating FLOAT
+)""",
+    """CREATE TABLE distributors (
+    distributor_id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    region TEXT,
+    contact_email TEXT,
+    delivery_rating FLOAT
+)""",
+    """CREATE TABLE parts (
+    part_id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    manufacturer_id INTEGER,
+    description TEXT,
+    diameter_mm FLOAT,
+    weight_kg FLOAT,
+    material TEXT,
+    carbon_footprint_kg FLOAT,
+    price DECIMAL(10,2),
+    FOREIGN KEY (manufacturer_id) REFERENCES manufacturers(manufacturer_id)
+)""",
+    """CREATE TABLE part_distributors (
+    part_id INTEGER,
+    distributor_id INTEGER,
+    stock_quantity INTEGER,
+    lead_time_days INTEGER,
+    PRIMARY KEY (part_id, distributor_id),
+    FOREIGN KEY (part_id) REFERENCES parts(part_id),
+    FOREIGN KEY (distributor_id) REFERENCES distributors(distributor_id)
+)""",
+]
@@ -0,0 +1,323 @@
+import os
+import time
+import threading
+import traceback
+from typing import Any, Callable, List, Optional, Tuple
+
+from flask import Flask, Response
+
+from instrumentation import configure_from_env, render_prometheus
+
+# Background job workers: threads for LLM/SQLite waits, processes for pandas digests.
+JOB_THREADS = int(os.environ.get("VANNA_JOB_THREADS", 4))
+JOB_PROCESSES = int(os.environ.get("VANNA_JOB_PROCESSES", 0))
+# Serving mode: VANNA_WORKERS > 1 pre-forks that many worker processes on a
+# shared, read-only vector index that one writer process trains (serving.py).
+WORKERS = int(os.environ.get("VANNA_WORKERS", 0))
+
+
+class Warmup:
+    """
+    Runs an expensive build function (imports, vector store, training) once,
+    in a background thread. Callers can poll `state` or block in `get()`.
+    """
+
+    def __init__(self, build: Callable[[], Any]):
+        self.build = build
+        self.state = "pending"
+        self.value: Any = None
+        self.error: Optional[str] = None
+        self.started_at: Optional[float] = None
+        self.seconds: Optional[float] = None
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+
+    def start(self) -> "Warmup":
+        with self._lock:
+            if self.state != "pending":
+                return self
+            self.state = "warming"
+            self.started_at = time.monotonic()
+        threading.Thread(target=self._run, name="warmup", daemon=True).start()
+        return self
+
+    def _run(self):
+        try:
+            self.value = self.build()
+            self.state = "ready"
+        except Exception as e:
+            traceback.print_exc()
+            self.error = f"{type(e).__name__}: {e}"
+            self.state = "failed"
+        finally:
+            self.seconds = time.monotonic() - self.started_at
+            self._done.set()
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    def get(self, timeout: Optional[float] = None) -> Any:
+        self.start()
+        if not self._done.wait(timeout):
+            raise TimeoutError("Warm-up still in progress")
+        if self.error is not None:
+            raise RuntimeError(f"Warm-up failed: {self.error}")
+        return self.value
+
+    def status(self) -> dict:
+        status = {"state": self.state, "seconds": self.seconds}
+        if self.started_at is not None and self.seconds is None:
+            status["seconds"] = time.monotonic() - self.started_at
+        if self.error is not None:
+            status["error"] = self.error
+        return status
+
+
+def create_lazy_app(build_app: Callable[[], Any], warm_up: bool = True, retry_after: int = 5) -> Flask:
+    """
+    Flask app that is serving (and live) immediately while build_app() runs in
+    the background. build_app returns the real app (a VannaFlaskApp or Flask
+    app); once it is built every request is forwarded to it.
+
+    GET /healthz is liveness and always 200. GET /readyz is 200 once warm-up has
+    finished and 503 before that (with the warm-up state), so an orchestrator
+    only routes traffic to warm workers. Other requests get a 503 with
+    Retry-After until then. GET /metrics serves the per-stage span metrics and
+    LLM transport gauges in the Prometheus text format; tracing itself is
+    switched on through the environment (see instrumentation.configure_from_env).
+    """
+    configure_from_env()
+    outer = Flask(__name__)
+    warmup = Warmup(build_app)
+    outer.extensions["warmup"] = warmup
+
+    @outer.route("/healthz", methods=["GET"])
+    def healthz():
+        return {"status": "ok"}
+
+    @outer.route("/readyz", methods=["GET"])
+    def readyz():
+        return warmup.status(), 200 if warmup.ready else 503
+
+    @outer.route("/metrics", methods=["GET"])
+    def metrics():
+        # Imported here so the outer app stays cheap to import.
+        from llm_transport import transport_metrics
+
+        gauges = {
+            f'vanna_llm_{name}{{base_url="{base_url}"}}': value
+            for base_url, values in transport_metrics().items()
+            for name, value in values.items()
+        }
+        return Response(render_prometheus(gauges), mimetype="text/plain; version=0.0.4")
+
+    health_wsgi = outer.wsgi_app
+
+    def dispatch(environ, start_response):
+        if environ.get("PATH_INFO") in ("/healthz", "/readyz", "/metrics"):
+            return health_wsgi(environ, start_response)
+        warmup.start()
+        if not warmup.ready:
+            body = {"type": "error", "error": "Warming up, retry shortly", "state": warmup.state}
+            response = outer.response_class(
+                outer.json.dumps(body), status=503, mimetype="application/json",
+                headers={"Retry-After": str(retry_after)},
+            )
+            return response(environ, start_response)
+        inner = warmup.value
+        return getattr(inner, "flask_app", inner).wsgi_app(environ, start_response)
+
+    outer.wsgi_app = dispatch
+    if warm_up:
+        warmup.start()
+    return outer
+
+
+class VannaAppFactory:
+    """
+    The Flask entry points' app, parameterized by what differs between them:
+    `backends` returns the (vector store backend class, NumpyVectorStore
+    backend class for the shared index) pair and is only called on the
+    warm-up thread, so pandas, chromadb and the LLM clients stay out of the
+    module import; `config` is passed to both; the training DDL,
+    documentation and SQL are synced into the vector store, and the SQL also
+    seeds the templates. `after_build`, when given, gets each built backend
+    (e.g. to check the LLM server).
+
+    create_app() serves /healthz immediately and the Vanna app once
+    build_app() has finished. run() serves it in one process, or with
+    VANNA_WORKERS > 1 pre-forks that many workers on the shared index that
+    one writer process trains (train_shared_index()).
+    """
+
+    def __init__(
+        self,
+        backends: Callable[[], Tuple[type, type]],
+        db_path: str,
+        training_ddl: List[str],
+        training_documentation: List[str] = (),
+        training_sql: List[str] = (),
+        config: Optional[dict] = None,
+        after_build: Optional[Callable[[Any], None]] = None,
+        query_timeout: float = 30.0,
+        shared_index_path: str = "shared_index",
+        train_interval: float = 300,
+    ):
+        self.backends = backends
+        self.db_path = db_path
+        self.training_ddl = list(training_ddl)
+        self.training_documentation = list(training_documentation)
+        self.training_sql = list(training_sql)
+        self.config = dict(config or {})
+        self.after_build = after_build
+        self.query_timeout = query_timeout  # seconds any one generated query may run
+        self.shared_index_path = shared_index_path
+        self.train_interval = train_interval  # seconds between the writer's training syncs
+
+    def build_vanna(self, guard, shared_index=False):
+        from sql_executor import ReadOnlyConnectionPool
+        from sql_guard import guarded_run_sql
+        from sql_templates import SQLTemplates
+
+        backend, shared_backend = self.backends()
+        if shared_index:
+            # Serving-mode worker: follows the snapshots of the index train_shared_index() writes.
+            vn = shared_backend(config={**self.config, "path": self.shared_index_path, "read_only": True})
+        else:
+            vn = backend(config=dict(self.config))
+        if self.after_build is not None:
+            self.after_build(vn)
+        vn.connect_to_sqlite(self.db_path)
+        # Generated SQL is vetted (read-only, known tables, estimated cost) before it runs.
+        guarded_run_sql(vn, ReadOnlyConnectionPool(self.db_path, query_timeout=self.query_timeout), guard)
+        # Questions shaped like a training SQL example (same aggregate and filter
+        # columns, values the database knows) are answered without the LLM.
+        vn.template_matcher = SQLTemplates(self.db_path, self.training_sql)
+        if not shared_index:
+            self.train(vn)
+        return vn
+
+    def train(self, vn):
+        from schema_sync import sqlite_schema, sync_training
+
+        try:
+            schema_ddl = sqlite_schema(self.db_path)
+        except Exception as e:
+            print(f"Error fetching schema: {e}. Will continue with manual training.")
+            schema_ddl = []
+        # Only new or changed training items are embedded; the manifest beside the
+        # vector store remembers what was trained on earlier starts.
+        print(sync_training(
+            vn,
+            ddl=schema_ddl + self.training_ddl,
+            documentation=self.training_documentation,
+            sql=self.training_sql,
+        ))
+
+    def train_shared_index(self):
+        """
+        Serving-mode writer process: trains the shared index, publishes a snapshot
+        for the workers to switch to, and syncs again every train_interval seconds
+        so schema changes reach them without a restart.
+        """
+        _, shared_backend = self.backends()
+        vn = shared_backend(config={**self.config, "path": self.shared_index_path})
+        while True:
+            self.train(vn)
+            generation = vn.publish_snapshot()
+            if generation is not None:
+                print(f"Published index snapshot {generation}")
+            time.sleep(self.train_interval)
+
+    def maintain_database(self, workload):
+        """Planner statistics, plus the indexes and summary tables opted into with VANNA_AUTO_INDEX / VANNA_MATERIALIZE."""
+        from index_advisor import IndexAdvisor, refresh_statistics
+        from materialized import MaterializedAggregates
+
+        # Keep planner statistics current and, when VANNA_AUTO_INDEX=1, create the
+        # indexes the logged workload of generated SQL would use.
+        if os.environ.get("VANNA_AUTO_INDEX") == "1":
+            advisor = IndexAdvisor(self.db_path, workload)
+            print(f"Created indexes: {advisor.apply(advisor.recommend(min_count=2))}")
+        else:
+            refresh_statistics(self.db_path)
+
+        # Summary tables (created for hot GROUP BY aggregates when VANNA_MATERIALIZE=1)
+        # answer matching generated SQL without scanning the base tables.
+        if os.environ.get("VANNA_MATERIALIZE") == "1":
+            materializer = MaterializedAggregates(self.db_path, workload)
+            print(f"Created summaries: {materializer.apply(materializer.recommend(min_count=2))}")
+
+    def build_app(self, shared_index=False):
+        from vanna.flask import MemoryCache, VannaFlaskApp
+        from flask_routes import register_streaming_routes, register_batch_routes, register_result_routes, register_job_routes
+        from jobs import JobQueue, JobWorkers, question_handler
+        from sql_executor import ReadOnlyConnectionPool
+        from sql_guard import SQLGuard
+        from index_advisor import WorkloadLog
+        from materialized import MaterializedAggregates
+        from sql_repair import SQLRepairer
+        from shared_cache import SQLiteCache
+        from schema_sync import sqlite_schema
+
+        workload = WorkloadLog()
+        if not shared_index:
+            # In serving mode the master has done this once, before forking the workers.
+            self.maintain_database(workload)
+        materializer = MaterializedAggregates(self.db_path, workload)
+        guard = SQLGuard(self.db_path, workload=workload, materializer=materializer)
+        vn = self.build_vanna(guard, shared_index)
+        # Pre-forked workers share one cache: a follow-up request for an id can land on any of them.
+        cache = SQLiteCache(os.path.join(self.shared_index_path, "flask_cache.db")) if shared_index else MemoryCache()
+        app = VannaFlaskApp(vn, cache=cache)
+        register_streaming_routes(app, vn)
+        repairer = SQLRepairer(vn, sqlite_schema(self.db_path))
+        register_batch_routes(app, vn, self.db_path, guard=guard, query_timeout=self.query_timeout, repairer=repairer)
+        register_result_routes(app, self.db_path, guard=guard, query_timeout=self.query_timeout)
+
+        # Long-running questions go through a durable queue instead of the request thread.
+        jobs = JobQueue("jobs.db")
+        pool = ReadOnlyConnectionPool(self.db_path, size=JOB_THREADS, query_timeout=self.query_timeout)
+        JobWorkers(
+            jobs, question_handler(vn, pool, guard, repairer), threads=JOB_THREADS, processes=JOB_PROCESSES,
+            # Serving-mode workers share the queue; the master recovered it before forking.
+            recover_on_start=not shared_index,
+        ).start()
+        register_job_routes(app, jobs)
+        return app
+
+    def create_app(self, warm_up=True, shared_index=False):
+        """App factory: serves /healthz immediately and the Vanna app once build_app() has finished."""
+        return create_lazy_app(lambda: self.build_app(shared_index), warm_up=warm_up)
+
+    def prepare_serving(self):
+        """Serving mode, in the master before it forks: database maintenance and recovery of jobs a previous run left claimed."""
+        from index_advisor import WorkloadLog
+        from jobs import JobQueue
+
+        workload = WorkloadLog()
+        self.maintain_database(workload)
+        workload.close()
+        jobs = JobQueue("jobs.db")
+        jobs.recover()
+        jobs.close()
+
+    def populate_dummy_data(self, rows=50, seed=0):
+        """Creates the training DDL's tables if needed and fills them with seeded sample data when empty."""
+        from synthetic_data import generate_database
+
+        written = generate_database(self.db_path, self.training_ddl, rows, seed)
+        if written:
+            tables = ", ".join(f"`{table}`" for table in written)
+            print(f"✅ Dummy data inserted into {tables}!")
+
+    def run(self, host="0.0.0.0", port=8084, workers=WORKERS):
+        """Serve the app: one process, or pre-forked workers and a training writer when workers > 1."""
+        if workers > 1:
+            from serving import serve
+
+            self.prepare_serving()
+            serve(lambda: self.create_app(shared_index=True), workers=workers, host=host, port=port, writer=self.train_shared_index)
+        else:
+            self.create_app().run(host=host, port=port, use_reloader=False)
@@ -0,0 +1,60 @@
+from vanna.openai import OpenAI_Chat
+from vanna.chromadb import ChromaDB_VectorStore
+
+from llm_transport import LLMTransportError, get_azure_transport
+from sql_streaming import StreamingSQLMixin
+from result_summary import DigestSummaryMixin
+from prompt_builder import CompactPromptMixin
+from embedding_cache import with_embedding_cache
+from sql_templates import TemplateSQLMixin
+from instrumentation import instrument
+from vector_store import NumpyVectorStore
+
+
+class AzureOpenAIChat(OpenAI_Chat):
+    """OpenAI_Chat answering through the pooled Azure OpenAI transport."""
+
+    def __init__(self, config=None):
+        OpenAI_Chat.__init__(self, client=None, config=config)
+        self.transport = get_azure_transport(
+            endpoint="",
+            api_key="",
+            api_version="",
+            deployment=self.config.get('model', '')
+        )
+
+    def submit_prompt(self, prompt, stream=False, **kwargs):
+        if stream:
+            return self._stream_prompt(prompt)
+        try:
+            return self.transport.chat(prompt, temperature=self.temperature)
+        except LLMTransportError as e:
+            print(f"Error with Azure OpenAI API: {e}")
+            return ""
+
+    def _stream_prompt(self, prompt):
+        try:
+            yield from self.transport.stream_chat(prompt, temperature=self.temperature)
+        except LLMTransportError as e:
+            print(f"Error with Azure OpenAI API: {e}")
+
+
+@instrument
+class MyVanna(TemplateSQLMixin, CompactPromptMixin, DigestSummaryMixin, StreamingSQLMixin, ChromaDB_VectorStore, AzureOpenAIChat):
+    def __init__(self, config=None):
+        # Training and retrieval embeddings go through the on-disk embedding cache.
+        ChromaDB_VectorStore.__init__(self, config=with_embedding_cache(config))
+        AzureOpenAIChat.__init__(self, config=config)
+
+
+@instrument
+class SharedIndexVanna(TemplateSQLMixin, CompactPromptMixin, DigestSummaryMixin, StreamingSQLMixin, NumpyVectorStore, AzureOpenAIChat):
+    """
+    MyVanna on a NumpyVectorStore instead of Chroma, for the pre-forked serving
+    mode (serving.py): one writer process trains it and publishes snapshots,
+    the workers open it with read_only=True and follow them.
+    """
+
+    def __init__(self, config=None):
+        NumpyVectorStore.__init__(self, config=config)
+        AzureOpenAIChat.__init__(self, config=config)
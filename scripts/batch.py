@@ -0,0 +1,91 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional
+
+from sql_executor import DEFAULT_MAX_ROWS, ReadOnlyConnectionPool, limit_sql, prepare_sql
+
+
+def generate_sql_batch(vn, questions: List[str], max_workers: int = 8) -> List[Optional[str]]:
+    """
+    Generate SQL for many questions, in order. Uses the backend's own
+    generate_sql_batch when it has one, otherwise fans generate_sql out over a
+    bounded thread pool. A failed generation yields an Exception in its slot.
+    """
+    own = getattr(vn, "generate_sql_batch", None)
+    if own is not None:
+        return own(questions)
+    return generate_each(vn.generate_sql, questions, max_workers)
+
+
+def generate_each(generate, questions: List[str], max_workers: int = 8) -> List[Optional[str]]:
+    """generate(question) for each question on a bounded thread pool, in order; failures become Exceptions."""
+
+    def one(question):
+        try:
+            return generate(question)
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(one, questions))
+
+
+def _execute(question: str, sql, pool: ReadOnlyConnectionPool, max_rows: int, guard=None, repairer=None) -> Dict[str, Any]:
+    result: Dict[str, Any] = {"question": question, "sql": None, "columns": None, "rows": None, "error": None}
+    if isinstance(sql, Exception):
+        result["error"] = f"SQL generation failed: {sql}"
+        return result
+    sql = prepare_sql(sql or "")
+    result["sql"] = sql
+    if not sql:
+        result["error"] = "No SQL generated"
+        return result
+
+    def run(sql: str):
+        if guard is not None:
+            sql = guard.check(sql, auto_limit=False)
+        return pool.execute(limit_sql(sql, max_rows))
+
+    try:
+        if repairer is not None:
+            result["sql"], (result["columns"], result["rows"]) = repairer.run(question, sql, run)
+        else:
+            result["columns"], result["rows"] = run(sql)
+    except Exception as e:
+        result["error"] = str(e)
+    return result
+
+
+def answer_batch(
+    vn,
+    questions: List[str],
+    pool: ReadOnlyConnectionPool,
+    max_workers: int = 8,
+    max_rows: int = DEFAULT_MAX_ROWS,
+    guard=None,
+    repairer=None,
+) -> List[Dict[str, Any]]:
+    """
+    Generate and execute SQL for each question. Results keep the input order;
+    each item carries either columns/rows (at most max_rows) or an error string.
+
+    Backends with their own generate_sql_batch (e.g. server-side batched
+    completions) generate everything first; otherwise each worker generates and
+    then immediately executes its question, so SQLite work overlaps LLM waits.
+    With a SQLGuard, statements it refuses come back as errors without running;
+    with a SQLRepairer, failing statements are corrected first (and "sql" is
+    the statement that finally ran).
+    """
+    if getattr(vn, "generate_sql_batch", None) is not None:
+        sqls = vn.generate_sql_batch(questions)
+        with ThreadPoolExecutor(max_workers=pool.size) as executor:
+            return list(executor.map(lambda item: _execute(item[0], item[1], pool, max_rows, guard, repairer), zip(questions, sqls)))
+
+    def answer(question):
+        try:
+            sql = vn.generate_sql(question)
+        except Exception as e:
+            sql = e
+        return _execute(question, sql, pool, max_rows, guard, repairer)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(answer, questions))
@@ -0,0 +1,129 @@
+"""
+Import-time benchmark for the app entry points.
+
+Runs each entry point's module body under `python -X importtime` (the
+`__main__` block is skipped, so nothing is served or trained), then records the
+total and the slowest top-level imports. Results are written as JSON so they
+can be committed and compared against a previous run. An entry point that
+fails to import, in the run or in the baseline, fails the comparison.
+Modules in STUB_MODULES that are not installed (streamlit outside its own
+environment) are imported as an empty stub, so the entry point's own imports
+are still measured; such results list them under "stubbed":
+
+    python bench_importtime.py --output importtime.json
+    python bench_importtime.py --baseline importtime.json --max-regression 0.2
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+from typing import Dict, List, Any
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+ENTRY_POINTS = {
+    "vanna-ai-flask": os.path.join(HERE, "vanna-ai-flask.py"),
+    "parts-vanna-ai-flask": os.path.join(HERE, "..", "parts-example", "vanna_ai_flask.py"),
+    "streamlit-vanna": os.path.join(HERE, "streamlit-vanna.py"),
+}
+
+# UI frameworks only used inside the scripts' __main__ blocks and decorators.
+STUB_MODULES = ("streamlit",)
+
+_STUB_CODE = """
+import importlib.abc, importlib.machinery, importlib.util
+def _stub_attribute(name):
+    # st.cache_resource and friends are used as bare decorators at import time.
+    return lambda *args, **kwargs: args[0] if len(args) == 1 and callable(args[0]) and not kwargs else None
+class _StubFinder(importlib.abc.MetaPathFinder, importlib.abc.Loader):
+    names = {{name for name in {names!r} if importlib.util.find_spec(name) is None}}
+    def find_spec(self, name, path, target=None):
+        return importlib.machinery.ModuleSpec(name, self) if name in self.names else None
+    def create_module(self, spec):
+        return None
+    def exec_module(self, module):
+        module.__getattr__ = _stub_attribute
+        print(module.__name__)
+sys.meta_path.append(_StubFinder())
+"""
+
+
+def measure(path: str, repeat: int = 3) -> Dict[str, Any]:
+    """Best-of-`repeat` import time for one script, with its ten slowest top-level imports."""
+    code = (
+        f"import runpy, sys; sys.path.insert(0, {HERE!r})\n"
+        + _STUB_CODE.format(names=STUB_MODULES)
+        + f"runpy.run_path({path!r}, run_name='importtime')"
+    )
+    best: Dict[str, Any] = {}
+    for _ in range(repeat):
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", code],
+            cwd=HERE, capture_output=True, text=True,
+        )
+        modules: List[Dict[str, Any]] = []
+        for line in proc.stderr.splitlines():
+            if not line.startswith("import time:") or "cumulative" in line:
+                continue
+            _, cumulative, name = line[len("import time:"):].split("|")
+            # Top-level imports are the ones without nesting indentation.
+            if not name.startswith("  ", 1):
+                modules.append({"module": name.strip(), "us": int(cumulative)})
+        total_us = sum(m["us"] for m in modules)
+        if proc.returncode != 0:
+            error = proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else f"exit {proc.returncode}"
+            return {"error": error, "total_ms": total_us / 1000}
+        if not best or total_us < best["total_ms"] * 1000:
+            slowest = sorted(modules, key=lambda m: m["us"], reverse=True)[:10]
+            best = {"total_ms": total_us / 1000, "slowest": [{"module": m["module"], "ms": m["us"] / 1000} for m in slowest]}
+            stubbed = [name for name in proc.stdout.splitlines() if name in STUB_MODULES]
+            if stubbed:
+                best["stubbed"] = stubbed
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", help="write results to this JSON file")
+    parser.add_argument("--baseline", help="compare against a previous results file")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="allowed slowdown vs. baseline (0.2 = 20%%)")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    results = {name: measure(path, args.repeat) for name, path in ENTRY_POINTS.items()}
+    for name, result in results.items():
+        if "error" in result:
+            print(f"{name}: failed ({result['error']})")
+            continue
+        stubbed = f" (stubbed: {', '.join(result['stubbed'])})" if result.get("stubbed") else ""
+        print(f"{name}: {result['total_ms']:.1f} ms{stubbed}")
+        for m in result["slowest"][:5]:
+            print(f"    {m['ms']:8.1f} ms  {m['module']}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        failed = []
+        for name, result in results.items():
+            before = baseline.get(name, {})
+            if "error" in result:
+                failed.append(name)
+                print(f"FAILED {name}: {result['error']}")
+            elif "error" in before or "total_ms" not in before:
+                failed.append(name)
+                print(f"FAILED {name}: the baseline has no measurement ({before.get('error', 'missing')}); record a new one")
+            elif result.get("stubbed") != before.get("stubbed"):
+                print(f"SKIPPED {name}: stubbed {result.get('stubbed') or 'nothing'}, baseline stubbed {before.get('stubbed') or 'nothing'}")
+            elif result["total_ms"] > before["total_ms"] * (1 + args.max_regression):
+                failed.append(name)
+                print(f"REGRESSION {name}: {before['total_ms']:.1f} ms -> {result['total_ms']:.1f} ms")
+        sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
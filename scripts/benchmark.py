@@ -0,0 +1,282 @@
+"""
+End-to-end benchmark of the text-to-SQL pipeline against the deterministic
+stub LLM (llm_stub_server.py), on synthetic batteries/parts databases.
+
+Every request runs the same stages as the apps: prompt building (vector store
+retrieval), SQL generation, SQLite execution, the statistical digest and the
+summary completion. Reported per database size and client count: per-stage
+p50/p95/p99, throughput and peak RSS, as JSON that can be diffed between releases.
+
+    python benchmark.py --dataset batteries --rows 1000 100000 --concurrency 1 8 \\
+        --latency 0.05 --tokens-per-second 200 --output bench.json
+    python benchmark.py --baseline bench.json ...
+"""
+import os
+import sys
+import json
+import time
+import random
+import sqlite3
+import argparse
+import platform
+import resource
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "parts-example"))
+
+from llm_stub_server import StubState, start_stub_server
+from llm_studio import LLMStudioVanna
+from sql_executor import DEFAULT_MAX_ROWS, ReadOnlyConnectionPool, limit_sql, prepare_sql
+from sql_guard import SQLGuard
+from sql_repair import _CREATE_RE, SQLRepairer
+from speculative import SpeculativeSQL
+from result_summary import summarize_frame, summary_prompt
+from synthetic_data import BATTERIES_DDL, generate_database
+from parts_schema import PARTS_DDL
+
+STAGES = ("prompt", "llm_sql", "execute", "digest", "llm_summary", "total")
+
+DATASETS: Dict[str, Dict[str, Any]] = {
+    "batteries": {
+        "ddl": BATTERIES_DDL,
+        "questions": [
+            "What is the carbon footprint of all battery types?",
+            "Which battery type has the highest carbon footprint?",
+            "What is the average carbon footprint per kWh for each battery type?",
+            "List batteries with capacity above 120 kWh",
+            "How many batteries of each type are there?",
+        ],
+        "responses": [
+            "SELECT type, SUM(carbon_footprint_kg) AS total_kg FROM batteries GROUP BY type;",
+            "SELECT type, AVG(carbon_footprint_kg) AS avg_kg FROM batteries GROUP BY type ORDER BY avg_kg DESC LIMIT 1;",
+            "SELECT type, AVG(carbon_footprint_kg / capacity_kwh) AS kg_per_kwh FROM batteries GROUP BY type;",
+            "SELECT part_number, type, capacity_kwh, carbon_footprint_kg FROM batteries WHERE capacity_kwh > 120;",
+            "SELECT type, COUNT(*) AS n FROM batteries GROUP BY type;",
+        ],
+    },
+    "parts": {
+        "ddl": PARTS_DDL,
+        "questions": [
+            "What is the average price of parts for each manufacturer?",
+            "Which parts have the highest stock quantity across all distributors?",
+            "List parts made of titanium with carbon footprint under 10 kg",
+            "What is the total stock per distributor region?",
+            "Which manufacturers have the best quality rating?",
+        ],
+        "responses": [
+            "SELECT m.name, AVG(p.price) AS avg_price FROM parts p JOIN manufacturers m ON m.manufacturer_id = p.manufacturer_id GROUP BY m.name;",
+            "SELECT p.name, SUM(pd.stock_quantity) AS stock FROM parts p JOIN part_distributors pd ON pd.part_id = p.part_id GROUP BY p.part_id ORDER BY stock DESC LIMIT 20;",
+            "SELECT name, material, carbon_footprint_kg FROM parts WHERE material = 'Titanium' AND carbon_footprint_kg < 10;",
+            "SELECT d.region, SUM(pd.stock_quantity) AS stock FROM part_distributors pd JOIN distributors d ON d.distributor_id = pd.distributor_id GROUP BY d.region;",
+            "SELECT name, country, quality_rating FROM manufacturers ORDER BY quality_rating DESC LIMIT 10;",
+        ],
+    },
+}
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far (ru_maxrss is KiB on Linux, bytes on macOS)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    values = np.asarray(samples, dtype=np.float64) * 1000
+    if values.size == 0:
+        return {}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"p50_ms": round(p50, 3), "p95_ms": round(p95, 3), "p99_ms": round(p99, 3), "mean_ms": round(values.mean(), 3)}
+
+
+def answer(vn: LLMStudioVanna, pool: ReadOnlyConnectionPool, question: str, max_rows: int) -> Dict[str, float]:
+    """One end-to-end request, returning seconds spent in each stage."""
+    timings: Dict[str, float] = {}
+    start = mark = time.perf_counter()
+
+    def lap(stage):
+        nonlocal mark
+        now = time.perf_counter()
+        timings[stage] = now - mark
+        mark = now
+
+    prompt = vn.sql_prompt(question)
+    lap("prompt")
+    sql = prepare_sql(vn.speculative.generate(prompt) if vn.speculative is not None else vn.submit_prompt(prompt))
+    lap("llm_sql")
+    if not sql:
+        raise RuntimeError("No SQL generated")
+    df = pool.execute_df(limit_sql(sql, max_rows))
+    lap("execute")
+    digest = summarize_frame(df)
+    lap("digest")
+    vn.submit_prompt(summary_prompt(question, digest))
+    lap("llm_summary")
+    timings["total"] = time.perf_counter() - start
+    return timings
+
+
+def run(vn, pool, questions: List[str], requests: int, concurrency: int, max_rows: int) -> Dict[str, Any]:
+    samples: Dict[str, List[float]] = {stage: [] for stage in STAGES}
+    errors: List[str] = []
+
+    def one(i):
+        # A per-request suffix keeps every question distinct, as in real traffic.
+        question = f"{questions[i % len(questions)]} (request {i})"
+        try:
+            return answer(vn, pool, question, max_rows)
+        except Exception as e:
+            errors.append(f"{type(e).__name__}: {e}")
+            return None
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for timings in executor.map(one, range(requests)):
+            if timings:
+                for stage, seconds in timings.items():
+                    samples[stage].append(seconds)
+    elapsed = time.perf_counter() - started
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round((requests - len(errors)) / elapsed, 3),
+        "stages": {stage: percentiles(values) for stage, values in samples.items()},
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "transport": vn.transport.metrics(),
+    }
+
+
+def check_repair(vn, pool: ReadOnlyConnectionPool, ddl: List[str], question: str) -> Dict[str, int]:
+    """
+    A statement that cannot run goes through SQLRepairer, whose correction
+    must come from the LLM; exits when the backend never got the repair prompt.
+    """
+    table = _CREATE_RE.match(ddl[0]).group(1)
+    repairer = SQLRepairer(vn, ddl, path=os.path.join(tempfile.mkdtemp(prefix="bench-repair-"), "sql_cache.db"))
+    try:
+        repairer.run(question, f"SELECT no_such_column FROM {table}", pool.execute_df)
+    except Exception as e:
+        print(f"  repair check: not repaired ({type(e).__name__}: {e})")
+    finally:
+        repairer.close()
+    if repairer.stats["llm_calls"] == 0:
+        sys.exit("repair check failed: SQLRepairer did not call the LLM")
+    return dict(repairer.stats)
+
+
+def compare(baseline: Dict[str, Any], results: Dict[str, Any]):
+    """Print p50/p95 and throughput changes for runs present in both files."""
+    def key(r):
+        return (r["dataset"], r["rows"], r["concurrency"])
+
+    old = {key(r): r for r in baseline.get("runs", [])}
+    for r in results["runs"]:
+        b = old.get(key(r))
+        if b is None:
+            continue
+        print(f"{r['dataset']} rows={r['rows']} clients={r['concurrency']}: "
+              f"throughput {b['throughput_rps']} -> {r['throughput_rps']} rps")
+        for stage in STAGES:
+            before, after = b["stages"].get(stage), r["stages"].get(stage)
+            if before and after:
+                change = (after["p50_ms"] - before["p50_ms"]) / before["p50_ms"] * 100 if before["p50_ms"] else 0.0
+                print(f"    {stage:12s} p50 {before['p50_ms']:9.2f} -> {after['p50_ms']:9.2f} ms ({change:+.1f}%)"
+                      f"   p95 {before['p95_ms']:9.2f} -> {after['p95_ms']:9.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dataset", choices=sorted(DATASETS), nargs="+", default=["batteries"])
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 100000], help="database sizes (1k to 10M)")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4], help="concurrent clients per run")
+    parser.add_argument("--requests", type=int, default=50, help="requests per run")
+    parser.add_argument("--latency", type=float, default=0.05, help="stub LLM seconds before answering")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0, help="stub LLM generation rate, 0 for instant")
+    parser.add_argument("--base-url", help="benchmark a real OpenAI-compatible server instead of the stub")
+    parser.add_argument("--max-rows", type=int, default=DEFAULT_MAX_ROWS)
+    parser.add_argument("--candidates", type=int, default=1, help="speculative SQL candidates per request (see speculative.py)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--db-dir", default=tempfile.gettempdir(), help="where the synthetic databases are written")
+    parser.add_argument("--output", help="write results to this JSON file")
+    parser.add_argument("--baseline", help="print changes against a previous results file")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    results: Dict[str, Any] = {
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "baseline")},
+        "environment": {
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "builds": [],
+        "runs": [],
+    }
+
+    for dataset in args.dataset:
+        spec = DATASETS[dataset]
+        server: Optional[Any] = None
+        base_url = args.base_url
+        if base_url is None:
+            server = start_stub_server(0, StubState(
+                latency=args.latency, tokens_per_second=args.tokens_per_second, responses=spec["responses"]
+            ))
+            base_url = f"http://127.0.0.1:{server.server_port}"
+
+        cache_dir = tempfile.mkdtemp(prefix="bench-cache-")
+        vn = LLMStudioVanna(base_url=base_url, config={
+            "path": None,
+            "sql_cache_path": os.path.join(cache_dir, "sql_cache.db"),
+        })
+        vn.add_ddl_batch(spec["ddl"])
+        vn.add_question_sql_batch(list(zip(spec["questions"], spec["responses"])))
+
+        for rows in args.rows:
+            path = os.path.join(args.db_dir, f"bench_{dataset}_{rows}.db")
+            started = time.perf_counter()
+            generate_database(path, spec["ddl"], rows, args.seed, replace=True)
+            build = {"dataset": dataset, "rows": rows, "seconds": round(time.perf_counter() - started, 3),
+                     "bytes": os.path.getsize(path)}
+            results["builds"].append(build)
+            print(f"built {dataset} with {rows:,} rows in {build['seconds']:.2f} s")
+
+            pool = ReadOnlyConnectionPool(path, size=max(args.concurrency))
+            build["repair_check"] = check_repair(vn, pool, spec["ddl"], spec["questions"][0])
+            if args.candidates > 1:
+                vn.speculative = SpeculativeSQL(vn.transport, SQLGuard(path), k=args.candidates)
+            for concurrency in args.concurrency:
+                result = run(vn, pool, spec["questions"], args.requests, concurrency, args.max_rows)
+                result.update(dataset=dataset, rows=rows)
+                results["runs"].append(result)
+                total = result["stages"].get("total", {})
+                print(f"  clients={concurrency:3d} {result['throughput_rps']:8.2f} rps"
+                      f"  total p50={total.get('p50_ms', float('nan')):.1f} ms p95={total.get('p95_ms', float('nan')):.1f} ms"
+                      f"  errors={result['errors']}  peak RSS={result['peak_rss_mb']} MB")
+            pool.close()
+            if vn.speculative is not None:
+                vn.speculative.close()
+                vn.speculative.guard.close()
+                vn.speculative = None
+            os.remove(path)
+
+        if server is not None:
+            server.shutdown()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            compare(json.load(f), results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+# SQLite's default limit on host parameters is 999 before 3.32.
+_BATCH = 500
+
+
+def embedding_key(model: str, text: str) -> bytes:
+    return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).digest()[:16]
+
+
+class EmbeddingCache:
+    """
+    Content-addressed embedding store: sha256(model, text) -> float32 vector,
+    kept as BLOBs in a SQLite table behind an in-process LRU of `lru_size`
+    vectors. Lookups and inserts are batched. The table is trimmed to
+    `max_entries` by least-recent use; hits refresh their last_used stamp in
+    batches, so a read does not cost a write.
+
+    Shared by training and retrieval (and across restarts), so unchanged
+    training data and repeated questions are embedded once per model.
+    """
+
+    def __init__(self, path: str = "embedding_cache.db", max_entries: int = 200000, lru_size: int = 4096):
+        self.max_entries = max_entries
+        self.lru_size = lru_size
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._lru: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self._touched: Dict[bytes, float] = {}
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute('''
+        CREATE TABLE IF NOT EXISTS embeddings (
+            key BLOB PRIMARY KEY,
+            model TEXT,
+            vector BLOB,
+            last_used REAL
+        )
+        ''')
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self._conn.commit()
+        self._count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def _remember(self, key: bytes, vector: np.ndarray):
+        self._lru[key] = vector
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
+
+    def get_many(self, model: str, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """Cached vectors for texts, None where there is none."""
+        keys = [embedding_key(model, text) for text in texts]
+        found: Dict[bytes, np.ndarray] = {}
+        now = time.time()
+        with self._lock:
+            for key in keys:
+                if key in self._lru:
+                    self._lru.move_to_end(key)
+                    found[key] = self._lru[key]
+            missing = list({key for key in keys if key not in found})
+            for start in range(0, len(missing), _BATCH):
+                chunk = missing[start:start + _BATCH]
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({', '.join('?' for _ in chunk)})", chunk
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+                    self._remember(key, found[key])
+            for key in found:
+                self._touched[key] = now
+            if len(self._touched) >= _BATCH:
+                self._flush_touched()
+            vectors = [found.get(key) for key in keys]
+            hits = sum(v is not None for v in vectors)
+            self.hits += hits
+            self.misses += len(keys) - hits
+        return vectors
+
+    def _flush_touched(self):
+        if self._touched:
+            self._conn.executemany(
+                "UPDATE embeddings SET last_used = ? WHERE key = ?", [(t, k) for k, t in self._touched.items()]
+            )
+            self._conn.commit()
+            self._touched.clear()
+
+    def put_many(self, model: str, texts: Sequence[str], vectors: Iterable[Sequence[float]]) -> List[np.ndarray]:
+        """Stores the vectors; returns them as the (read-only, shared) float32 arrays later hits get."""
+        now = time.time()
+        rows = []
+        stored = []
+        with self._lock:
+            for text, vector in zip(texts, vectors):
+                key = embedding_key(model, text)
+                vector = np.array(vector, dtype=np.float32)
+                vector.setflags(write=False)
+                self._remember(key, vector)
+                stored.append(vector)
+                rows.append((key, model, vector.tobytes(), now))
+            cursor = self._conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (key, model, vector, last_used) VALUES (?, ?, ?, ?)", rows
+            )
+            self._count += max(cursor.rowcount, 0)
+            self._flush_touched()
+            if self._count > self.max_entries:
+                # Trim to 90% so eviction runs once per batch of inserts, not on every one.
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                    (self._count - int(self.max_entries * 0.9),),
+                )
+                self._count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            self._conn.commit()
+        return stored
+
+    def embed(self, model: str, texts: Sequence[str], compute: Callable[[List[str]], Iterable[Sequence[float]]]) -> List[np.ndarray]:
+        """Vectors for texts, calling compute() once for the distinct texts not cached yet."""
+        texts = list(texts)
+        vectors = self.get_many(model, texts)
+        fresh = list(dict.fromkeys(text for text, vector in zip(texts, vectors) if vector is None))
+        if fresh:
+            by_text = dict(zip(fresh, self.put_many(model, fresh, compute(fresh))))
+            vectors = [by_text[text] if vector is None else vector for text, vector in zip(texts, vectors)]
+        return vectors
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": self._count, "memory_entries": len(self._lru)}
+
+    def close(self):
+        with self._lock:
+            self._flush_touched()
+            self._conn.close()
+
+
+def _model_name(function) -> str:
+    name = getattr(function, "model_name", None) or getattr(function, "MODEL_NAME", None)
+    return f"{type(function).__module__}.{type(function).__name__}" + (f":{name}" if name else "")
+
+
+class CachedEmbeddingFunction:
+    """
+    A ChromaDB embedding function that goes through an EmbeddingCache. Every
+    other attribute (name(), get_config(), ...) is the wrapped function's, so
+    Chroma sees the same embedding function it persisted the collection with.
+    """
+
+    def __init__(self, function, cache: EmbeddingCache, model: Optional[str] = None):
+        self.function = function
+        self.cache = cache
+        self.model = model or _model_name(function)
+
+    def __call__(self, input: Sequence[str]) -> List[List[float]]:
+        if isinstance(input, str):
+            input = [input]
+        return [v.tolist() for v in self.cache.embed(self.model, input, self.function)]
+
+    def __getattr__(self, name):
+        return getattr(self.function, name)
+
+
+class CachedEmbedder:
+    """HashingEmbedder-compatible wrapper (embed / embed_batch / dim) for NumpyVectorStore and the SQL cache."""
+
+    def __init__(self, embedder, cache: EmbeddingCache, model: Optional[str] = None):
+        self.embedder = embedder
+        self.cache = cache
+        self.dim = embedder.dim
+        self.model = model or f"{_model_name(embedder)}:{embedder.dim}"
+
+    def embed(self, text: str) -> np.ndarray:
+        return self.cache.embed(self.model, [text], self.embedder.embed_batch)[0]
+
+    def embed_batch(self, texts: List[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return np.stack(self.cache.embed(self.model, texts, self.embedder.embed_batch))
+
+
+def with_embedding_cache(config: Optional[dict]) -> dict:
+    """
+    Config for ChromaDB_VectorStore with its embedding function (the given
+    one, or Vanna's default) wrapped in an EmbeddingCache at
+    config["embedding_cache_path"] (default embedding_cache.db; None turns
+    the cache off).
+    """
+    config = dict(config or {})
+    path = config.get("embedding_cache_path", "embedding_cache.db")
+    function = config.get("embedding_function")
+    if path is None or isinstance(function, CachedEmbeddingFunction):
+        return config
+    if function is None:
+        from vanna.chromadb.chromadb_vector import default_ef as function
+    config["embedding_function"] = CachedEmbeddingFunction(function, EmbeddingCache(path))
+    return config
@@ -0,0 +1,54 @@
+import re
+import hashlib
+from functools import lru_cache
+from typing import List, Dict, Tuple
+
+import numpy as np
+
+EMBEDDING_DIM = 384
+
+_WORD_RE = re.compile(r"[a-z0-9_]+")
+
+
+@lru_cache(maxsize=65536)
+def _feature_bucket(feature: str, dim: int) -> Tuple[int, float]:
+    digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+    value = int.from_bytes(digest, "little")
+    return value % dim, (1.0 if (value >> 63) & 1 else -1.0)
+
+
+class HashingEmbedder:
+    """Local embedding: hashed word, sub-word and character trigram features, L2-normalised."""
+
+    def __init__(self, dim: int = EMBEDDING_DIM):
+        self.dim = dim
+
+    def _features(self, text: str) -> Dict[str, float]:
+        features: Dict[str, float] = {}
+        for word in _WORD_RE.findall(text.lower()):
+            features[word] = features.get(word, 0.0) + 1.0
+            parts = [p for p in word.split("_") if p]
+            if len(parts) > 1:
+                for part in parts:
+                    features[part] = features.get(part, 0.0) + 1.0
+            for part in parts:
+                padded = f"#{part}#"
+                for i in range(len(padded) - 2):
+                    gram = "~" + padded[i:i + 3]
+                    features[gram] = features.get(gram, 0.0) + 0.25
+        return features
+
+    def embed(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature, weight in self._features(text).items():
+            bucket, sign = _feature_bucket(feature, self.dim)
+            vector[bucket] += sign * np.sqrt(weight)
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm
+        return vector
+
+    def embed_batch(self, texts: List[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return np.stack([self.embed(text) for text in texts])
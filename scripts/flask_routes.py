@@ -0,0 +1,228 @@
+import os
+import tempfile
+from typing import Optional
+
+from flask import Response, after_this_request, request, send_file, stream_with_context
+
+from sql_streaming import clean_sql, sse_event
+from sql_executor import DEFAULT_MAX_ROWS, ReadOnlyConnectionPool
+from batch import answer_batch
+
+
+def register_streaming_routes(app, vn):
+    """
+    Add streaming endpoints to a VannaFlaskApp (or its flask_app).
+
+    GET /api/v0/generate_sql_stream?question=... emits one `token` event per
+    LLM delta and a final `done` event carrying the extracted SQL.
+    """
+    flask_app = getattr(app, "flask_app", app)
+
+    @flask_app.route("/api/v0/generate_sql_stream", methods=["GET"])
+    def generate_sql_stream():
+        question = request.args.get("question")
+        if not question:
+            return {"type": "error", "error": "No question provided"}, 400
+
+        def events():
+            parts = []
+            try:
+                for token in vn.generate_sql_stream(question):
+                    parts.append(token)
+                    yield sse_event({"token": token}, event="token")
+            except Exception as e:
+                yield sse_event({"error": str(e)}, event="error")
+                return
+            yield sse_event({"sql": clean_sql("".join(parts))}, event="done")
+
+        return Response(
+            stream_with_context(events()),
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    return app
+
+
+def register_batch_routes(
+    app,
+    vn,
+    db_path: str,
+    max_questions: int = 5000,
+    max_workers: int = 8,
+    max_rows: int = DEFAULT_MAX_ROWS,
+    guard=None,
+    query_timeout: Optional[float] = None,
+    repairer=None,
+):
+    """
+    POST /api/v0/batch with {"questions": [...]} generates and runs SQL for
+    every question concurrently and returns one result per question, in order,
+    each with either columns/rows (at most max_rows) or an error. A SQLGuard
+    vets each statement first; query_timeout bounds each one's run time; a
+    SQLRepairer corrects statements that fail.
+    """
+    flask_app = getattr(app, "flask_app", app)
+    pool = ReadOnlyConnectionPool(db_path, size=max_workers, query_timeout=query_timeout)
+
+    @flask_app.route("/api/v0/batch", methods=["POST"])
+    def batch():
+        questions = (request.get_json(silent=True) or {}).get("questions")
+        if not isinstance(questions, list) or not all(isinstance(q, str) for q in questions):
+            return {"type": "error", "error": "Expected a JSON body with a list of question strings"}, 400
+        if len(questions) > max_questions:
+            return {"type": "error", "error": f"At most {max_questions} questions per batch"}, 413
+        results = answer_batch(vn, questions, pool, max_workers=max_workers, max_rows=max_rows, guard=guard, repairer=repairer)
+        return {"type": "batch", "results": results}
+
+    return app
+
+
+def register_result_routes(
+    app,
+    db_path: str,
+    default_page_size: int = 100,
+    max_page_size: int = 1000,
+    guard=None,
+    query_timeout: Optional[float] = None,
+):
+    """
+    Server-side paging and export for SQL cached by a VannaFlaskApp (looked up by id):
+
+    GET /api/v0/run_sql_page?id=...&page=0&page_size=100 returns one page of rows
+    GET /api/v0/export_parquet?id=... streams the full result as a Parquet file
+
+    With a SQLGuard, cached SQL is re-checked before it runs (paging and export
+    bound the rows themselves, so the guard never adds its own LIMIT).
+    """
+    flask_app = app.flask_app
+    pool = ReadOnlyConnectionPool(db_path, query_timeout=query_timeout)
+
+    def cached_sql():
+        id = request.args.get("id")
+        sql = app.cache.get(id=id, field="sql") if id else None
+        return id, sql
+
+    def checked(sql: str) -> str:
+        return guard.check(sql, auto_limit=False) if guard is not None else sql
+
+    @flask_app.route("/api/v0/run_sql_page", methods=["GET"])
+    def run_sql_page():
+        id, sql = cached_sql()
+        if sql is None:
+            return {"type": "error", "error": "No SQL found for that id"}, 404
+        page = max(request.args.get("page", 0, type=int), 0)
+        page_size = min(max(request.args.get("page_size", default_page_size, type=int), 1), max_page_size)
+        try:
+            df, has_more = pool.fetch_page(checked(sql), page, page_size)
+        except Exception as e:
+            return {"type": "sql_error", "error": str(e)}
+        return {
+            "type": "df_page",
+            "id": id,
+            "page": page,
+            "page_size": page_size,
+            "has_more": has_more,
+            "df": df.to_json(orient="records", date_format="iso"),
+        }
+
+    @flask_app.route("/api/v0/export_parquet", methods=["GET"])
+    def export_parquet():
+        id, sql = cached_sql()
+        if sql is None:
+            return {"type": "error", "error": "No SQL found for that id"}, 404
+        fd, path = tempfile.mkstemp(suffix=".parquet")
+        os.close(fd)
+
+        @after_this_request
+        def cleanup(response):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return response
+
+        try:
+            pool.export_parquet(checked(sql), path)
+        except ImportError as e:
+            return {"type": "error", "error": str(e)}, 501
+        except Exception as e:
+            return {"type": "sql_error", "error": str(e)}
+        return send_file(path, mimetype="application/vnd.apache.parquet", as_attachment=True, download_name=f"{id}.parquet")
+
+    return app
+
+
+def register_job_routes(app, jobs, max_wait: float = 30.0):
+    """
+    Asynchronous question answering on a JobQueue (see jobs.JobWorkers):
+
+    POST   /api/v0/jobs with {"question": ..., "summary": "llm" | "template"} returns 202 and a job id;
+           429 with Retry-After when the queue (or the X-Tenant-Id header's tenant) is full
+    GET    /api/v0/jobs/<id>?wait=10 returns the job, long-polling up to `wait` seconds for it to change
+    GET    /api/v0/jobs/<id>/events streams `state` events and a final `done`/`failed` event
+    DELETE /api/v0/jobs/<id> cancels a job that has not started
+    """
+    from jobs import FINISHED_STATES, QueueFullError
+
+    flask_app = getattr(app, "flask_app", app)
+
+    @flask_app.route("/api/v0/jobs", methods=["POST"])
+    def submit_job():
+        body = request.get_json(silent=True) or {}
+        question = body.get("question")
+        if not isinstance(question, str) or not question.strip():
+            return {"type": "error", "error": "No question provided"}, 400
+        tenant = request.headers.get("X-Tenant-Id", "default")
+        try:
+            id = jobs.submit({"question": question, "summary": body.get("summary")}, tenant=tenant)
+        except QueueFullError as e:
+            return {"type": "error", "error": str(e)}, 429, {"Retry-After": str(e.retry_after)}
+        return {"type": "job", "id": id, "state": "queued"}, 202, {"Location": f"/api/v0/jobs/{id}"}
+
+    @flask_app.route("/api/v0/jobs/<id>", methods=["GET"])
+    def get_job(id):
+        wait = min(max(request.args.get("wait", 0, type=float), 0), max_wait)
+        job = jobs.get(id)
+        if job is not None and wait:
+            job = jobs.wait(id, wait, seen_state=request.args.get("state", job["state"]))
+        if job is None:
+            return {"type": "error", "error": "No job with that id"}, 404
+        return {"type": "job", **job}
+
+    @flask_app.route("/api/v0/jobs/<id>/events", methods=["GET"])
+    def job_events(id):
+        if jobs.get(id) is None:
+            return {"type": "error", "error": "No job with that id"}, 404
+
+        def events():
+            state = None
+            while True:
+                job = jobs.wait(id, max_wait, seen_state=state)
+                if job is None:
+                    return
+                if job["state"] in FINISHED_STATES:
+                    yield sse_event({"type": "job", **job}, event="done" if job["state"] == "done" else "failed")
+                    return
+                if job["state"] != state:
+                    state = job["state"]
+                    yield sse_event({"state": state, "position": job.get("position")}, event="state")
+                else:
+                    yield ": keep-alive\n\n"
+
+        return Response(
+            stream_with_context(events()),
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    @flask_app.route("/api/v0/jobs/<id>", methods=["DELETE"])
+    def cancel_job(id):
+        if not jobs.cancel(id):
+            job = jobs.get(id)
+            if job is None:
+                return {"type": "error", "error": "No job with that id"}, 404
+            return {"type": "error", "error": f"Job is already {job['state']}"}, 409
+        return {"type": "job", "id": id, "state": "cancelled"}
+
+    return app
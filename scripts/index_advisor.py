@@ -0,0 +1,346 @@
+import re
+import time
+import sqlite3
+import argparse
+import threading
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from materialized import _quote
+from sql_executor import prepare_sql
+
+_PLAN_RE = re.compile(r"^(SCAN|SEARCH) (\S+)(.*)$")
+_EQUALITY_OPS = ("=", "==", "IN", "IS")
+_SPACE_RE = re.compile(r"\s+")
+
+
+class WorkloadLog:
+    """
+    Generated SQL that was actually run, counted per statement in a SQLite
+    table. The index advisor replays the most frequent statements.
+    """
+
+    def __init__(self, path: str = "sql_workload.db"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute('''
+        CREATE TABLE IF NOT EXISTS workload (
+            sql TEXT PRIMARY KEY,
+            count INTEGER,
+            cost REAL,
+            first_seen REAL,
+            last_seen REAL
+        )
+        ''')
+        self._conn.commit()
+
+    def record(self, sql: str, cost: Optional[float] = None):
+        sql = _SPACE_RE.sub(" ", prepare_sql(sql)).strip()
+        if not sql:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO workload VALUES (?, 1, ?, ?, ?) "
+                "ON CONFLICT(sql) DO UPDATE SET count = count + 1, cost = excluded.cost, last_seen = excluded.last_seen",
+                (sql, cost, now, now),
+            )
+            self._conn.commit()
+
+    def top(self, limit: int = 200, since: Optional[float] = None) -> List[Tuple[str, int]]:
+        """The most frequent statements, optionally only those seen after `since`."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT sql, count FROM workload WHERE last_seen >= ? ORDER BY count DESC LIMIT ?",
+                (since or 0, limit),
+            ).fetchall()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM workload")
+            self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+
+
+def refresh_statistics(db_path: str, analysis_limit: int = 1000):
+    """
+    Keep the planner's statistics fresh: a full ANALYZE when sqlite_stat1 is
+    missing, otherwise PRAGMA optimize (which re-analyzes only tables whose
+    size has drifted). analysis_limit bounds the rows sampled per index.
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute(f"PRAGMA analysis_limit={int(analysis_limit)}")
+        has_stats = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone()
+        conn.execute("PRAGMA optimize" if has_stats else "ANALYZE")
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _create_index_sql(name: str, table: str, columns, if_not_exists: bool = False) -> str:
+    exists = " IF NOT EXISTS" if if_not_exists else ""
+    return f"CREATE INDEX{exists} {_quote(name)} ON {_quote(table)} ({', '.join(_quote(c) for c in columns)})"
+
+
+class IndexAdvisor:
+    """
+    Proposes secondary indexes for a logged SQL workload.
+
+    Each statement's EXPLAIN QUERY PLAN is inspected for full table or index
+    scans and automatic (per-query, throw-away) indexes. For those tables, equality
+    predicates and join keys become the leading index columns and one range
+    predicate (or the GROUP BY / ORDER BY columns) follows. The other columns
+    the query reads are appended while the index stays within `max_columns`,
+    making it covering. Each candidate is tried on an in-memory copy of the
+    schema and statistics and kept only if the planner picks it. Nothing is
+    created unless apply() is called.
+    """
+
+    def __init__(self, db_path: str, workload: Optional[WorkloadLog] = None, min_rows: int = 1000, max_columns: int = 4):
+        self.db_path = db_path
+        self.workload = workload
+        self.min_rows = min_rows
+        self.max_columns = max_columns
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True)
+
+    def _sandbox(self, conn: sqlite3.Connection) -> Tuple[sqlite3.Connection, Dict[str, List[str]], Dict[str, int]]:
+        """In-memory copy of the schema, its indexes and planner statistics (no rows)."""
+        sandbox = sqlite3.connect(":memory:")
+        for (sql,) in conn.execute(
+            "SELECT sql FROM sqlite_master WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite_%' "
+            "ORDER BY type = 'table' DESC, type = 'index' DESC"
+        ):
+            sandbox.execute(sql)
+        tables = [name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'")]
+        columns = {}
+        for table in tables:
+            info = conn.execute(f"PRAGMA table_info({_quote(table)})").fetchall()
+            keys = [row for row in info if row[5]]
+            # An INTEGER PRIMARY KEY is the rowid itself; indexing it again never helps.
+            rowid = keys[0][1] if len(keys) == 1 and keys[0][2].upper() == "INTEGER" else None
+            columns[table.lower()] = [row[1] for row in info if row[1] != rowid]
+        stats: List[Tuple[str, Optional[str], str]] = []
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone():
+            stats = conn.execute("SELECT tbl, idx, stat FROM sqlite_stat1").fetchall()
+        rows = {}
+        analyzed = {tbl.lower() for tbl, _, _ in stats}
+        for table in tables:
+            if table.lower() in analyzed:
+                stat = next(s for tbl, _, s in stats if tbl.lower() == table.lower())
+                rows[table.lower()] = int(stat.split()[0])
+            else:
+                rows[table.lower()] = conn.execute(f"SELECT MAX(rowid) FROM {_quote(table)}").fetchone()[0] or 0
+                stats.append((table, None, str(rows[table.lower()])))
+        # sqlite_stat1 only exists after ANALYZE; the planner reloads it on "ANALYZE sqlite_schema".
+        sandbox.execute("ANALYZE")
+        sandbox.execute("DELETE FROM sqlite_stat1")
+        sandbox.executemany("INSERT INTO sqlite_stat1 VALUES (?, ?, ?)", stats)
+        sandbox.execute("ANALYZE sqlite_schema")
+        return sandbox, columns, rows
+
+    @staticmethod
+    def _plan(conn: sqlite3.Connection, sql: str) -> List[str]:
+        return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}")]
+
+    @staticmethod
+    def _aliases(sql: str, tables: Set[str]) -> Dict[str, str]:
+        aliases = {t: t for t in tables}
+        for table in tables:
+            for alias in re.findall(rf'\b(?:FROM|JOIN|,)\s*"?{re.escape(table)}"?\s+(?:AS\s+)?"?(\w+)"?', sql, re.IGNORECASE):
+                if alias.upper() not in ("WHERE", "JOIN", "ON", "INNER", "LEFT", "CROSS", "GROUP", "ORDER", "LIMIT", "USING", "NATURAL"):
+                    aliases[alias.lower()] = table
+        return aliases
+
+    def _column_refs(self, sql: str, table: str, aliases: Dict[str, str], columns: Dict[str, List[str]]) -> Dict[str, Any]:
+        """Equality, range and grouping columns of `table` referenced by the statement."""
+        own = {c.lower(): c for c in columns[table]}
+        others = {c.lower() for t, cols in columns.items() if t != table and t in aliases.values() for c in cols}
+        mine = [a for a, t in aliases.items() if t == table]
+
+        def resolve(qualifier: Optional[str], column: str) -> Optional[str]:
+            column = column.strip('"').lower()
+            if column not in own:
+                return None
+            if qualifier:
+                return own[column] if qualifier.strip('"').lower() in mine else None
+            return own[column] if column not in others else None
+
+        ref = r'(?:("?\w+"?)\.)?("?\w+"?)'
+        equality: List[str] = []
+        ranges: List[str] = []
+
+        def add(kind: List[str], column: Optional[str]):
+            if column and column not in equality and column not in kind:
+                kind.append(column)
+
+        for qualifier, column, op in re.findall(ref + r"\s*(==|=|<=|>=|<>|!=|<|>|\bIN\b|\bIS\b|\bBETWEEN\b|\bLIKE\b)", sql, re.IGNORECASE):
+            op = op.upper()
+            if op in ("<>", "!="):
+                continue
+            add(equality if op in _EQUALITY_OPS else ranges, resolve(qualifier, column))
+        for op, qualifier, column in re.findall(r"(==|=|<=|>=|<|>)\s*" + ref, sql):
+            add(equality if op in _EQUALITY_OPS else ranges, resolve(qualifier, column))
+        ranges = [c for c in ranges if c not in equality]
+
+        grouping: List[str] = []
+        for clause in re.findall(r"\b(?:GROUP|ORDER)\s+BY\s+(.+?)(?=\bLIMIT\b|\bHAVING\b|\bORDER\b|\)|$)", sql, re.IGNORECASE | re.DOTALL):
+            for item in clause.split(","):
+                match = re.match(r"\s*" + ref, item)
+                column = resolve(match.group(1), match.group(2)) if match else None
+                if column and column not in grouping:
+                    grouping.append(column)
+        read = [own[w] for w in dict.fromkeys(w.lower() for w in re.findall(r"\w+", sql)) if w in own and w not in others]
+        return {"equality": equality, "ranges": ranges, "grouping": grouping, "read": read}
+
+    def _candidates(self, table: str, refs: Dict[str, Any]) -> List[Tuple[str, ...]]:
+        leading = refs["equality"][: self.max_columns]
+        candidates = []
+        tails = [[r] for r in refs["ranges"][:2]] or [refs["grouping"]] or [[]]
+        for tail in tails:
+            key = tuple(leading + [c for c in tail if c not in leading])[: self.max_columns]
+            if not key:
+                continue
+            candidates.append(key)
+            covering = key + tuple(c for c in refs["read"] if c not in key)
+            if len(key) < len(covering) <= self.max_columns:
+                candidates.insert(0, covering)
+        return candidates
+
+    def analyze_query(self, sql: str, sandbox: Optional[sqlite3.Connection] = None, columns=None, rows=None) -> List[Dict[str, Any]]:
+        """Indexes the planner would use for one statement, each with the table it stops scanning."""
+        own = sandbox is None
+        if own:
+            conn = self._connect()
+            try:
+                sandbox, columns, rows = self._sandbox(conn)
+            finally:
+                conn.close()
+        try:
+            sql = prepare_sql(sql)
+            try:
+                plan = self._plan(sandbox, sql)
+            except sqlite3.Error:
+                return []
+            aliases = self._aliases(sql, set(columns))
+            targets = []
+            for detail in plan:
+                match = _PLAN_RE.match(detail)
+                if match is None:
+                    continue
+                kind, name, rest = match.groups()
+                table = aliases.get(name.lower())
+                if table is None or rows.get(table, 0) < self.min_rows:
+                    continue
+                # Full scans (of the table or of a whole index) and per-query automatic indexes.
+                if kind == "SCAN" or "AUTOMATIC" in rest:
+                    if table not in targets:
+                        targets.append(table)
+
+            found = []
+            for table in targets:
+                refs = self._column_refs(sql, table, aliases, columns)
+                for key in self._candidates(table, refs):
+                    name = f"advisor_{table}_{'_'.join(c.lower() for c in key)}"
+                    if sandbox.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (name,)).fetchone():
+                        break  # created by an earlier apply()
+                    sandbox.execute(_create_index_sql(name, table, key))
+                    try:
+                        used = any(name in detail for detail in self._plan(sandbox, sql))
+                    finally:
+                        sandbox.execute(f"DROP INDEX {_quote(name)}")
+                    if used:
+                        found.append({"table": table, "columns": key, "name": name, "rows": rows[table]})
+                        break
+            return found
+        finally:
+            if own:
+                sandbox.close()
+
+    def recommend(self, limit: int = 200, min_count: int = 1, since: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        Index proposals for the logged workload, best first. Each has the table,
+        columns, CREATE INDEX statement, the number of logged executions it
+        serves and a benefit score (executions x rows no longer scanned).
+        An index whose columns prefix another proposal's is folded into it.
+        """
+        if self.workload is None:
+            raise ValueError("IndexAdvisor needs a WorkloadLog to recommend from")
+        conn = self._connect()
+        try:
+            sandbox, columns, rows = self._sandbox(conn)
+        finally:
+            conn.close()
+
+        merged: Dict[Tuple[str, Tuple[str, ...]], Dict[str, Any]] = {}
+        try:
+            for sql, count in self.workload.top(limit, since):
+                if count < min_count:
+                    continue
+                for found in self.analyze_query(sql, sandbox, columns, rows):
+                    entry = merged.setdefault((found["table"], found["columns"]), {**found, "queries": 0, "benefit": 0})
+                    entry["queries"] += count
+                    entry["benefit"] += count * found["rows"]
+        finally:
+            sandbox.close()
+
+        by_table: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        for entry in sorted(merged.values(), key=lambda e: -len(e["columns"])):
+            wider = next((e for e in by_table[entry["table"]] if e["columns"][: len(entry["columns"])] == entry["columns"]), None)
+            if wider is not None:
+                wider["queries"] += entry["queries"]
+                wider["benefit"] += entry["benefit"]
+            else:
+                by_table[entry["table"]].append(entry)
+        proposals = [entry for entries in by_table.values() for entry in entries]
+        for entry in proposals:
+            entry["sql"] = _create_index_sql(entry["name"], entry["table"], entry["columns"], if_not_exists=True)
+        return sorted(proposals, key=lambda e: -e["benefit"])
+
+    def apply(self, proposals: Optional[List[Dict[str, Any]]] = None) -> List[str]:
+        """Create the proposed indexes (recommend() when None) and refresh statistics. Returns the index names."""
+        if proposals is None:
+            proposals = self.recommend()
+        conn = sqlite3.connect(self.db_path)
+        try:
+            for proposal in proposals:
+                conn.execute(proposal["sql"])
+            conn.commit()
+            for table in {p["table"] for p in proposals}:
+                conn.execute(f"ANALYZE {_quote(table)}")
+            conn.commit()
+        finally:
+            conn.close()
+        refresh_statistics(self.db_path)
+        return [p["name"] for p in proposals]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Propose (and optionally create) indexes for the logged SQL workload.")
+    parser.add_argument("db_path")
+    parser.add_argument("--workload", default="sql_workload.db", help="WorkloadLog database written by the SQL guard")
+    parser.add_argument("--min-count", type=int, default=2, help="ignore statements run fewer times than this")
+    parser.add_argument("--min-rows", type=int, default=1000, help="ignore scans of tables smaller than this")
+    parser.add_argument("--create", action="store_true", help="create the proposed indexes")
+    args = parser.parse_args()
+
+    advisor = IndexAdvisor(args.db_path, WorkloadLog(args.workload), min_rows=args.min_rows)
+    proposals = advisor.recommend(min_count=args.min_count)
+    for proposal in proposals:
+        print(f"{proposal['sql']};  -- {proposal['queries']} queries, benefit {proposal['benefit']:,}")
+    if not proposals:
+        print("No index would help the logged workload.")
+    if args.create and proposals:
+        print(f"Created {', '.join(advisor.apply(proposals))}")
+    elif args.create:
+        refresh_statistics(args.db_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,381 @@
+"""
+Lightweight tracing and metrics for the text-to-SQL pipeline.
+
+Stages are wrapped in spans (`with span("llm"):` or `@traced("retrieval")`)
+that record wall time plus attributes such as prompt/completion tokens, cache
+hits and row counts. Finished spans feed per-stage Prometheus histograms
+(render_prometheus(), served at /metrics), a ring buffer of recent spans and
+any configured exporters (JSON lines, OpenTelemetry).
+
+Tracing is off by default. While disabled, span() returns a shared no-op
+object and traced() functions call straight through, so the cost is one
+attribute check. Enable with enable() or VANNA_TRACING=1 (configure_from_env).
+"""
+import os
+import json
+import time
+import random
+import threading
+import functools
+import contextvars
+from collections import deque
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Numeric span attributes that are also summed into per-stage counters.
+COUNTED_ATTRIBUTES = ("prompt_tokens", "completion_tokens", "rows")
+
+
+class Span:
+    __slots__ = ("name", "attributes", "trace_id", "span_id", "parent_id", "start_time", "duration", "error")
+
+    def __init__(self, name: str, attributes: Dict[str, Any], parent: Optional["Span"] = None):
+        self.name = name
+        self.attributes = attributes
+        self.trace_id = parent.trace_id if parent is not None else f"{random.getrandbits(128):032x}"
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent.span_id if parent is not None else None
+        self.start_time = time.time()
+        self.duration: Optional[float] = None
+        self.error: Optional[str] = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_time": self.start_time,
+            "duration_ms": None if self.duration is None else round(self.duration * 1000, 3),
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def set(self, **attributes):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+_current: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("vanna_span", default=None)
+
+
+class _ActiveSpan:
+    __slots__ = ("tracer", "span", "token", "started")
+
+    def __init__(self, tracer: "Tracer", name: str, attributes: Dict[str, Any]):
+        self.tracer = tracer
+        self.span = Span(name, attributes, _current.get())
+
+    def __enter__(self) -> Span:
+        self.token = _current.set(self.span)
+        self.started = time.perf_counter()
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        self.span.duration = time.perf_counter() - self.started
+        if exc is not None:
+            self.span.error = f"{exc_type.__name__}: {exc}"
+        _current.reset(self.token)
+        self.tracer.finish(self.span)
+        return False
+
+
+class _StageStats:
+    __slots__ = ("count", "total", "errors", "buckets", "counters")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.errors = 0
+        self.buckets = [0] * len(DURATION_BUCKETS)
+        self.counters: Dict[str, float] = {}
+
+
+class Tracer:
+    def __init__(self, max_recent: int = 1000):
+        self.enabled = False
+        self.exporters: List[Any] = []
+        self.recent: deque = deque(maxlen=max_recent)
+        self._stats: Dict[str, _StageStats] = {}
+        self._lock = threading.Lock()
+
+    def span(self, name: str, **attributes):
+        if not self.enabled:
+            return NOOP_SPAN
+        return _ActiveSpan(self, name, attributes)
+
+    def finish(self, span: Span):
+        with self._lock:
+            stats = self._stats.get(span.name)
+            if stats is None:
+                stats = self._stats[span.name] = _StageStats()
+            stats.count += 1
+            stats.total += span.duration
+            if span.error is not None:
+                stats.errors += 1
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if span.duration <= bound:
+                    stats.buckets[i] += 1
+                    break
+            for key in COUNTED_ATTRIBUTES:
+                value = span.attributes.get(key)
+                if isinstance(value, (int, float)):
+                    stats.counters[key] = stats.counters.get(key, 0) + value
+            if span.attributes.get("cache_hit"):
+                stats.counters["cache_hits"] = stats.counters.get("cache_hits", 0) + 1
+            self.recent.append(span)
+        for exporter in self.exporters:
+            try:
+                exporter.export(span)
+            except Exception as e:
+                print(f"Span exporter {type(exporter).__name__} failed: {e}")
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {
+                name: {"count": s.count, "total_seconds": s.total, "errors": s.errors, **s.counters}
+                for name, s in self._stats.items()
+            }
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self.recent.clear()
+
+
+tracer = Tracer()
+
+
+def span(name: str, **attributes):
+    """Context manager timing one stage; yields the Span (or a no-op when tracing is off)."""
+    return tracer.span(name, **attributes)
+
+
+def current_span():
+    """The innermost active span, for adding attributes (token counts, cache hits) from nested code."""
+    if not tracer.enabled:
+        return NOOP_SPAN
+    return _current.get() or NOOP_SPAN
+
+
+def traced(name: str) -> Callable:
+    """Decorator wrapping every call of a function in a span."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not tracer.enabled:
+                return fn(*args, **kwargs)
+            with _ActiveSpan(tracer, name, {}):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def trace_iter(name: str, iterator: Iterable[str], **attributes) -> Iterator[str]:
+    """
+    Span covering the consumption of a token stream, with time to first token
+    and the number of chunks as completion_tokens. The span is not made
+    current, since the consumer runs between yields.
+    """
+    if not tracer.enabled:
+        return iter(iterator)
+    return _traced_iter(name, iterator, attributes)
+
+
+def _traced_iter(name: str, iterator: Iterable[str], attributes: Dict[str, Any]) -> Iterator[str]:
+    span = Span(name, attributes, _current.get())
+    started = time.perf_counter()
+    chunks = 0
+    try:
+        for chunk in iterator:
+            if chunks == 0:
+                span.set(first_token_ms=round((time.perf_counter() - started) * 1000, 3))
+            chunks += 1
+            yield chunk
+    except Exception as e:
+        span.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        span.set(completion_tokens=chunks)
+        span.duration = time.perf_counter() - started
+        tracer.finish(span)
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def render_prometheus(extra: Optional[Dict[str, float]] = None) -> str:
+    """
+    Per-stage metrics in the Prometheus text format, plus extra gauges keyed by
+    series name, which may carry labels (e.g. 'vanna_llm_in_flight{base_url="..."}').
+    """
+    with tracer._lock:
+        stats = {name: (s.count, s.total, s.errors, list(s.buckets), dict(s.counters)) for name, s in tracer._stats.items()}
+    lines = [
+        "# HELP vanna_stage_duration_seconds Time spent per pipeline stage.",
+        "# TYPE vanna_stage_duration_seconds histogram",
+    ]
+    for name, (count, total, _, buckets, _) in sorted(stats.items()):
+        cumulative = 0
+        for bound, n in zip(DURATION_BUCKETS, buckets):
+            cumulative += n
+            lines.append(f'vanna_stage_duration_seconds_bucket{{stage="{_label(name)}",le="{bound}"}} {cumulative}')
+        lines.append(f'vanna_stage_duration_seconds_bucket{{stage="{_label(name)}",le="+Inf"}} {count}')
+        lines.append(f'vanna_stage_duration_seconds_sum{{stage="{_label(name)}"}} {total}')
+        lines.append(f'vanna_stage_duration_seconds_count{{stage="{_label(name)}"}} {count}')
+    lines += ["# HELP vanna_stage_errors_total Stage calls that raised.", "# TYPE vanna_stage_errors_total counter"]
+    for name, (_, _, errors, _, _) in sorted(stats.items()):
+        lines.append(f'vanna_stage_errors_total{{stage="{_label(name)}"}} {errors}')
+    for key in COUNTED_ATTRIBUTES + ("cache_hits",):
+        lines += [f"# TYPE vanna_{key}_total counter"]
+        for name, (_, _, _, _, counters) in sorted(stats.items()):
+            if key in counters:
+                lines.append(f'vanna_{key}_total{{stage="{_label(name)}"}} {counters[key]}')
+    typed = set()
+    for key, value in sorted((extra or {}).items()):
+        metric = key.split("{", 1)[0]
+        if metric not in typed:
+            typed.add(metric)
+            lines.append(f"# TYPE {metric} gauge")
+        lines.append(f"{key} {value}")
+    return "\n".join(lines) + "\n"
+
+
+class JSONLinesExporter:
+    """Append each finished span as one JSON line (line-buffered, so tail -f works)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "a", encoding="utf-8", buffering=1)
+        self._lock = threading.Lock()
+
+    def export(self, span: Span):
+        line = json.dumps(span.to_dict(), default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+
+
+class OpenTelemetryExporter:
+    """
+    Re-emit finished spans through the OpenTelemetry API (whatever SDK and
+    exporter the process has configured). Requires opentelemetry-api.
+    """
+
+    def __init__(self, tracer_name: str = "vanna"):
+        try:
+            from opentelemetry import trace
+            from opentelemetry.trace import Status, StatusCode
+        except ImportError:
+            raise ImportError("OpenTelemetry export requires opentelemetry-api (and an SDK): `pip install opentelemetry-sdk`")
+        self._tracer = trace.get_tracer(tracer_name)
+        self._error_status = lambda message: Status(StatusCode.ERROR, message)
+
+    def export(self, span: Span):
+        start_ns = int(span.start_time * 1e9)
+        attributes = {
+            key: value for key, value in span.attributes.items() if isinstance(value, (str, bool, int, float))
+        }
+        attributes.update({"vanna.trace_id": span.trace_id, "vanna.span_id": span.span_id})
+        if span.parent_id:
+            attributes["vanna.parent_id"] = span.parent_id
+        otel_span = self._tracer.start_span(span.name, start_time=start_ns, attributes=attributes)
+        if span.error is not None:
+            otel_span.set_status(self._error_status(span.error))
+        otel_span.end(end_time=start_ns + int(span.duration * 1e9))
+
+
+def enable(exporters: Iterable[Any] = ()):
+    tracer.exporters = list(exporters)
+    tracer.enabled = True
+
+
+def disable():
+    tracer.enabled = False
+
+
+def configure_from_env():
+    """
+    VANNA_TRACING=1 turns tracing on; VANNA_TRACE_FILE=path adds a JSON-lines
+    exporter and VANNA_OTEL=1 the OpenTelemetry exporter.
+    """
+    if os.environ.get("VANNA_TRACING", "").lower() not in ("1", "true", "yes"):
+        return
+    exporters: List[Any] = []
+    if os.environ.get("VANNA_TRACE_FILE"):
+        exporters.append(JSONLinesExporter(os.environ["VANNA_TRACE_FILE"]))
+    if os.environ.get("VANNA_OTEL", "").lower() in ("1", "true", "yes"):
+        exporters.append(OpenTelemetryExporter())
+    enable(exporters)
+
+
+class TracingMixin:
+    """
+    Spans around a Vanna backend's stages: generate_sql (with the question),
+    retrieval, submit_prompt (LLM, streamed or not) and generate_summary.
+    Apply with @instrument so methods defined on the class itself are wrapped too.
+    """
+
+    def generate_sql(self, question: str, *args, **kwargs):
+        if not tracer.enabled:
+            return super().generate_sql(question, *args, **kwargs)
+        with _ActiveSpan(tracer, "generate_sql", {"question_chars": len(question)}):
+            return super().generate_sql(question, *args, **kwargs)
+
+    def generate_sql_stream(self, question: str, *args, **kwargs):
+        return trace_iter("generate_sql_stream", super().generate_sql_stream(question, *args, **kwargs))
+
+    def get_related_ddl(self, question: str, **kwargs):
+        with span("retrieval", collection="ddl") as s:
+            found = super().get_related_ddl(question, **kwargs)
+            s.set(results=len(found))
+            return found
+
+    def get_related_documentation(self, question: str, **kwargs):
+        with span("retrieval", collection="documentation") as s:
+            found = super().get_related_documentation(question, **kwargs)
+            s.set(results=len(found))
+            return found
+
+    def get_similar_question_sql(self, question: str, **kwargs):
+        with span("retrieval", collection="sql") as s:
+            found = super().get_similar_question_sql(question, **kwargs)
+            s.set(results=len(found))
+            return found
+
+    def submit_prompt(self, prompt, *args, **kwargs):
+        if kwargs.get("stream"):
+            return trace_iter("llm", super().submit_prompt(prompt, *args, **kwargs), stream=True)
+        if not tracer.enabled:
+            return super().submit_prompt(prompt, *args, **kwargs)
+        with _ActiveSpan(tracer, "llm", {"prompt_chars": len(str(prompt))}):
+            return super().submit_prompt(prompt, *args, **kwargs)
+
+    def generate_summary(self, question: str, df, **kwargs):
+        with span("summary", rows=len(df)):
+            return super().generate_summary(question, df, **kwargs)
+
+
+def instrument(cls):
+    """
+    Class decorator returning a subclass of cls with TracingMixin in front of
+    it, so every stage method (the class's own or inherited) runs in a span.
+    """
+    return type(cls.__name__, (TracingMixin, cls), {
+        "__module__": cls.__module__, "__qualname__": cls.__qualname__, "__doc__": cls.__doc__,
+    })
@@ -0,0 +1,377 @@
+import json
+import time
+import uuid
+import sqlite3
+import threading
+import traceback
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from instrumentation import span
+
+FINISHED_STATES = ("done", "failed", "cancelled")
+
+
+class QueueFullError(Exception):
+    """The job queue is at capacity (globally or for one tenant); retry later."""
+
+    def __init__(self, message: str, retry_after: int = 5):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
+
+
+class JobQueue:
+    """
+    Durable job queue in a SQLite table, so queued and running work survives
+    a restart: running jobs whose lease has expired (their worker died) are
+    handed out again, up to `max_attempts` times. A worker keeps the lease of
+    a long job with renew(); each claim is its own attempt, and only the
+    attempt that still holds the lease can complete or fail the job.
+
+    Backpressure: submit() raises QueueFullError once `max_queued` jobs are
+    waiting, or `max_queued_per_tenant` for one tenant. Fairness: claim() never
+    lets a tenant have more than `tenant_concurrency` jobs running at once,
+    so one tenant's burst cannot occupy every worker.
+    """
+
+    def __init__(
+        self,
+        path: str = "jobs.db",
+        max_queued: int = 1000,
+        max_queued_per_tenant: int = 100,
+        tenant_concurrency: int = 2,
+        lease_seconds: float = 300.0,
+        max_attempts: int = 2,
+        retention_seconds: float = 24 * 3600,
+    ):
+        self.path = path
+        self.max_queued = max_queued
+        self.max_queued_per_tenant = max_queued_per_tenant
+        self.tenant_concurrency = tenant_concurrency
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retention_seconds = retention_seconds
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute('''
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            tenant TEXT,
+            payload TEXT,
+            state TEXT,
+            result TEXT,
+            error TEXT,
+            attempts INTEGER DEFAULT 0,
+            created_at REAL,
+            started_at REAL,
+            finished_at REAL,
+            lease_until REAL
+        )
+        ''')
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_state_created ON jobs (state, created_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_state_tenant ON jobs (state, tenant)")
+
+    def submit(self, payload: Dict[str, Any], tenant: str = "default") -> str:
+        id = uuid.uuid4().hex
+        with self._lock:
+            queued, tenant_queued = self._conn.execute(
+                "SELECT COUNT(*), COUNT(CASE WHEN tenant = ? THEN 1 END) FROM jobs WHERE state = 'queued'", (tenant,)
+            ).fetchone()
+            if queued >= self.max_queued:
+                raise QueueFullError(f"Job queue is full ({queued} waiting)")
+            if tenant_queued >= self.max_queued_per_tenant:
+                raise QueueFullError(f"Too many queued jobs for tenant {tenant!r} ({tenant_queued} waiting)")
+            self._conn.execute(
+                "INSERT INTO jobs (id, tenant, payload, state, created_at) VALUES (?, ?, ?, 'queued', ?)",
+                (id, tenant, json.dumps(payload), time.time()),
+            )
+            self._changed.notify_all()
+        return id
+
+    def claim(self) -> Optional[Dict[str, Any]]:
+        """Take the oldest queued job whose tenant is under its concurrency limit (or None)."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._requeue_expired(now)
+                row = self._conn.execute(
+                    "SELECT id, tenant, payload, attempts FROM jobs AS j WHERE state = 'queued' AND "
+                    "(SELECT COUNT(*) FROM jobs AS r WHERE r.state = 'running' AND r.tenant = j.tenant) < ? "
+                    "ORDER BY created_at LIMIT 1",
+                    (self.tenant_concurrency,),
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE jobs SET state = 'running', attempts = attempts + 1, started_at = ?, lease_until = ? WHERE id = ?",
+                        (now, now + self.lease_seconds, row[0]),
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        return {"id": row[0], "tenant": row[1], "payload": json.loads(row[2]), "attempts": row[3] + 1}
+
+    def renew(self, id: str, attempts: int) -> bool:
+        """Extend the lease of a running job; False when this attempt no longer holds it."""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET lease_until = ? WHERE id = ? AND state = 'running' AND attempts = ? AND lease_until >= ?",
+                (now + self.lease_seconds, id, attempts, now),
+            )
+            return cursor.rowcount > 0
+
+    def _requeue_expired(self, now: float):
+        self._conn.execute(
+            "UPDATE jobs SET state = 'failed', error = 'Worker lost (lease expired)', finished_at = ? "
+            "WHERE state = 'running' AND lease_until < ? AND attempts >= ?",
+            (now, now, self.max_attempts),
+        )
+        self._conn.execute(
+            "UPDATE jobs SET state = 'queued', lease_until = NULL WHERE state = 'running' AND lease_until < ?",
+            (now,),
+        )
+
+    def recover(self):
+        """After a restart nothing is running: put every 'running' job back in the queue."""
+        with self._lock:
+            self._conn.execute("UPDATE jobs SET lease_until = 0 WHERE state = 'running'")
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._requeue_expired(time.time())
+            self._conn.execute("COMMIT")
+            self._changed.notify_all()
+
+    def _finish(
+        self, id: str, state: str, result: Any = None, error: Optional[str] = None, attempts: Optional[int] = None
+    ) -> bool:
+        with self._lock:
+            # With `attempts`, only the claim that still holds the lease may finish the job.
+            cursor = self._conn.execute(
+                "UPDATE jobs SET state = ?, result = ?, error = ?, finished_at = ?, lease_until = NULL "
+                "WHERE id = ? AND state = 'running' AND (? IS NULL OR attempts = ?)",
+                (state, None if result is None else json.dumps(result, default=_json_default), error, time.time(), id,
+                 attempts, attempts),
+            )
+            self._conn.execute(
+                "DELETE FROM jobs WHERE state IN ('done', 'failed', 'cancelled') AND finished_at < ?",
+                (time.time() - self.retention_seconds,),
+            )
+            self._changed.notify_all()
+            return cursor.rowcount > 0
+
+    def complete(self, id: str, result: Any, attempts: Optional[int] = None) -> bool:
+        return self._finish(id, "done", result=result, attempts=attempts)
+
+    def fail(self, id: str, error: str, attempts: Optional[int] = None) -> bool:
+        return self._finish(id, "failed", error=error, attempts=attempts)
+
+    def cancel(self, id: str) -> bool:
+        """Cancel a job that has not started yet."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET state = 'cancelled', finished_at = ? WHERE id = ? AND state = 'queued'", (time.time(), id)
+            )
+            self._changed.notify_all()
+            return cursor.rowcount > 0
+
+    def get(self, id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, tenant, state, result, error, attempts, created_at, started_at, finished_at, "
+                "(SELECT COUNT(*) FROM jobs AS q WHERE q.state = 'queued' AND q.created_at < jobs.created_at) "
+                "FROM jobs WHERE id = ?",
+                (id,),
+            ).fetchone()
+        if row is None:
+            return None
+        job = dict(zip(("id", "tenant", "state", "result", "error", "attempts", "created_at", "started_at", "finished_at"), row))
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        if job["state"] == "queued":
+            job["position"] = row[9]
+        return job
+
+    def wait(self, id: str, timeout: float, seen_state: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """The job once its state differs from seen_state (or after timeout, unchanged)."""
+        deadline = time.monotonic() + timeout
+        while True:
+            job = self.get(id)
+            if job is None or job["state"] != seen_state or job["state"] in FINISHED_STATES:
+                return job
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return job
+            with self._changed:
+                # Jobs finished by another process only show up on the next poll.
+                self._changed.wait(min(remaining, 1.0))
+
+    def wait_for_work(self, timeout: float):
+        with self._changed:
+            self._changed.wait(timeout)
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._conn.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall())
+
+    def close(self):
+        self._conn.close()
+
+
+class JobWorkers:
+    """
+    Runs queued jobs through handler(payload, post_process) on `threads`
+    worker threads (LLM calls and SQLite queries mostly wait on I/O). With
+    `processes` > 0, post_process(fn, *args) runs CPU-heavy pandas steps in a
+    process pool (spawned, so no threads are forked); otherwise inline.
+    A handler exception fails the job with its message. recover_on_start
+    requeues jobs left running by a previous run; turn it off when several
+    processes share one queue (their leases cover crashed workers instead).
+    While a handler runs, a heartbeat thread renews its job's lease every
+    `heartbeat_seconds` (a third of the lease by default), so a long job is
+    not claimed a second time; a result from an attempt that lost its lease
+    anyway is dropped.
+    """
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        handler: Callable[..., Any],
+        threads: int = 4,
+        processes: int = 0,
+        poll_seconds: float = 1.0,
+        recover_on_start: bool = True,
+        heartbeat_seconds: Optional[float] = None,
+    ):
+        self.queue = queue
+        self.recover_on_start = recover_on_start
+        self.handler = handler
+        self.threads = threads
+        self.processes = processes
+        self.poll_seconds = poll_seconds
+        self.heartbeat_seconds = heartbeat_seconds or queue.lease_seconds / 3
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._running: Dict[str, int] = {}
+        self._running_lock = threading.Lock()
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def start(self) -> "JobWorkers":
+        if self._threads:
+            return self
+        if self.recover_on_start:
+            self.queue.recover()
+        if self.processes:
+            self._pool = ProcessPoolExecutor(self.processes, mp_context=multiprocessing.get_context("spawn"))
+        for i in range(self.threads):
+            thread = threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        thread = threading.Thread(target=self._heartbeat, name="job-heartbeat", daemon=True)
+        thread.start()
+        self._threads.append(thread)
+        return self
+
+    def post_process(self, fn: Callable[..., Any], *args):
+        if self._pool is None:
+            return fn(*args)
+        return self._pool.submit(fn, *args).result()
+
+    def _heartbeat(self):
+        while not self._stop.wait(self.heartbeat_seconds):
+            with self._running_lock:
+                running = list(self._running.items())
+            for id, attempts in running:
+                if not self.queue.renew(id, attempts):
+                    print(f"Job {id} lost its lease (attempt {attempts}); its result will be dropped")
+                    with self._running_lock:
+                        self._running.pop(id, None)
+
+    def _work(self):
+        while not self._stop.is_set():
+            job = self.queue.claim()
+            if job is None:
+                self.queue.wait_for_work(self.poll_seconds)
+                continue
+            with self._running_lock:
+                self._running[job["id"]] = job["attempts"]
+            try:
+                with span("job", attempts=job["attempts"]):
+                    result = self.handler(job["payload"], self.post_process)
+            except Exception as e:
+                traceback.print_exc()
+                self.queue.fail(job["id"], f"{type(e).__name__}: {e}", attempts=job["attempts"])
+            else:
+                self.queue.complete(job["id"], result, attempts=job["attempts"])
+            finally:
+                with self._running_lock:
+                    self._running.pop(job["id"], None)
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        with self.queue._changed:
+            self.queue._changed.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+
+
+def question_handler(vn, pool, guard=None, repairer=None, max_rows: int = 1000):
+    """
+    Job handler for {"question": ..., "summary": "llm" | "template" | None}:
+    generate SQL, run it (through the guard and repairer when given), digest
+    the result in post_process and optionally summarize. The result carries
+    the SQL, columns, up to max_rows rows, the digest and the summary.
+    """
+    from result_summary import DigestSummaryMixin, SUMMARY_MAX_ROWS, summarize_frame, template_summary
+    from sql_executor import limit_sql, prepare_sql
+
+    def run(sql: str):
+        if guard is not None:
+            sql = guard.check(sql, auto_limit=False)
+        return pool.execute_df(limit_sql(sql, SUMMARY_MAX_ROWS))
+
+    def handle(payload: Dict[str, Any], post_process) -> Dict[str, Any]:
+        question = payload["question"]
+        sql = prepare_sql(vn.generate_sql(question) or "")
+        if not sql:
+            raise ValueError("No SQL generated")
+        if repairer is not None:
+            sql, df = repairer.run(question, sql, run)
+        else:
+            df = run(sql)
+        digest = post_process(summarize_frame, df)
+        summary = None
+        mode = payload.get("summary")
+        if mode == "template" or (mode and not isinstance(vn, DigestSummaryMixin)):
+            summary = template_summary(digest)
+        elif mode:
+            summary = vn.generate_summary(question, df, digest=digest)
+        head = df.head(max_rows)
+        return {
+            "sql": sql,
+            "columns": list(df.columns),
+            "rows": json.loads(head.to_json(orient="values", date_format="iso")),
+            "row_count": len(df),
+            "truncated": len(df) > max_rows,
+            "digest": digest,
+            "summary": summary,
+        }
+
+    return handle
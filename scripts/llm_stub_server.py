@@ -0,0 +1,164 @@
+"""
+Deterministic OpenAI-compatible stub server for exercising the LLM transport
+without LM Studio. Serves /v1/models, /v1/completions and /v1/chat/completions,
+including "stream": true as server-sent events.
+
+    python llm_stub_server.py --port 1234 --latency 0.2 --tokens-per-second 50
+"""
+import re
+import json
+import time
+import zlib
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional
+
+DEFAULT_RESPONSE = "SELECT type, carbon_footprint_kg FROM batteries;"
+
+_TOKEN_RE = re.compile(r"\s*\S+")
+
+
+class StubState:
+    def __init__(
+        self,
+        response: str = DEFAULT_RESPONSE,
+        latency: float = 0.0,
+        fail_first: int = 0,
+        tokens_per_second: float = 0.0,
+        responses: Optional[List[str]] = None,
+    ):
+        self.response = response
+        self.latency = latency
+        self.fail_first = fail_first
+        self.tokens_per_second = tokens_per_second
+        self.responses = responses
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def pick(self, prompt: str) -> str:
+        """The answer for a prompt: `response`, or one of `responses` chosen by a hash of the prompt."""
+        if not self.responses:
+            return self.response
+        return self.responses[zlib.crc32(prompt.encode("utf-8")) % len(self.responses)]
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are separate writes; without TCP_NODELAY keep-alive
+    # requests pick up a ~40 ms delayed-ACK stall and the latency is no longer the configured one.
+    disable_nagle_algorithm = True
+    state: StubState
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, body: dict):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _take_request(self) -> bool:
+        """Count the request; returns False while the configured failures are still pending."""
+        with self.state.lock:
+            self.state.requests += 1
+            return self.state.requests > self.state.fail_first
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/v1/models"):
+            self._send_json(200, {"object": "list", "data": [{"id": "stub-model", "object": "model"}]})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        path = self.path.split("?")[0].rstrip("/")
+        if not self._take_request():
+            self._send_json(503, {"error": "stub failure"})
+            return
+        chat = path.endswith("/chat/completions")
+        if not chat and not path.endswith("/completions"):
+            self._send_json(404, {"error": "not found"})
+            return
+        time.sleep(self.state.latency)
+        if chat:
+            prompts = [" ".join(str(m.get("content", "")) for m in payload.get("messages", []))]
+        else:
+            prompts = payload.get("prompt")
+            prompts = prompts if isinstance(prompts, list) else [str(prompts or "")]
+        texts = [self.state.pick(prompt) for prompt in prompts]
+        text = texts[0]
+        tokens = _TOKEN_RE.findall(text)
+        if payload.get("stream"):
+            self._stream(tokens, chat)
+            return
+        if self.state.tokens_per_second:
+            time.sleep(len(tokens) / self.state.tokens_per_second)
+        if chat:
+            choices = [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}]
+        else:
+            choices = [{"index": i, "text": t, "finish_reason": "stop"} for i, t in enumerate(texts)]
+        self._send_json(200, {
+            "id": f"stub-{self.state.requests}",
+            "object": "text_completion",
+            "model": payload.get("model", "stub-model"),
+            "choices": choices,
+            "usage": {"prompt_tokens": len(str(payload).split()), "completion_tokens": len(text.split())},
+        })
+
+    def _stream(self, tokens, chat: bool):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        delay = 1.0 / self.state.tokens_per_second if self.state.tokens_per_second else 0.0
+        try:
+            for token in tokens:
+                choice = {"index": 0, "delta": {"content": token}} if chat else {"index": 0, "text": token}
+                self._write_chunk(f"data: {json.dumps({'choices': [choice]})}\n\n".encode("utf-8"))
+                time.sleep(delay)
+            self._write_chunk(b"data: [DONE]\n\n")
+            self._write_chunk(b"")
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+    def _write_chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+
+def start_stub_server(port: int = 0, state: Optional[StubState] = None) -> ThreadingHTTPServer:
+    """Start the stub on a daemon thread; port 0 picks a free port (see server.server_port)."""
+    handler = type("BoundStubHandler", (StubHandler,), {"state": state or StubState()})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=1234)
+    parser.add_argument("--response", default=DEFAULT_RESPONSE)
+    parser.add_argument("--responses-file", help="JSON list of answers, one picked per prompt by hash")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds to wait before answering")
+    parser.add_argument("--fail-first", type=int, default=0, help="answer the first N requests with 503")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0, help="simulated generation rate, 0 for instant")
+    args = parser.parse_args()
+    responses = None
+    if args.responses_file:
+        with open(args.responses_file, "r", encoding="utf-8") as f:
+            responses = json.load(f)
+    server = start_stub_server(
+        args.port, StubState(args.response, args.latency, args.fail_first, args.tokens_per_second, responses)
+    )
+    print(f"Stub LLM server listening on http://127.0.0.1:{server.server_port}/v1")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
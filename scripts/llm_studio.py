@@ -0,0 +1,180 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List, Optional
+
+from vector_store import NumpyVectorStore
+from instrumentation import instrument
+from sql_cache import SemanticSQLCache
+from prompt_builder import build_sql_prompt, count_tokens, full_schema
+from llm_transport import LLMTransportError, get_transport
+from sql_streaming import clean_sql, take_sql_statement
+from sql_templates import SQLTemplates
+from speculative import SpeculativeSQL
+
+
+@instrument
+class LLMStudioVanna(NumpyVectorStore):
+    """
+    Vanna backend for a local LM Studio server: NumpyVectorStore retrieval,
+    the semantic SQL cache and the shared pooled LLMTransport. Prompts are
+    compact and token-budgeted (config prompt_token_budget, see
+    prompt_builder); subclasses customise them by overriding sql_prompt().
+    When the whole trained schema fits schema_token_budget, every prompt
+    lists all of it (see schema_ddl()), so the instructions + schema prefix
+    is the same for every question and stays in the server's prompt cache.
+    Questions that fit a template of `template_matcher` (an SQLTemplates)
+    skip the LLM. With `speculative` (a SpeculativeSQL), generate_sql() asks
+    for several candidates at once and keeps the first valid one.
+    """
+
+    template_matcher: Optional[SQLTemplates] = None
+    speculative: Optional[SpeculativeSQL] = None
+    # submit_prompt() takes a plain prompt string, not a chat message log.
+    text_prompts = True
+
+    def __init__(self, base_url="http://127.0.0.1:1234", config=None):
+        self.base_url = base_url
+        NumpyVectorStore.__init__(self, config=config)
+        self.transport = get_transport(f"{base_url}/v1")
+        self.sql_cache = SemanticSQLCache(
+            path=self.config.get("sql_cache_path", "sql_cache.db"),
+            embedder=self.embedder,
+            threshold=self.config.get("sql_cache_threshold", 0.92),
+            ttl_seconds=self.config.get("sql_cache_ttl", 24 * 3600),
+            max_entries=self.config.get("sql_cache_max_entries", 5000),
+        )
+        self._full_ddl: Optional[tuple] = None
+
+    def _call_llm_studio(self, prompt: str) -> str:
+        try:
+            return self.transport.complete(prompt, temperature=0.1, max_tokens=500)
+        except LLMTransportError as e:
+            print(f"Error calling LLM Studio: {e}")
+            return ""
+
+    async def _acall_llm_studio(self, prompt: str) -> str:
+        try:
+            return await self.transport.acomplete(prompt, temperature=0.1, max_tokens=500)
+        except LLMTransportError as e:
+            print(f"Error calling LLM Studio: {e}")
+            return ""
+
+    def _stream_llm_studio(self, prompt: str) -> Iterator[str]:
+        try:
+            yield from self.transport.stream_complete(prompt, temperature=0.1, max_tokens=500)
+        except LLMTransportError as e:
+            print(f"Error calling LLM Studio: {e}")
+
+    def schema_ddl(self, question: str) -> List[str]:
+        """
+        DDL for the prompt's schema: all trained tables when their compact
+        schema fits schema_token_budget (as PartsVanna does with PARTS_DDL),
+        otherwise the tables retrieved for the question. Documentation and
+        examples are retrieved per question either way, after the schema.
+        """
+        version = self.schema_version()
+        if self._full_ddl is None or self._full_ddl[0] != version:
+            ddl = [doc for _, doc in self.ddl_collection.items()]
+            fits = count_tokens(full_schema(ddl)) <= self.config.get("schema_token_budget", 800)
+            self._full_ddl = (version, ddl if fits else None)
+        ddl = self._full_ddl[1]
+        return ddl if ddl is not None else self.get_related_ddl(question)
+
+    def sql_prompt(self, question: str) -> str:
+        return build_sql_prompt(
+            question,
+            self.schema_ddl(question),
+            self.get_related_documentation(question),
+            self.get_similar_question_sql(question),
+            token_budget=self.config.get("prompt_token_budget", 1200),
+        )
+
+    def _cached_sql(self, question: str) -> Optional[str]:
+        if self.template_matcher is not None:
+            sql = self.template_matcher.match(question)
+            if sql is not None:
+                return sql
+        return self.sql_cache.get(question, self.schema_version())
+
+    def _cache_sql(self, question: str, sql: str):
+        if sql:
+            self.sql_cache.put(question, self.schema_version(), sql)
+
+    def generate_sql(self, question: str) -> str:
+        cached = self._cached_sql(question)
+        if cached is not None:
+            return cached
+        prompt = self.sql_prompt(question)
+        sql = self.speculative.generate(prompt) if self.speculative is not None else self.submit_prompt(prompt)
+        self._cache_sql(question, sql)
+        return sql
+
+    def generate_sql_stream(self, question: str) -> Iterator[str]:
+        """Yield SQL tokens as they arrive, stopping once the statement is complete."""
+        cached = self._cached_sql(question)
+        if cached is not None:
+            yield cached
+            return
+        parts = []
+        for token in take_sql_statement(self.submit_prompt(self.sql_prompt(question), stream=True)):
+            parts.append(token)
+            yield token
+        self._cache_sql(question, clean_sql("".join(parts)))
+
+    def generate_sql_batch(self, questions: List[str]) -> List[str]:
+        """
+        Generate SQL for many questions, preserving order. Cache hits are served
+        locally; misses go out as batched /completions requests when the server
+        supports list prompts (config "batched_completions"), otherwise across a
+        thread pool bounded by the transport's concurrency limit.
+        """
+        results: List[Optional[str]] = [self._cached_sql(question) for question in questions]
+        misses = [i for i, sql in enumerate(results) if sql is None]
+        if not misses:
+            return results
+
+        if self.config.get("batched_completions"):
+            chunk = self.config.get("batch_size", 16)
+            for start in range(0, len(misses), chunk):
+                indices = misses[start:start + chunk]
+                try:
+                    texts = self.transport.complete_batch(
+                        [self.sql_prompt(questions[i]) for i in indices], temperature=0.1, max_tokens=500
+                    )
+                except LLMTransportError as e:
+                    print(f"Error calling LLM Studio: {e}")
+                    texts = [""] * len(indices)
+                for i, sql in zip(indices, texts):
+                    results[i] = sql
+                    self._cache_sql(questions[i], sql)
+        else:
+            with ThreadPoolExecutor(max_workers=self.transport.max_concurrency) as executor:
+                for i, sql in zip(misses, executor.map(self.generate_sql, [questions[i] for i in misses])):
+                    results[i] = sql
+        return results
+
+    async def agenerate_sql(self, question: str) -> str:
+        cached = self._cached_sql(question)
+        if cached is not None:
+            return cached
+        prompt = self.sql_prompt(question)
+        if self.speculative is not None:
+            sql = await asyncio.to_thread(self.speculative.generate, prompt)
+        else:
+            sql = await self._acall_llm_studio(prompt)
+        self._cache_sql(question, sql)
+        return sql
+
+    def system_message(self) -> str:
+        return "You are a helpful AI assistant that generates SQL queries."
+
+    def user_message(self, question: str) -> str:
+        return f"Please generate a SQL query for: {question}"
+
+    def assistant_message(self, sql: str) -> str:
+        return f"Here's the SQL query: {sql}"
+
+    def submit_prompt(self, prompt: str, stream: bool = False):
+        if stream:
+            return self._stream_llm_studio(prompt)
+        return self._call_llm_studio(prompt)
@@ -0,0 +1,269 @@
+import json
+import time
+import random
+import asyncio
+import threading
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Iterator, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from instrumentation import current_span
+from single_flight import SingleFlight, request_key
+
+DEFAULT_BASE_URL = "http://127.0.0.1:1234/v1"
+
+RETRY_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+class LLMTransportError(Exception):
+    pass
+
+
+class LLMTransport:
+    """
+    Shared HTTP transport for OpenAI-compatible completion endpoints (LM Studio,
+    llama.cpp, Azure OpenAI). One pooled keep-alive session per base URL,
+    bounded concurrency, (connect, read) timeouts and retry with full-jitter
+    exponential backoff on connection errors, timeouts and retryable statuses.
+    With `coalesce` (the default), identical requests in flight at the same
+    time (same path and payload, whitespace aside) share one upstream call,
+    streamed or not.
+    """
+
+    def __init__(
+        self,
+        base_url: str = DEFAULT_BASE_URL,
+        headers: Optional[Dict[str, str]] = None,
+        params: Optional[Dict[str, str]] = None,
+        timeout=(3.05, 120),
+        max_retries: int = 3,
+        backoff_base: float = 0.25,
+        backoff_max: float = 4.0,
+        max_concurrency: int = 8,
+        pool_size: int = 16,
+        coalesce: bool = True,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.params = params or {}
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_concurrency = max_concurrency
+        self.coalesce = coalesce
+        self._flights = SingleFlight()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({"Content-Type": "application/json"})
+        self.session.headers.update(headers or {})
+
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._metrics_lock = threading.Lock()
+        self._queued = 0
+        self._in_flight = 0
+        self._requests = 0
+        self._retries = 0
+        self._errors = 0
+
+    def _count(self, **deltas):
+        with self._metrics_lock:
+            for name, delta in deltas.items():
+                setattr(self, name, getattr(self, name) + delta)
+
+    def metrics(self) -> Dict[str, int]:
+        with self._metrics_lock:
+            return {
+                "queue_depth": self._queued,
+                "in_flight": self._in_flight,
+                "max_concurrency": self.max_concurrency,
+                "requests_total": self._requests,
+                "retries_total": self._retries,
+                "errors_total": self._errors,
+                "coalesced_total": self._flights.followers,
+            }
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _send(self, method: str, url: str, payload: Optional[Dict[str, Any]], stream: bool = False) -> requests.Response:
+        """Send with retries; the caller must already hold a concurrency slot."""
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.session.request(
+                    method, url, json=payload, params=self.params, timeout=self.timeout, stream=stream
+                )
+                if response.status_code in RETRY_STATUS and attempt < self.max_retries:
+                    response.close()
+                    raise requests.HTTPError(f"{response.status_code} from {url}", response=response)
+                response.raise_for_status()
+                return response
+            except (requests.ConnectionError, requests.Timeout, requests.HTTPError) as e:
+                retryable = not isinstance(e, requests.HTTPError) or e.response.status_code in RETRY_STATUS
+                if not retryable or attempt == self.max_retries:
+                    self._count(_errors=1)
+                    raise LLMTransportError(f"{method} {url} failed after {attempt + 1} attempt(s): {e}") from e
+                self._count(_retries=1)
+                time.sleep(self._backoff(attempt))
+
+    def _acquire(self):
+        self._count(_queued=1)
+        self._slots.acquire()
+        self._count(_queued=-1, _in_flight=1, _requests=1)
+
+    def _release(self):
+        self._slots.release()
+        self._count(_in_flight=-1)
+
+    def request(self, method: str, path: str, payload: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        if self.coalesce:
+            return self._flights.do(request_key(method, path, payload), lambda: self._request(method, path, payload))
+        return self._request(method, path, payload)
+
+    def _request(self, method: str, path: str, payload: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        url = f"{self.base_url}/{path.lstrip('/')}"
+        self._acquire()
+        try:
+            response = self._send(method, url, payload)
+            try:
+                body = response.json()
+            except ValueError as e:
+                self._count(_errors=1)
+                raise LLMTransportError(f"Invalid JSON from {url}: {e}") from e
+            usage = body.get("usage") if isinstance(body, dict) else None
+            if usage:
+                current_span().set(
+                    prompt_tokens=usage.get("prompt_tokens"), completion_tokens=usage.get("completion_tokens")
+                )
+            return body
+        finally:
+            self._release()
+
+    def stream(self, path: str, payload: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """
+        POST with "stream": true and yield each server-sent event's JSON payload.
+        Retries only happen before the first byte; closing the generator early
+        closes the connection, which tells the server to stop generating.
+        """
+        if self.coalesce:
+            return self._flights.stream(request_key("STREAM", path, payload), lambda: self._stream(path, payload))
+        return self._stream(path, payload)
+
+    def _stream(self, path: str, payload: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        url = f"{self.base_url}/{path.lstrip('/')}"
+        self._acquire()
+        try:
+            response = self._send("POST", url, {**payload, "stream": True}, stream=True)
+            with response:
+                # chunk_size=None hands lines over as soon as they arrive instead
+                # of waiting for a 512-byte read to fill.
+                response.encoding = "utf-8"
+                for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+                    if not line or not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        break
+                    try:
+                        yield json.loads(data)
+                    except ValueError as e:
+                        raise LLMTransportError(f"Invalid stream event from {url}: {data!r}") from e
+        except requests.RequestException as e:
+            self._count(_errors=1)
+            raise LLMTransportError(f"Stream from {url} interrupted: {e}") from e
+        finally:
+            self._release()
+
+    def complete(self, prompt: str, **params) -> str:
+        """POST /completions and return the first choice's text."""
+        result = self.request("POST", "completions", {"prompt": prompt, **params})
+        return (result.get("choices") or [{}])[0].get("text", "").strip()
+
+    def complete_batch(self, prompts: List[str], **params) -> List[str]:
+        """One /completions request with a list of prompts; texts are returned in prompt order."""
+        result = self.request("POST", "completions", {"prompt": prompts, **params})
+        texts = [""] * len(prompts)
+        for position, choice in enumerate(result.get("choices") or []):
+            index = choice.get("index", position)
+            if 0 <= index < len(prompts):
+                texts[index] = choice.get("text", "").strip()
+        return texts
+
+    def chat(self, messages: List[Dict[str, str]], **params) -> str:
+        """POST /chat/completions and return the first choice's message content."""
+        result = self.request("POST", "chat/completions", {"messages": messages, **params})
+        return ((result.get("choices") or [{}])[0].get("message") or {}).get("content", "")
+
+    def stream_complete(self, prompt: str, **params) -> Iterator[str]:
+        """Yield text deltas from a streamed /completions call."""
+        for event in self.stream("completions", {"prompt": prompt, **params}):
+            text = (event.get("choices") or [{}])[0].get("text")
+            if text:
+                yield text
+
+    def stream_chat(self, messages: List[Dict[str, str]], **params) -> Iterator[str]:
+        """Yield content deltas from a streamed /chat/completions call."""
+        for event in self.stream("chat/completions", {"messages": messages, **params}):
+            delta = (event.get("choices") or [{}])[0].get("delta") or {}
+            if delta.get("content"):
+                yield delta["content"]
+
+    def list_models(self) -> List[str]:
+        return [model.get("id") for model in self.request("GET", "models").get("data", [])]
+
+    def _run_async(self, fn, *args, **kwargs):
+        # A dedicated pool sized to max_concurrency, so async callers are not
+        # capped by (or starve) the event loop's default executor.
+        if self._executor is None:
+            with self._metrics_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(self.max_concurrency, thread_name_prefix="llm-transport")
+        return asyncio.get_running_loop().run_in_executor(self._executor, partial(fn, *args, **kwargs))
+
+    async def acomplete(self, prompt: str, **params) -> str:
+        return await self._run_async(self.complete, prompt, **params)
+
+    async def achat(self, messages: List[Dict[str, str]], **params) -> str:
+        return await self._run_async(self.chat, messages, **params)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+        self.session.close()
+
+
+_transports: Dict[tuple, LLMTransport] = {}
+_transports_lock = threading.Lock()
+
+
+def transport_metrics() -> Dict[str, Dict[str, int]]:
+    """metrics() of every shared transport, keyed by base URL."""
+    with _transports_lock:
+        transports = list(_transports.values())
+    return {transport.base_url: transport.metrics() for transport in transports}
+
+
+def get_transport(base_url: str = DEFAULT_BASE_URL, **kwargs) -> LLMTransport:
+    """Process-wide LLMTransport for base_url; kwargs only apply on first creation."""
+    key = (base_url.rstrip("/"), tuple(sorted((kwargs.get("headers") or {}).items())))
+    with _transports_lock:
+        transport = _transports.get(key)
+        if transport is None:
+            transport = _transports[key] = LLMTransport(base_url, **kwargs)
+        return transport
+
+
+def get_azure_transport(endpoint: str, api_key: str, api_version: str, deployment: str, **kwargs) -> LLMTransport:
+    """LLMTransport for an Azure OpenAI deployment (api-key header, api-version query param)."""
+    kwargs.setdefault("params", {"api-version": api_version})
+    return get_transport(
+        f"{endpoint.rstrip('/')}/openai/deployments/{deployment}",
+        headers={"api-key": api_key},
+        **kwargs,
+    )
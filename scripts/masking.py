@@ -0,0 +1,114 @@
+import re
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# Kind -> pattern. Kinds name the tokens ([PART_1], [EMAIL_2], ...), so keep them upper-case words.
+DEFAULT_RULES: Dict[str, str] = {
+    "PART": r"\bPART-\d+\b",
+    "EMAIL": r"\b[A-Za-z0-9._%+-]+@[A-Za-z0-9-]+(?:\.[A-Za-z0-9-]+)*\.[A-Za-z]{2,}\b",
+}
+
+
+class Masker:
+    """
+    Reversible masking of sensitive values (part numbers, e-mail addresses,
+    ... see DEFAULT_RULES) before text or data is sent to an LLM. Each
+    distinct value gets a stable token such as [PART_3]; unmask_text() puts
+    the values back, e.g. into generated SQL or into the LLM's answer.
+
+    mask_frame() works column-wise: cells that are a sensitive value as a
+    whole (the usual case: a part_number or contact_email column) are
+    tokenized with vectorized matching and factorization; cells that merely
+    contain one go through a regex substitution, once per distinct cell.
+    """
+
+    def __init__(self, rules: Optional[Dict[str, str]] = None):
+        self.rules = dict(DEFAULT_RULES if rules is None else rules)
+        self._combined = re.compile("|".join(f"(?P<{kind}>{pattern})" for kind, pattern in self.rules.items()))
+        self._any = "|".join(f"(?:{pattern})" for pattern in self.rules.values())
+        self._token_re = re.compile(rf"\[({'|'.join(map(re.escape, self.rules))})_(\d+)\]")
+        # Per kind: the values in token-number order, and each value's number.
+        self._values: Dict[str, List[Any]] = {kind: [] for kind in self.rules}
+        self._numbers: Dict[str, Dict[Any, int]] = {kind: {} for kind in self.rules}
+
+    def __len__(self) -> int:
+        return sum(len(values) for values in self._values.values())
+
+    def _number(self, kind: str, value: Any) -> int:
+        """The token number of a value, registering it when not seen yet. Numbers start at 1."""
+        numbers = self._numbers[kind]
+        number = numbers.get(value)
+        if number is None:
+            self._values[kind].append(value)
+            number = numbers[value] = len(self._values[kind])
+        return number
+
+    def _positions(self, kind: str, values: np.ndarray):
+        """(token numbers of the distinct values, index of each value into them)."""
+        codes, uniques = pd.factorize(values)
+        return np.array([self._number(kind, value) for value in uniques], dtype=np.int64), codes
+
+    def _tokens(self, kind: str, numbers: np.ndarray) -> np.ndarray:
+        try:
+            import pyarrow as pa
+            import pyarrow.compute as pc
+        except ImportError:
+            return np.array([f"[{kind}_{n}]" for n in numbers.tolist()], dtype=object)
+        joined = pc.binary_join_element_wise(f"[{kind}_", pa.array(numbers).cast(pa.string()), "]", "")
+        return joined.to_numpy(zero_copy_only=False)
+
+    def _replace(self, match: "re.Match") -> str:
+        kind = match.lastgroup
+        return f"[{kind}_{self._number(kind, match.group())}]"
+
+    def mask_text(self, text: str) -> str:
+        return self._combined.sub(self._replace, text) if text else text
+
+    def unmask_text(self, text: str) -> str:
+        def restore(match):
+            values = self._values[match.group(1)]
+            i = int(match.group(2)) - 1
+            return str(values[i]) if 0 <= i < len(values) else match.group()
+
+        return self._token_re.sub(restore, text) if text else text
+
+    def mask_series(self, series: pd.Series) -> pd.Series:
+        if not (pd.api.types.is_string_dtype(series) or series.dtype == object):
+            return series
+        strings = series.astype(str).where(series.notna()) if series.dtype == object else series
+        hits = strings.str.contains(self._any, na=False).to_numpy()
+        if not hits.any():
+            return series
+        values = series.to_numpy(dtype=object, copy=True)
+        done = np.zeros(len(series), dtype=bool)
+        for kind, pattern in self.rules.items():
+            whole = hits & ~done & strings.str.fullmatch(pattern, na=False).to_numpy()
+            if whole.any():
+                numbers, codes = self._positions(kind, values[whole])
+                values[whole] = self._tokens(kind, numbers)[codes]
+                done |= whole
+        partial = hits & ~done
+        if partial.any():
+            codes, uniques = pd.factorize(strings.to_numpy(dtype=object)[partial])
+            masked = np.array([self.mask_text(text) for text in uniques], dtype=object)
+            values[partial] = masked[codes]
+        return pd.Series(values, index=series.index, name=series.name, dtype=object)
+
+    def mask_frame(self, df: pd.DataFrame) -> pd.DataFrame:
+        """A copy of df with sensitive values in its text columns replaced by tokens."""
+        masked = df.copy()
+        for i in range(len(df.columns)):
+            masked.isetitem(i, self.mask_series(df.iloc[:, i]))
+        return masked
+
+    def mask_digest(self, value: Any) -> Any:
+        """A result digest (nested dicts and lists) with its text keys and values masked."""
+        if isinstance(value, str):
+            return self.mask_text(value)
+        if isinstance(value, dict):
+            return {self.mask_digest(k): self.mask_digest(v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [self.mask_digest(v) for v in value]
+        return value
@@ -0,0 +1,653 @@
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import argparse
+import threading
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from instrumentation import current_span
+
+# Summary tables, their indexes and triggers all carry this prefix (schema
+# introspection for prompts and templates skips them).
+PREFIX = "mv_"
+REGISTRY = "mv_registry"
+
+_TOKEN_RE = re.compile(
+    r"--[^\n]*|/\*.*?\*/"
+    r"|'(?:[^']|'')*'"
+    r'|"(?:[^"]|"")*"|`[^`]*`|\[[^\]]*\]'
+    r"|\d+(?:\.\d*)?(?:[eE][-+]?\d+)?|\.\d+"
+    r"|\w+"
+    r"|<=|>=|<>|!=|==|\|\||<<|>>"
+    r"|\S",
+    re.DOTALL,
+)
+_WORD_RE = re.compile(r"^[A-Za-z_]\w*$")
+_AGGREGATES = {"COUNT", "SUM", "AVG", "MIN", "MAX", "TOTAL"}
+_CLAUSES = ("SELECT", "FROM", "WHERE", "GROUP", "HAVING", "ORDER", "LIMIT")
+# Set operations, windows, CTEs and outer/natural joins change what a pre-aggregated row stands for.
+_UNSUPPORTED = {
+    "UNION", "INTERSECT", "EXCEPT", "OVER", "WINDOW", "FILTER", "WITH", "VALUES",
+    "NATURAL", "USING", "LEFT", "RIGHT", "FULL", "OUTER",
+}
+_FROM_KEYWORDS = {"JOIN", "INNER", "CROSS", "ON", "AS"}
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _ident(token: str) -> Optional[str]:
+    """Lower-cased identifier for a bare or quoted name token, else None."""
+    if _WORD_RE.match(token):
+        return token.lower()
+    if len(token) >= 2 and (token[0], token[-1]) in (('"', '"'), ("`", "`"), ("[", "]")):
+        return token[1:-1].replace('""', '"').lower()
+    return None
+
+
+def _tokenize(sql: str) -> List[Tuple[str, int, int]]:
+    return [(m.group(), m.start(), m.end()) for m in _TOKEN_RE.finditer(sql)]
+
+
+def _qualify(expr: str, prefix: str, columns: Set[str]) -> str:
+    """A canonical measure expression with its column names qualified, e.g. NEW."price"."""
+    tokens = _tokenize(expr)
+    out = []
+    for i, (text, _, _) in enumerate(tokens):
+        name = _ident(text)
+        calls = i + 1 < len(tokens) and tokens[i + 1][0] == "("
+        out.append(f"{prefix}.{_quote(name)}" if name in columns and not calls else text)
+    return " ".join(out)
+
+
+class MaterializedAggregates:
+    """
+    Summary tables for hot GROUP BY aggregates, kept current by triggers and
+    used by rewriting matching SQL.
+
+    A summary pre-aggregates one table by some of its columns: row count and,
+    per aggregated expression, its SUM and non-NULL COUNT (plus MIN / MAX when
+    needed). AFTER INSERT / DELETE / UPDATE triggers on the base table adjust
+    the affected group in the same transaction as the write; a MIN or MAX is
+    recomputed for a group only when its current extreme row goes away.
+
+    rewrite() answers a single SELECT with COUNT / SUM / AVG / MIN / MAX /
+    TOTAL aggregates over one table (optionally inner-joined to others) from
+    any summary of that table grouped by at least the columns the query uses
+    outside its aggregates: the table is swapped for the summary under the
+    same alias and every aggregate is re-aggregated from it (AVG(x) becomes
+    SUM(sum) / SUM(count), ...), so filters, joins, HAVING and ORDER BY keep
+    working and result columns keep their names. Floating-point sums may
+    differ from a fresh scan in the last digits.
+
+    recommend() proposes summaries for the frequent statements of a
+    WorkloadLog whose grouping is much smaller than the table; apply()
+    creates them.
+    """
+
+    def __init__(self, db_path: str, workload=None, min_rows: int = 1000, max_ratio: float = 0.1, cache_size: int = 1024):
+        self.db_path = db_path
+        self.workload = workload
+        self.min_rows = min_rows
+        self.max_ratio = max_ratio
+        self.cache_size = cache_size
+        self.hits = 0
+        self._lock = threading.Lock()
+        self._rewrites: Dict[str, str] = {}
+        self._columns: Dict[str, Dict[str, str]] = {}
+        self._rows: Dict[str, int] = {}
+        self._summaries: Dict[str, List[Dict[str, Any]]] = {}
+        self.stale: List[Dict[str, Any]] = []
+        self.refresh()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True)
+
+    def refresh(self):
+        """Reload table columns, sizes and the registered summaries whose triggers are all in place."""
+        conn = self._connect()
+        try:
+            objects = {name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger')")}
+            tables = [name for (name,) in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' AND name NOT LIKE 'mv\\_%' ESCAPE '\\'"
+            )]
+            columns = {t.lower(): {row[1].lower(): row[1] for row in conn.execute(f"PRAGMA table_info({_quote(t)})")} for t in tables}
+            stats = {}
+            if "sqlite_stat1" in objects:
+                stats = {tbl.lower(): int(stat.split()[0]) for tbl, stat in conn.execute("SELECT tbl, stat FROM sqlite_stat1") if stat}
+            rows = {t.lower(): stats.get(t.lower()) or conn.execute(f"SELECT MAX(rowid) FROM {_quote(t)}").fetchone()[0] or 0 for t in tables}
+            registered = []
+            if REGISTRY in objects:
+                registered = conn.execute(f"SELECT name, base_table, spec, rows FROM {REGISTRY}").fetchall()
+        finally:
+            conn.close()
+
+        summaries: Dict[str, List[Dict[str, Any]]] = {}
+        stale = []
+        for name, table, spec, count in registered:
+            summary = {"name": name, "table": table, "rows": count, **json.loads(spec)}
+            intact = (
+                table in columns
+                and self._covers_columns(summary, columns[table])
+                and all(n in objects for n in [name] + self._trigger_names(summary))
+            )
+            if intact:
+                summaries.setdefault(table, []).append(summary)
+            else:
+                stale.append(summary)
+        with self._lock:
+            self._columns = columns
+            self._rows = rows
+            self._summaries = summaries
+            self.stale = stale
+            self._rewrites.clear()
+
+    @staticmethod
+    def _expr_columns(expr: str, columns: Dict[str, str]) -> Set[str]:
+        tokens = _tokenize(expr)
+        return {
+            _ident(text) for i, (text, _, _) in enumerate(tokens)
+            if _ident(text) in columns and not (i + 1 < len(tokens) and tokens[i + 1][0] == "(")
+        }
+
+    @classmethod
+    def _covers_columns(cls, summary: Dict[str, Any], columns: Dict[str, str]) -> bool:
+        """Whether the table still has every column the summary's groups and measures use."""
+        return {g.lower() for g in summary["groups"]} <= set(columns) and all(
+            cls._expr_columns(expr, columns) == {c.lower() for c in re.findall(r'"((?:[^"]|"")*)"', expr)}
+            for expr, _ in summary["measures"]
+        )
+
+    @staticmethod
+    def _trigger_names(summary: Dict[str, Any]) -> List[str]:
+        return [f"{summary['name']}_{event}" for event in ("insert", "delete", "update")]
+
+    # Parsing
+
+    def _parse(self, sql: str) -> Optional[Dict[str, Any]]:
+        """
+        The aggregate query's shape: the aggregated table and its alias, the
+        group columns a summary needs, the measures and the edits rewrite()
+        makes. None when the statement is not one a summary can answer.
+        """
+        tokens = _tokenize(sql)
+        if tokens and tokens[-1][0] == ";":
+            tokens.pop()
+        upper = [t[0].upper() if _WORD_RE.match(t[0]) else t[0] for t in tokens]
+        if not tokens or upper[0] != "SELECT" or upper.count("SELECT") > 1 or ";" in upper:
+            return None
+        if any(u in _UNSUPPORTED for u in upper) or any(t[0].startswith(("--", "/*")) for t in tokens):
+            return None
+
+        # Depth and the top-level clauses.
+        depth = []
+        level = 0
+        for text, _, _ in tokens:
+            if text == ")":
+                level -= 1
+            depth.append(level)
+            if text == "(":
+                level += 1
+        if level != 0:
+            return None
+        clauses: Dict[str, Tuple[int, int]] = {}
+        order = []
+        i = 0
+        while i < len(tokens):
+            if depth[i] == 0 and upper[i] in _CLAUSES:
+                clause = upper[i]
+                start = i + 1
+                if clause in ("GROUP", "ORDER"):
+                    if i + 1 >= len(tokens) or upper[i + 1] != "BY":
+                        return None
+                    start += 1
+                if clause in clauses or (order and _CLAUSES.index(clause) < _CLAUSES.index(order[-1])):
+                    return None
+                if order:
+                    clauses[order[-1]] = (clauses[order[-1]][0], i)
+                clauses[clause] = (start, len(tokens))
+                order.append(clause)
+                i = start
+                continue
+            i += 1
+        if "FROM" not in clauses:
+            return None
+
+        # FROM: table [AS alias] joined with "," / [INNER | CROSS] JOIN ... ON.
+        refs: Dict[str, str] = {}
+        spans: Dict[str, Tuple[int, int]] = {}
+        alias_tokens: Dict[str, str] = {}
+        start, end = clauses["FROM"]
+        i = start
+        while i < end:
+            table = _ident(tokens[i][0])
+            if table is None or table not in self._columns:
+                return None
+            j = i + 1
+            alias, alias_token = table, tokens[i][0]
+            if j < end and upper[j] == "AS":
+                j += 1
+                if j >= end or _ident(tokens[j][0]) is None:
+                    return None
+                alias, alias_token = _ident(tokens[j][0]), tokens[j][0]
+                j += 1
+            elif j < end and _ident(tokens[j][0]) is not None and upper[j] not in _FROM_KEYWORDS:
+                alias, alias_token = _ident(tokens[j][0]), tokens[j][0]
+                j += 1
+            if alias in refs:
+                return None
+            refs[alias] = table
+            spans[alias] = (i, j)
+            alias_tokens[alias] = alias_token
+            if j < end and upper[j] == "ON":
+                j += 1
+                while j < end and not (depth[j] == 0 and (tokens[j][0] == "," or upper[j] in ("JOIN", "INNER", "CROSS"))):
+                    j += 1
+            if j < end:
+                if upper[j] in ("INNER", "CROSS"):
+                    j += 1
+                    if j >= end or upper[j] != "JOIN":
+                        return None
+                elif tokens[j][0] != "," and upper[j] != "JOIN":
+                    return None
+                j += 1
+            i = j
+
+        # Aggregate calls.
+        aggregates = []
+        inside = [False] * len(tokens)
+        for i, u in enumerate(upper):
+            if u not in _AGGREGATES or i + 1 >= len(tokens) or tokens[i + 1][0] != "(" or inside[i]:
+                continue
+            close = i + 2
+            while close < len(tokens) and not (tokens[close][0] == ")" and depth[close] == depth[i]):
+                close += 1
+            args = range(i + 2, close)
+            if not args or upper[i + 2] in ("DISTINCT", "ALL") or any(tokens[k][0] == "," and depth[k] == depth[i] + 1 for k in args):
+                return None
+            if any(upper[k] in _AGGREGATES and k + 1 < close and tokens[k + 1][0] == "(" for k in args):
+                return None
+            star = len(args) == 1 and tokens[i + 2][0] == "*"
+            if star and u != "COUNT":
+                return None
+            for k in range(i, close + 1):
+                inside[k] = True
+            aggregates.append({"func": u, "start": i, "end": close, "star": star})
+        if not aggregates:
+            return None
+        clause_of = {}
+        for clause, (start, end) in clauses.items():
+            for k in range(start, end):
+                clause_of[k] = clause
+        if any(clause_of.get(a["start"]) not in ("SELECT", "HAVING", "ORDER") for a in aggregates):
+            return None
+
+        # Column references outside the FROM table names.
+        skip = {k for i, j in spans.values() for k in range(i, j)}
+        references = []  # (alias, column, token index, inside an aggregate)
+        i = 0
+        while i < len(tokens):
+            name = _ident(tokens[i][0])
+            if i in skip or name is None or (i > 0 and upper[i - 1] == "AS") or (i + 1 < len(tokens) and tokens[i + 1][0] == "("):
+                i += 1
+                continue
+            if i + 2 < len(tokens) and tokens[i + 1][0] == "." and _ident(tokens[i + 2][0]) is not None:
+                column = _ident(tokens[i + 2][0])
+                if name not in refs or column not in self._columns[refs[name]]:
+                    return None
+                references.append((name, column, i, inside[i]))
+                i += 3
+                continue
+            owners = [alias for alias, table in refs.items() if name in self._columns[table]]
+            if len(owners) > 1:
+                return None
+            if owners:
+                references.append((owners[0], name, i, inside[i]))
+            i += 1
+
+        aggregated = {alias for alias, _, _, within in references if within}
+        if len(aggregated) > 1:
+            return None
+        if aggregated:
+            fact = aggregated.pop()
+        else:
+            fact = max(refs, key=lambda alias: self._rows.get(refs[alias], 0))
+        table = refs[fact]
+        columns = self._columns[table]
+
+        # Outside aggregates, SELECT / HAVING / ORDER BY may only use grouped columns.
+        grouped = {(alias, column) for alias, column, k, _ in references if clause_of.get(k) == "GROUP"}
+        for alias, column, k, within in references:
+            if not within and clause_of.get(k) in ("SELECT", "HAVING", "ORDER") and (alias, column) not in grouped:
+                return None
+        groups = sorted({columns[column] for alias, column, _, within in references if alias == fact and not within})
+
+        measures: Dict[str, Set[str]] = {}
+        fact_refs = {k: column for alias, column, k, within in references if alias == fact and within}
+        for aggregate in aggregates:
+            if aggregate["star"]:
+                aggregate["expr"] = None
+                continue
+            parts = []
+            k = aggregate["start"] + 2
+            while k < aggregate["end"]:
+                if k in fact_refs:
+                    parts.append(_quote(columns[fact_refs[k]]))
+                    k += 3 if tokens[k + 1][0] == "." else 1
+                    continue
+                parts.append(tokens[k][0])
+                k += 1
+            aggregate["expr"] = " ".join(parts)
+            measures.setdefault(aggregate["expr"], set()).add(aggregate["func"])
+
+        # Result column names: SQLite names an unaliased expression after its text.
+        aliases = []
+        start, end = clauses["SELECT"]
+        if start < end and upper[start] in ("DISTINCT", "ALL"):
+            start += 1
+        item = start
+        for k in range(start, end + 1):
+            if k < end and not (tokens[k][0] == "," and depth[k] == 0):
+                continue
+            last = k - 1
+            has_alias = (
+                last > item and _ident(tokens[last][0]) is not None and upper[last] != "END"
+                and (upper[last - 1] == "AS" or tokens[last - 1][0] == ")" or _ident(tokens[last - 1][0]) is not None)
+            )
+            if not has_alias and any(item <= a["start"] <= last for a in aggregates):
+                text = sql[tokens[item][1]:tokens[last][2]]
+                aliases.append((tokens[last][2], f" AS {_quote(text)}"))
+            item = k + 1
+
+        return {
+            "table": table,
+            "alias": alias_tokens[fact],
+            "groups": groups,
+            "measures": measures,
+            "from": (tokens[spans[fact][0]][1], tokens[spans[fact][1] - 1][2]),
+            "aggregates": [(tokens[a["start"]][1], tokens[a["end"]][2], a["func"], a["expr"]) for a in aggregates],
+            "aliases": aliases,
+        }
+
+    # Rewriting
+
+    def _covering(self, query: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        best = None
+        for summary in self._summaries.get(query["table"], []):
+            if not set(query["groups"]) <= set(summary["groups"]):
+                continue
+            available = dict((expr, set(funcs)) for expr, funcs in summary["measures"])
+            needs = {"MIN", "MAX"}
+            if all(expr in available and funcs & needs <= available[expr] for expr, funcs in query["measures"].items()):
+                if best is None or summary["rows"] < best["rows"]:
+                    best = summary
+        return best
+
+    def rewrite(self, sql: str) -> str:
+        """sql reading from a summary table when one can answer it, else sql unchanged."""
+        with self._lock:
+            cached = self._rewrites.get(sql)
+            if cached is None:
+                cached = self._rewrite(sql) if self._summaries else sql
+                if len(self._rewrites) >= self.cache_size:
+                    self._rewrites.clear()
+                self._rewrites[sql] = cached
+            if cached != sql:
+                self.hits += 1
+        if cached != sql:
+            current_span().set(materialized=True)
+        return cached
+
+    def _rewrite(self, sql: str) -> str:
+        query = self._parse(sql)
+        summary = self._covering(query) if query is not None else None
+        if summary is None:
+            return sql
+        alias = query["alias"]
+        index = {expr: i for i, (expr, _) in enumerate(summary["measures"])}
+        edits = [(query["from"][0], query["from"][1], f"{summary['name']} AS {alias}")]
+        for start, end, func, expr in query["aggregates"]:
+            i = index.get(expr)
+            if func == "COUNT":
+                replacement = f"COALESCE(SUM({alias}.mv_rows), 0)" if expr is None else f"COALESCE(SUM({alias}.mv_count_{i}), 0)"
+            elif func == "SUM":
+                replacement = f"CASE WHEN SUM({alias}.mv_count_{i}) > 0 THEN SUM({alias}.mv_sum_{i}) END"
+            elif func == "TOTAL":
+                replacement = f"TOTAL({alias}.mv_sum_{i})"
+            elif func == "AVG":
+                replacement = f"SUM({alias}.mv_sum_{i}) * 1.0 / SUM({alias}.mv_count_{i})"
+            else:
+                replacement = f"{func}({alias}.mv_{func.lower()}_{i})"
+            edits.append((start, end, f"({replacement})"))
+        edits.extend((position, position, text) for position, text in query["aliases"])
+        out = []
+        position = 0
+        for start, end, text in sorted(edits, key=lambda e: (e[0], e[1])):
+            out.append(sql[position:start])
+            out.append(text)
+            position = end
+        out.append(sql[position:])
+        return "".join(out)
+
+    # Creating summaries
+
+    def recommend(self, limit: int = 200, min_count: int = 2, since: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        Summaries for the logged workload that do not exist yet, best first:
+        table, groups, measures, the executions they would serve, their row
+        count and a benefit score (executions x table rows no longer scanned).
+        """
+        if self.workload is None:
+            raise ValueError("MaterializedAggregates needs a WorkloadLog to recommend from")
+        proposals: Dict[Tuple[str, Tuple[str, ...]], Dict[str, Any]] = {}
+        for sql, count in self.workload.top(limit, since):
+            if count < min_count:
+                continue
+            query = self._parse(sql)
+            if query is None or self._rows.get(query["table"], 0) < self.min_rows or self._covering(query) is not None:
+                continue
+            key = (query["table"], tuple(query["groups"]))
+            proposal = proposals.setdefault(key, {"table": query["table"], "groups": query["groups"], "measures": {}, "queries": 0})
+            for expr, funcs in query["measures"].items():
+                proposal["measures"].setdefault(expr, set()).update(funcs)
+            proposal["queries"] += count
+
+        found = []
+        conn = self._connect()
+        try:
+            for proposal in proposals.values():
+                table, groups = proposal["table"], proposal["groups"]
+                if groups:
+                    group_list = ", ".join(_quote(g) for g in groups)
+                    rows = conn.execute(f"SELECT COUNT(*) FROM (SELECT 1 FROM {_quote(table)} GROUP BY {group_list})").fetchone()[0]
+                else:
+                    rows = 1
+                if rows > self.max_ratio * self._rows[table]:
+                    continue  # hardly smaller than the table itself
+                proposal["measures"] = {expr: sorted(funcs) for expr, funcs in proposal["measures"].items()}
+                proposal["rows"] = rows
+                proposal["benefit"] = proposal["queries"] * self._rows[table]
+                found.append(proposal)
+        finally:
+            conn.close()
+        return sorted(found, key=lambda p: -p["benefit"])
+
+    def _statements(self, name: str, table: str, groups: List[str], measures: List[Tuple[str, List[str]]]) -> List[str]:
+        base = _quote(table)
+        columns = set(self._columns[table])
+        group_list = ", ".join(_quote(g) for g in groups)
+        select = [_quote(g) for g in groups] + ["COUNT(*) AS mv_rows"]
+        insert_columns = [_quote(g) for g in groups] + ["mv_rows"]
+        defaults = ["0"]
+        for i, (expr, funcs) in enumerate(measures):
+            select += [f"COALESCE(SUM({expr}), 0) AS mv_sum_{i}", f"COUNT({expr}) AS mv_count_{i}"]
+            insert_columns += [f"mv_sum_{i}", f"mv_count_{i}"]
+            defaults += ["0", "0"]
+            for func in ("MIN", "MAX"):
+                if func in funcs:
+                    select.append(f"{func}({expr}) AS mv_{func.lower()}_{i}")
+                    insert_columns.append(f"mv_{func.lower()}_{i}")
+                    defaults.append("NULL")
+        query = f"SELECT {', '.join(select)} FROM {base}"
+        query = f"{query} GROUP BY {group_list}" if groups else f"SELECT * FROM ({query}) WHERE mv_rows > 0"
+
+        def match(row: str) -> str:
+            return " AND ".join(f"{_quote(g)} IS {row}.{_quote(g)}" for g in groups) or "1"
+
+        add = [
+            f"INSERT INTO {name} ({', '.join(insert_columns)}) "
+            f"SELECT {', '.join([f'NEW.{_quote(g)}' for g in groups] + defaults)} "
+            f"WHERE NOT EXISTS (SELECT 1 FROM {name} WHERE {match('NEW')})",
+        ]
+        updates = ["mv_rows = mv_rows + 1"]
+        removals = ["mv_rows = mv_rows - 1"]
+        extremes = []
+        updated = []
+        moved = " OR ".join(f"OLD.{_quote(g)} IS NOT NEW.{_quote(g)}" for g in groups)
+        for i, (expr, funcs) in enumerate(measures):
+            new, old = _qualify(expr, "NEW", columns), _qualify(expr, "OLD", columns)
+            updates += [f"mv_sum_{i} = mv_sum_{i} + COALESCE({new}, 0)", f"mv_count_{i} = mv_count_{i} + (({new}) IS NOT NULL)"]
+            removals += [f"mv_sum_{i} = mv_sum_{i} - COALESCE({old}, 0)", f"mv_count_{i} = mv_count_{i} - (({old}) IS NOT NULL)"]
+            for func, better in (("MIN", "<"), ("MAX", ">")):
+                if func in funcs:
+                    column = f"mv_{func.lower()}_{i}"
+                    updates.append(
+                        f"{column} = CASE WHEN ({new}) IS NULL THEN {column} "
+                        f"WHEN {column} IS NULL OR ({new}) {better} {column} THEN ({new}) ELSE {column} END"
+                    )
+                    # Only a group whose extreme value was removed is recomputed from the table.
+                    within = " AND ".join(f"{base}.{_quote(g)} IS OLD.{_quote(g)}" for g in groups) or "1"
+                    recompute = (
+                        f"UPDATE {name} SET {column} = (SELECT {func}({expr}) FROM {base} WHERE {within}) "
+                        f"WHERE {match('OLD')} AND ({old}) {better}= {column}"
+                    )
+                    extremes.append(recompute)
+                    # An update that keeps the row's group and value re-adds what it removed.
+                    changed = f"({old}) IS NOT ({new})" + (f" OR {moved}" if moved else "")
+                    updated.append(f"{recompute} AND ({changed})")
+        add.append(f"UPDATE {name} SET {', '.join(updates)} WHERE {match('NEW')}")
+        remove = [
+            f"UPDATE {name} SET {', '.join(removals)} WHERE {match('OLD')}",
+            f"DELETE FROM {name} WHERE {match('OLD')} AND mv_rows <= 0",
+        ]
+
+        statements = [f"CREATE TABLE {name} AS {query}"]
+        if groups:
+            statements.append(f"CREATE INDEX {name}_groups ON {name} ({group_list})")
+        statements.append(f"CREATE TRIGGER {name}_insert AFTER INSERT ON {base} BEGIN {'; '.join(add)}; END")
+        statements.append(f"CREATE TRIGGER {name}_delete AFTER DELETE ON {base} BEGIN {'; '.join(remove + extremes)}; END")
+        # Updates of columns the summary does not use leave it alone.
+        watched = sorted(set(groups) | {self._columns[table][c] for expr, _ in measures for c in self._expr_columns(expr, self._columns[table])})
+        of = f" OF {', '.join(_quote(c) for c in watched)}" if watched else ""
+        when = f" WHEN {' OR '.join(f'OLD.{_quote(c)} IS NOT NEW.{_quote(c)}' for c in watched)}" if watched else ""
+        statements.append(f"CREATE TRIGGER {name}_update AFTER UPDATE{of} ON {base}{when} BEGIN {'; '.join(remove + updated + add)}; END")
+        return statements
+
+    @staticmethod
+    def _drop(conn: sqlite3.Connection, name: str):
+        for (trigger,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND name IN (?, ?, ?)",
+                                       (f"{name}_insert", f"{name}_delete", f"{name}_update")).fetchall():
+            conn.execute(f"DROP TRIGGER {_quote(trigger)}")
+        conn.execute(f"DROP TABLE IF EXISTS {_quote(name)}")
+        conn.execute(f"DELETE FROM {REGISTRY} WHERE name = ?", (name,))
+
+    def apply(self, proposals: Optional[List[Dict[str, Any]]] = None) -> List[str]:
+        """
+        Create the proposed summaries (recommend() when None), folding in the
+        measures of an existing summary with the same grouping, and rebuild
+        stale ones (whose base table was dropped or recreated). Each summary
+        is built and wired up in one write transaction. Returns the names.
+        """
+        if proposals is None:
+            proposals = self.recommend()
+        with self._lock:
+            existing = [s for summaries in self._summaries.values() for s in summaries]
+            stale = list(self.stale)
+        conn = sqlite3.connect(self.db_path, isolation_level=None)
+        created = []
+        try:
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {REGISTRY} (name TEXT PRIMARY KEY, base_table TEXT, spec TEXT, rows INTEGER, created REAL)")
+            work = [(s["table"], s["groups"], {expr: funcs for expr, funcs in s["measures"]}, [s["name"]]) for s in stale]
+            for proposal in proposals:
+                replaces = [s for s in existing if s["table"] == proposal["table"] and s["groups"] == proposal["groups"]]
+                measures = {expr: list(funcs) for s in replaces for expr, funcs in s["measures"]}
+                for expr, funcs in proposal["measures"].items():
+                    measures[expr] = sorted(set(measures.get(expr, [])) | set(funcs))
+                work.append((proposal["table"], proposal["groups"], measures, [s["name"] for s in replaces]))
+
+            for table, groups, measures, replaces in work:
+                spec = {"groups": list(groups), "measures": [[expr, sorted(funcs)] for expr, funcs in measures.items()]}
+                if table not in self._columns or not self._covers_columns(spec, self._columns[table]):
+                    conn.execute("BEGIN IMMEDIATE")
+                    for old in replaces:
+                        self._drop(conn, old)
+                    conn.execute("COMMIT")
+                    continue
+                digest = hashlib.sha1(json.dumps([table, spec], sort_keys=True).encode("utf-8")).hexdigest()[:10]
+                name = f"{PREFIX}{re.sub(r'[^0-9A-Za-z_]', '_', table)}_{digest}"
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    for old in set(replaces) | {name}:
+                        self._drop(conn, old)
+                    for statement in self._statements(name, table, spec["groups"], spec["measures"]):
+                        conn.execute(statement)
+                    rows = conn.execute(f"SELECT COUNT(*) FROM {name}").fetchone()[0]
+                    conn.execute(f"INSERT INTO {REGISTRY} VALUES (?, ?, ?, ?, ?)", (name, table, json.dumps(spec), rows, time.time()))
+                    conn.execute("COMMIT")
+                except BaseException:
+                    conn.execute("ROLLBACK")
+                    raise
+                created.append(name)
+        finally:
+            conn.close()
+        self.refresh()
+        return created
+
+    def drop_all(self) -> List[str]:
+        """Remove every summary table and its triggers."""
+        conn = sqlite3.connect(self.db_path, isolation_level=None)
+        try:
+            if not conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (REGISTRY,)).fetchone():
+                return []
+            names = [name for (name,) in conn.execute(f"SELECT name FROM {REGISTRY}")]
+            conn.execute("BEGIN IMMEDIATE")
+            for name in names:
+                self._drop(conn, name)
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+        self.refresh()
+        return names
+
+
+def main():
+    from index_advisor import WorkloadLog
+
+    parser = argparse.ArgumentParser(description="Propose (and optionally create) summary tables for the logged aggregate queries.")
+    parser.add_argument("db_path")
+    parser.add_argument("--workload", default="sql_workload.db", help="WorkloadLog database written by the SQL guard")
+    parser.add_argument("--min-count", type=int, default=2, help="ignore statements run fewer times than this")
+    parser.add_argument("--min-rows", type=int, default=1000, help="ignore tables smaller than this")
+    parser.add_argument("--create", action="store_true", help="create the proposed summaries")
+    parser.add_argument("--drop", action="store_true", help="remove all summaries")
+    args = parser.parse_args()
+
+    materialized = MaterializedAggregates(args.db_path, WorkloadLog(args.workload), min_rows=args.min_rows)
+    if args.drop:
+        print(f"Dropped {', '.join(materialized.drop_all()) or 'nothing'}")
+        return
+    proposals = materialized.recommend(min_count=args.min_count)
+    for proposal in proposals:
+        print(f"{proposal['table']} by ({', '.join(proposal['groups'])}): {', '.join(proposal['measures'])}"
+              f"  -- {proposal['queries']} queries, {proposal['rows']:,} rows, benefit {proposal['benefit']:,}")
+    if not proposals:
+        print("No summary would help the logged workload.")
+    if args.create and (proposals or materialized.stale):
+        print(f"Created {', '.join(materialized.apply(proposals))}")
+
+
+if __name__ == "__main__":
+    main()
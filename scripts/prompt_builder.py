@@ -0,0 +1,233 @@
+import re
+import sqlite3
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from embeddings import HashingEmbedder
+from instrumentation import current_span
+
+_PIECE_RE = re.compile(r"[A-Za-z]{1,4}|\d{1,3}|[^\sA-Za-z\d]")
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+_TYPE_NAMES = {"INTEGER": "int", "INT": "int", "BIGINT": "int", "FLOAT": "real", "REAL": "real", "DOUBLE": "real", "TEXT": "text"}
+
+DEFAULT_INSTRUCTIONS = (
+    "You write SQLite queries. Use only the tables and columns listed below; "
+    "-> marks a foreign key. Return only the SQL query, without explanation or markdown."
+)
+
+_LABEL_COLUMNS = {"name", "title", "label"}
+
+_embedder = HashingEmbedder()
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    try:
+        import tiktoken
+
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+
+@lru_cache(maxsize=4096)
+def count_tokens(text: str) -> int:
+    """
+    Token count of a prompt fragment: exact for OpenAI models when tiktoken
+    is installed, otherwise a BPE-like estimate (letters in chunks of four,
+    digits in threes, each symbol on its own) that tracks Llama-family
+    tokenizers within about 15%.
+    """
+    encoding = _encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return len(_PIECE_RE.findall(text))
+
+
+def _short_type(declared: str) -> str:
+    base = declared.split("(")[0].strip().upper()
+    return _TYPE_NAMES.get(base, base.lower() or "any")
+
+
+@lru_cache(maxsize=1024)
+def compact_ddl(ddl: str) -> Optional[Dict[str, Any]]:
+    """
+    A CREATE TABLE statement as a one-line column list, e.g.
+    parts(part_id int pk, name text, manufacturer_id int -> manufacturers.manufacturer_id).
+    SQLite itself parses the statement (in memory), so comments, constraints
+    and quoting are handled. Returns None for anything that is not a table.
+    """
+    conn = sqlite3.connect(":memory:")
+    try:
+        conn.execute(ddl)
+        tables = [name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+        if len(tables) != 1:
+            return None
+        table = tables[0]
+        info = conn.execute(f'PRAGMA table_info("{table}")').fetchall()
+        foreign = {row[3]: f"{row[2]}.{row[4] or row[3]}" for row in conn.execute(f'PRAGMA foreign_key_list("{table}")')}
+        unique = set()
+        for index in conn.execute(f'PRAGMA index_list("{table}")'):
+            if index[2] and index[3] == "u":
+                cols = [row[2] for row in conn.execute(f'PRAGMA index_info("{index[1]}")')]
+                if len(cols) == 1:
+                    unique.add(cols[0])
+    except sqlite3.Error:
+        return None
+    finally:
+        conn.close()
+
+    columns = []
+    for _, name, declared, notnull, _, pk in info:
+        spec = f"{name} {_short_type(declared)}"
+        if pk and sum(1 for row in info if row[5]) == 1:
+            spec += " pk"
+        elif name in unique:
+            spec += " unique"
+        if name in foreign:
+            spec += f" -> {foreign[name]}"
+        columns.append({"name": name, "spec": spec, "key": bool(pk) or name in foreign})
+    return {"name": table, "columns": columns}
+
+
+def render_table(table: Dict[str, Any], columns: Optional[List[Dict[str, Any]]] = None) -> str:
+    columns = table["columns"] if columns is None else columns
+    return f"{table['name']}({', '.join(c['spec'] for c in columns)})"
+
+
+def _words(text: str) -> set:
+    words = set()
+    for word in _WORD_RE.findall(text.lower()):
+        words.add(word)
+        if len(word) > 3 and word.endswith("s"):
+            words.add(word[:-1])
+    return words
+
+
+def _relevance(question_words: set, question_vector: np.ndarray, name: str) -> float:
+    parts = [p for p in _WORD_RE.findall(name.lower().replace("_", " ")) if p]
+    lexical = sum(1.0 for p in parts if p in question_words or p.rstrip("s") in question_words)
+    return lexical + float(_embedder.embed(name.replace("_", " ")) @ question_vector)
+
+
+def _tables(ddl_list: Iterable[str]) -> List[Dict[str, Any]]:
+    return sorted((t for t in (compact_ddl(ddl.strip()) for ddl in ddl_list) if t is not None), key=lambda t: t["name"])
+
+
+def full_schema(ddl_list: Iterable[str]) -> str:
+    """Every table as a compact column list, in name order: schema_block() when nothing is trimmed."""
+    return "\n".join(render_table(t) for t in _tables(ddl_list))
+
+
+def schema_block(question: str, ddl_list: Iterable[str], token_budget: int = 800) -> str:
+    """
+    Compact schema for a prompt, at most token_budget tokens.
+
+    When every table fits, all of them are listed, in name order whatever
+    order retrieval returned them in, so the block is identical across
+    questions and stays in the server's prompt (KV) cache. Otherwise tables
+    are ranked by relevance to the question (name and column matches) and
+    added best first; a table that no longer fits whole keeps its key columns
+    and its most relevant others. The chosen tables are still listed by name.
+    """
+    tables = _tables(ddl_list)
+    if not tables:
+        return ""
+    full = [render_table(t) for t in tables]
+    if count_tokens("\n".join(full)) <= token_budget:
+        return "\n".join(full)
+
+    question_words = _words(question)
+    question_vector = _embedder.embed(question)
+    scores = []
+    for i, table in enumerate(tables):
+        # Label columns (name, title) answer most "which ..." questions, so they get a head start.
+        column_scores = [
+            _relevance(question_words, question_vector, c["name"]) + (0.5 if c["name"].lower() in _LABEL_COLUMNS else 0)
+            for c in table["columns"]
+        ]
+        scores.append((_relevance(question_words, question_vector, table["name"]) + max(column_scores, default=0), i, column_scores))
+
+    chosen: Dict[int, str] = {}
+    used = 0
+    for _, i, column_scores in sorted(scores, key=lambda s: -s[0]):
+        table = tables[i]
+        line = full[i]
+        if used + count_tokens(line) > token_budget:
+            ranked = sorted(range(len(table["columns"])), key=lambda c: (not table["columns"][c]["key"], -column_scores[c]))
+            keep: List[int] = []
+            for c in ranked:
+                candidate = render_table(table, [table["columns"][k] for k in sorted(keep + [c])])
+                if used + count_tokens(candidate) > token_budget:
+                    break
+                keep.append(c)
+            if all(table["columns"][k]["key"] for k in keep):
+                continue  # keys alone say nothing the other tables' foreign keys don't
+            line = render_table(table, [table["columns"][k] for k in sorted(keep)])
+        chosen[i] = line
+        used += count_tokens(line) + 1
+    return "\n".join(chosen[i] for i in sorted(chosen))
+
+
+def build_sql_prompt(
+    question: str,
+    ddl_list: Iterable[str],
+    documentation: Iterable[str] = (),
+    examples: Iterable[Dict[str, str]] = (),
+    token_budget: int = 1200,
+    instructions: str = DEFAULT_INSTRUCTIONS,
+) -> str:
+    """
+    Text-completion prompt for SQL generation within token_budget tokens.
+
+    The layout runs from most to least stable: instructions, schema,
+    documentation, examples, then the question. Requests that share a schema
+    therefore share a byte-identical prefix that LM Studio / llama.cpp can
+    reuse from its prompt cache instead of re-processing it. The schema gets
+    the budget first (see schema_block); documentation and examples fill what
+    is left, whole items only.
+    """
+    tail = f"Question: {question}\nSQL:"
+    fixed = count_tokens(instructions) + count_tokens(tail)
+    schema = schema_block(question, ddl_list, max(token_budget - fixed, 0))
+    sections = [instructions, f"Tables:\n{schema}" if schema else ""]
+    remaining = token_budget - fixed - count_tokens(schema)
+
+    notes = []
+    for doc in documentation:
+        doc = " ".join(doc.split())
+        if count_tokens(doc) + 1 <= remaining:
+            notes.append(f"- {doc}")
+            remaining -= count_tokens(doc) + 1
+    if notes:
+        sections.append("Notes:\n" + "\n".join(notes))
+
+    pairs = []
+    for example in examples:
+        pair = f"Q: {example['question']}\nSQL: {' '.join(example['sql'].split())}"
+        if count_tokens(pair) <= remaining:
+            pairs.append(pair)
+            remaining -= count_tokens(pair)
+    if pairs:
+        sections.append("Examples:\n" + "\n".join(pairs))
+
+    prompt = "\n\n".join(s for s in sections if s) + "\n\n" + tail
+    current_span().set(prompt_tokens_estimate=count_tokens(prompt))
+    return prompt
+
+
+class CompactPromptMixin:
+    """
+    For VannaBase backends: get_sql_prompt() receives the retrieved DDL as
+    compact column lists (see schema_block), trimmed to the config's
+    schema_token_budget and in a stable order, instead of full CREATE statements.
+    """
+
+    def get_sql_prompt(self, initial_prompt, question, question_sql_list, ddl_list, doc_list, **kwargs):
+        block = schema_block(question, ddl_list, self.config.get("schema_token_budget", 800))
+        return super().get_sql_prompt(
+            initial_prompt, question, question_sql_list, [block] if block else [], doc_list, **kwargs
+        )
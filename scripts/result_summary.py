@@ -0,0 +1,158 @@
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import span
+from masking import Masker
+
+GROUP_BY_CANDIDATES = ("type", "manufacturer", "distributor", "size", "material", "region", "country")
+
+SUMMARY_MAX_ROWS = 100000
+
+
+def summarize_frame(
+    df: pd.DataFrame,
+    top_k: int = 5,
+    group_by: Iterable[str] = GROUP_BY_CANDIDATES,
+    max_groups: int = 3,
+) -> Dict[str, Any]:
+    """
+    Compact statistical digest of a query result, computed with vectorised
+    pandas/NumPy aggregates: row count, per-numeric-column min/max/mean and
+    quartiles, top-k values of categorical columns, and for any known grouping
+    column (type, manufacturer, ...) the highest and lowest group means.
+    """
+    with span("digest", rows=len(df)):
+        return _summarize_frame(df, top_k, group_by, max_groups)
+
+
+def _summarize_frame(df: pd.DataFrame, top_k: int, group_by: Iterable[str], max_groups: int) -> Dict[str, Any]:
+    digest: Dict[str, Any] = {"rows": int(len(df)), "numeric": {}, "categorical": {}, "groups": {}}
+    if df.empty:
+        return digest
+
+    numeric = df.select_dtypes(include="number")
+    numeric = numeric.loc[:, [c for c in numeric.columns if c.lower() != "id"]]
+    if not numeric.empty:
+        quantiles = numeric.quantile([0.25, 0.5, 0.75])
+        described = numeric.agg(["min", "max", "mean"])
+        for column in numeric.columns:
+            digest["numeric"][column] = {
+                "min": described.at["min", column],
+                "p25": quantiles.at[0.25, column],
+                "median": quantiles.at[0.5, column],
+                "p75": quantiles.at[0.75, column],
+                "max": described.at["max", column],
+                "mean": described.at["mean", column],
+            }
+
+    categorical = [c for c in df.columns if c not in numeric.columns and c.lower() != "id"]
+    for column in categorical:
+        counts = df[column].value_counts(dropna=True)
+        digest["categorical"][column] = {
+            "distinct": int(len(counts)),
+            "top": {str(k): int(v) for k, v in counts.head(top_k).items()},
+        }
+
+    group_columns = {c.lower(): c for c in categorical}
+    for key in group_by:
+        column = group_columns.get(key)
+        if column is None or numeric.empty or digest["categorical"][column]["distinct"] < 2:
+            continue
+        means = numeric.groupby(df[column], observed=True).mean()
+        for measure in list(numeric.columns)[:2]:
+            ranked = means[measure].dropna().sort_values(ascending=False)
+            digest["groups"][f"{measure} by {column}"] = {
+                "highest": {str(k): float(v) for k, v in ranked.head(max_groups).items()},
+                "lowest": {str(k): float(v) for k, v in ranked.tail(max_groups).iloc[::-1].items()},
+            }
+    return digest
+
+
+def _fmt(value) -> str:
+    if isinstance(value, (float, np.floating)):
+        return f"{value:,.4g}" if abs(value) < 1e6 else f"{value:,.0f}"
+    return str(value)
+
+
+def digest_to_text(digest: Dict[str, Any], token_budget: int = 400) -> str:
+    """Render the digest as compact lines, cut to roughly token_budget tokens (4 chars each)."""
+    lines: List[str] = [f"rows: {digest['rows']}"]
+    for column, stats in digest["numeric"].items():
+        lines.append(f"{column}: " + ", ".join(f"{name}={_fmt(value)}" for name, value in stats.items()))
+    for column, info in digest["categorical"].items():
+        top = ", ".join(f"{k} ({v})" for k, v in info["top"].items())
+        lines.append(f"{column}: {info['distinct']} distinct; top: {top}")
+    for label, ranks in digest["groups"].items():
+        highest = ", ".join(f"{k}={_fmt(v)}" for k, v in ranks["highest"].items())
+        lowest = ", ".join(f"{k}={_fmt(v)}" for k, v in ranks["lowest"].items())
+        lines.append(f"mean {label}: highest {highest}; lowest {lowest}")
+
+    budget = token_budget * 4
+    kept, used = [], 0
+    for line in lines:
+        if used + len(line) + 1 > budget:
+            kept.append("...")
+            break
+        kept.append(line)
+        used += len(line) + 1
+    return "\n".join(kept)
+
+
+def template_summary(digest: Dict[str, Any]) -> str:
+    """Plain-language summary built from the digest without calling an LLM."""
+    if digest["rows"] == 0:
+        return "The query returned no rows."
+    sentences = [f"The query returned {digest['rows']:,} row{'s' if digest['rows'] != 1 else ''}."]
+    for column, stats in digest["numeric"].items():
+        sentences.append(
+            f"{column} ranges from {_fmt(stats['min'])} to {_fmt(stats['max'])} "
+            f"(mean {_fmt(stats['mean'])}, median {_fmt(stats['median'])})."
+        )
+    for column, info in digest["categorical"].items():
+        if info["top"] and info["distinct"] <= digest["rows"] // 2:
+            value, count = next(iter(info["top"].items()))
+            sentences.append(f"{column} has {info['distinct']} distinct values; the most common is {value} ({count}).")
+    for label, ranks in digest["groups"].items():
+        (best, best_value), (worst, worst_value) = next(iter(ranks["highest"].items())), next(iter(ranks["lowest"].items()))
+        sentences.append(f"By mean {label}, {best} is highest ({_fmt(best_value)}) and {worst} is lowest ({_fmt(worst_value)}).")
+    return " ".join(sentences)
+
+
+def summary_prompt(question: str, digest: Dict[str, Any], token_budget: int = 400) -> str:
+    return (
+        f"The user asked: '{question}'\n\n"
+        f"Statistical digest of the query result:\n{digest_to_text(digest, token_budget)}\n\n"
+        "Briefly summarize the data based on the question that was asked. Do not respond with any additional explanation beyond the summary."
+    )
+
+
+class DigestSummaryMixin:
+    """
+    generate_summary() that sends the statistical digest instead of the whole
+    DataFrame (or a digest already computed by the caller). Part numbers,
+    e-mail addresses and the like are masked in the question and the digest
+    and restored in the answer (see masking.Masker). Config: summary_mode
+    ("llm" or "template"), summary_token_budget, mask_pii (default True).
+    """
+
+    def generate_summary(self, question: str, df: pd.DataFrame, digest: Optional[Dict[str, Any]] = None, **kwargs) -> str:
+        if self.config.get("summary_mode", "llm") == "template":
+            return template_summary(digest if digest is not None else summarize_frame(df))
+        masker = Masker() if self.config.get("mask_pii", True) else None
+        if digest is None:
+            digest = summarize_frame(df if masker is None else masker.mask_frame(df))
+        elif masker is not None:
+            digest = masker.mask_digest(digest)
+        if masker is not None:
+            question = masker.mask_text(question)
+        prompt = summary_prompt(question, digest, self.config.get("summary_token_budget", 400))
+        message_log = [
+            self.system_message("You are a helpful data assistant. " + self._response_language()),
+            self.user_message(prompt),
+        ]
+        summary = self.submit_prompt(message_log, **kwargs)
+        if masker is not None and isinstance(summary, str):
+            summary = masker.unmask_text(summary)
+        return summary
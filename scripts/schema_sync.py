@@ -0,0 +1,181 @@
+import os
+import json
+import sqlite3
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Iterable, Optional, Tuple, Union
+
+from vanna.utils import deterministic_uuid
+
+MANIFEST_NAME = "training_manifest.json"
+
+SQLExample = Union[str, Tuple[str, str]]
+
+
+def sqlite_schema(db_path: str) -> List[str]:
+    """
+    CREATE statements for every table, index, view and trigger in a SQLite
+    database, leaving out the summary tables of materialized.py.
+    """
+    if not os.path.exists(db_path):
+        return []
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        rows = conn.execute(
+            "SELECT sql FROM sqlite_master WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite_%' "
+            "AND name NOT LIKE 'mv\\_%' ESCAPE '\\' ORDER BY type, name"
+        ).fetchall()
+    finally:
+        conn.close()
+    return [sql for (sql,) in rows]
+
+
+def content_hash(kind: str, text: str) -> str:
+    """Hash of a training item; whitespace-only edits (re-indented DDL) hash the same."""
+    normalized = " ".join(text.split())
+    return hashlib.sha256(f"{kind}\0{normalized}".encode("utf-8")).hexdigest()
+
+
+def default_manifest_path(vn) -> str:
+    """Manifest location beside the vector store: Chroma's path (default ".") or NumpyVectorStore's."""
+    config = vn.config or {}
+    path = config.get("path", "." if hasattr(vn, "chroma_client") else "vector_store")
+    return os.path.join(path or ".", MANIFEST_NAME)
+
+
+def load_manifest(path: str) -> Dict[str, Dict[str, str]]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def save_manifest(path: str, manifest: Dict[str, Dict[str, str]]):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def _stored_ids(vn, ids: List[str]) -> set:
+    """Which of the manifest's ids the vector store still holds (it may have been wiped)."""
+    if not ids:
+        return set()
+    collections = (vn.ddl_collection, vn.documentation_collection, vn.sql_collection)
+    if hasattr(vn, "chroma_client"):
+        found = set()
+        for collection in collections:
+            found.update(collection.get(ids=ids, include=[])["ids"])
+        return found
+    if all(hasattr(c, "__contains__") for c in collections):
+        return {id for id in ids if any(id in c for c in collections)}
+    return set(vn.get_training_data()["id"]) & set(ids)
+
+
+def _chroma_add(vn, collection, ids: List[str], documents: List[str]):
+    collection.add(documents=documents, embeddings=vn.embedding_function(documents), ids=ids)
+
+
+def add_ddl_batch(vn, ddls: List[str]) -> List[str]:
+    if hasattr(vn, "add_ddl_batch"):
+        return vn.add_ddl_batch(ddls)
+    if hasattr(vn, "chroma_client"):
+        ids = [deterministic_uuid(ddl) + "-ddl" for ddl in ddls]
+        _chroma_add(vn, vn.ddl_collection, ids, ddls)
+        return ids
+    return [vn.add_ddl(ddl) for ddl in ddls]
+
+
+def add_documentation_batch(vn, documentation: List[str]) -> List[str]:
+    if hasattr(vn, "add_documentation_batch"):
+        return vn.add_documentation_batch(documentation)
+    if hasattr(vn, "chroma_client"):
+        ids = [deterministic_uuid(doc) + "-doc" for doc in documentation]
+        _chroma_add(vn, vn.documentation_collection, ids, documentation)
+        return ids
+    return [vn.add_documentation(doc) for doc in documentation]
+
+
+def add_question_sql_batch(vn, pairs: List[Tuple[str, str]]) -> List[str]:
+    if hasattr(vn, "add_question_sql_batch"):
+        return vn.add_question_sql_batch(pairs)
+    if hasattr(vn, "chroma_client"):
+        documents = [json.dumps({"question": q, "sql": s}, ensure_ascii=False) for q, s in pairs]
+        ids = [deterministic_uuid(doc) + "-sql" for doc in documents]
+        _chroma_add(vn, vn.sql_collection, ids, documents)
+        return ids
+    return [vn.add_question_sql(question=q, sql=s) for q, s in pairs]
+
+
+def sync_training(
+    vn,
+    ddl: Iterable[str] = (),
+    documentation: Iterable[str] = (),
+    sql: Iterable[SQLExample] = (),
+    manifest_path: Optional[str] = None,
+    max_workers: int = 8,
+) -> Dict[str, int]:
+    """
+    Incrementally train a Vanna instance on DDL, documentation and example SQL.
+
+    Each item is hashed and recorded in a JSON manifest beside the vector store.
+    On later runs only new or changed items are embedded (one batch per
+    collection), and items that were trained through the manifest but are no
+    longer passed in are removed. Example SQL may be a bare string, in which
+    case the question is generated by the LLM (once, when the item is new), or
+    a (question, sql) pair. Training added by other means is left untouched.
+
+    Returns counts of added, removed and unchanged items.
+    """
+    manifest_path = manifest_path or default_manifest_path(vn)
+    manifest = load_manifest(manifest_path)
+
+    wanted: Dict[str, Tuple[str, Any]] = {}
+    for text in ddl:
+        wanted[content_hash("ddl", text)] = ("ddl", text)
+    for text in documentation:
+        wanted[content_hash("documentation", text)] = ("documentation", text)
+    for example in sql:
+        key = content_hash("sql", example if isinstance(example, str) else "\0".join(example))
+        wanted[key] = ("sql", example)
+
+    present = _stored_ids(vn, [entry["id"] for entry in manifest.values()])
+    removed = 0
+    for key in [k for k in manifest if k not in wanted]:
+        if manifest[key]["id"] in present:
+            vn.remove_training_data(manifest[key]["id"])
+            present.discard(manifest[key]["id"])
+            removed += 1
+        del manifest[key]
+
+    pending: Dict[str, List[Tuple[str, Any]]] = {"ddl": [], "documentation": [], "sql": []}
+    for key, (kind, item) in wanted.items():
+        if key not in manifest or manifest[key]["id"] not in present:
+            pending[kind].append((key, item))
+
+    bare = [i for i, (_, item) in enumerate(pending["sql"]) if isinstance(item, str)]
+    if bare:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            questions = list(executor.map(vn.generate_question, [pending["sql"][i][1] for i in bare]))
+        for i, question in zip(bare, questions):
+            key, text = pending["sql"][i]
+            pending["sql"][i] = (key, (question, text))
+
+    batches = (
+        ("ddl", add_ddl_batch),
+        ("documentation", add_documentation_batch),
+        ("sql", add_question_sql_batch),
+    )
+    for kind, add_batch in batches:
+        if not pending[kind]:
+            continue
+        keys = [key for key, _ in pending[kind]]
+        ids = add_batch(vn, [item for _, item in pending[kind]])
+        for key, id in zip(keys, ids):
+            manifest[key] = {"kind": kind, "id": id}
+
+    save_manifest(manifest_path, manifest)
+    added = sum(len(items) for items in pending.values())
+    return {"added": added, "removed": removed, "unchanged": len(wanted) - added}
@@ -0,0 +1,151 @@
+import os
+import signal
+import socket
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+
+def _listen(host: str, port: int, backlog: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+class PreforkServer:
+    """
+    Serves a WSGI app from `workers` forked processes sharing one listening
+    socket (the kernel hands each connection to whichever worker accepts it
+    first), which sidesteps the GIL for the CPU-bound parts of a request:
+    retrieval, prompt building, pandas digests.
+
+    Workers fork before anything is built: create_app() runs in each of them,
+    so no threads, SQLite connections or HTTP pools cross the fork. State the
+    workers share lives in files, opened read-only: the SQLite database and a
+    NumpyVectorStore whose memory-mapped matrices the page cache holds once
+    for all of them. `writer`, when given, runs in one more process and is
+    the only one that trains; it publishes index snapshots that the workers
+    switch to on their own (NumpyVectorStore.refresh_snapshot()).
+
+    A worker or writer that dies is started again, at most once every
+    `respawn_delay` seconds; SIGTERM / SIGINT stop all of them.
+    """
+
+    def __init__(
+        self,
+        create_app: Callable[[], Any],
+        workers: Optional[int] = None,
+        host: str = "0.0.0.0",
+        port: int = 8084,
+        writer: Optional[Callable[[], Any]] = None,
+        threaded: bool = True,
+        backlog: int = 1024,
+        respawn_delay: float = 1.0,
+    ):
+        self.create_app = create_app
+        self.workers = workers or os.cpu_count() or 1
+        self.host = host
+        self.port = port
+        self.writer = writer
+        self.threaded = threaded
+        self.backlog = backlog
+        self.respawn_delay = respawn_delay
+        self._socket: Optional[socket.socket] = None
+        self._children: Dict[int, str] = {}
+        self._started: Dict[str, float] = {}
+        self._stopping = False
+
+    def _spawn(self, role: str) -> int:
+        last = self._started.get(role, 0.0)
+        if time.monotonic() - last < self.respawn_delay:
+            time.sleep(self.respawn_delay)
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                # Ctrl-C reaches the whole process group; the master turns it into SIGTERMs.
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                signal.signal(signal.SIGINT, signal.SIG_IGN)
+                if role == "writer":
+                    self._socket.close()
+                    self.writer()
+                else:
+                    self._serve()
+                code = 0
+            except BaseException:
+                import traceback
+
+                traceback.print_exc()
+            finally:
+                os._exit(code)
+        self._children[pid] = role
+        self._started[role] = time.monotonic()
+        return pid
+
+    def _serve(self):
+        from werkzeug.serving import make_server
+
+        app = self.create_app()
+        server = make_server(self.host, self.port, app, threaded=self.threaded, fd=self._socket.fileno())
+        # Finish the requests in flight on SIGTERM; shutdown() waits for
+        # serve_forever() to return, so it cannot run in the signal handler's thread.
+        signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(target=server.shutdown).start())
+        server.serve_forever()
+        server.server_close()
+
+    def _stop(self, signum, frame):
+        self._stopping = True
+        for pid in list(self._children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def run(self):
+        """Bind, fork the writer and the workers, and supervise them until stopped."""
+        self._socket = _listen(self.host, self.port, self.backlog)
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        if self.writer is not None:
+            self._spawn("writer")
+        for i in range(self.workers):
+            self._spawn(f"worker-{i}")
+        print(f"Serving on {self.host}:{self.port} with {self.workers} worker processes")
+        try:
+            while self._children:
+                try:
+                    pid, status = os.wait()
+                except ChildProcessError:
+                    break
+                role = self._children.pop(pid, None)
+                if role is None or self._stopping:
+                    continue
+                code = os.waitstatus_to_exitcode(status)
+                if role == "writer" and code == 0:
+                    continue
+                print(f"{role} (pid {pid}) exited with {code}; restarting it")
+                self._spawn(role)
+        finally:
+            self._socket.close()
+
+
+def serve(
+    create_app: Callable[[], Any],
+    workers: Optional[int] = None,
+    host: str = "0.0.0.0",
+    port: int = 8084,
+    writer: Optional[Callable[[], Any]] = None,
+):
+    """
+    PreforkServer(...).run(), or the single-process development server with
+    the writer on a thread where os.fork() is not available (Windows).
+    """
+    if not hasattr(os, "fork"):
+        if writer is not None:
+            threading.Thread(target=writer, name="writer", daemon=True).start()
+        create_app().run(host=host, port=port, use_reloader=False)
+        return
+    PreforkServer(create_app, workers, host, port, writer).run()
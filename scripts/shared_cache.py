@@ -0,0 +1,84 @@
+import os
+import time
+import uuid
+import pickle
+import sqlite3
+import threading
+from typing import Any, List
+
+from vanna.flask import Cache
+
+
+class SQLiteCache(Cache):
+    """
+    VannaFlaskApp cache (question, sql, df, figure... per id) in a SQLite file
+    instead of process memory, so the pre-forked workers of serving.py answer
+    a follow-up request (run_sql?id=, download_csv, generate_plotly_figure...)
+    for an id that another worker created. Values are pickled; ids expire
+    `ttl_seconds` after they were last written and only the newest `max_ids`
+    are kept.
+    """
+
+    def __init__(self, path: str = "flask_cache.db", ttl_seconds: float = 3600, max_ids: int = 1000):
+        self.ttl_seconds = ttl_seconds
+        self.max_ids = max_ids
+        self._writes = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute('''
+        CREATE TABLE IF NOT EXISTS flask_cache (
+            id TEXT,
+            field TEXT,
+            value BLOB,
+            updated_at REAL,
+            PRIMARY KEY (id, field)
+        )
+        ''')
+        self._conn.commit()
+
+    def generate_id(self, *args, **kwargs) -> str:
+        return str(uuid.uuid4())
+
+    def set(self, id, field, value):
+        now = time.time()
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO flask_cache VALUES (?, ?, ?, ?)", (id, field, blob, now))
+            self._writes += 1
+            if self._writes % 100 == 0:
+                self._prune(now)
+            self._conn.commit()
+
+    def _prune(self, now: float):
+        self._conn.execute("DELETE FROM flask_cache WHERE updated_at < ?", (now - self.ttl_seconds,))
+        self._conn.execute(
+            "DELETE FROM flask_cache WHERE id IN "
+            "(SELECT id FROM flask_cache GROUP BY id ORDER BY MAX(updated_at) DESC LIMIT -1 OFFSET ?)",
+            (self.max_ids,),
+        )
+
+    def get(self, id, field) -> Any:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM flask_cache WHERE id = ? AND field = ? AND updated_at >= ?",
+                (id, field, time.time() - self.ttl_seconds),
+            ).fetchone()
+        return pickle.loads(row[0]) if row is not None else None
+
+    def get_all(self, field_list) -> List[dict]:
+        with self._lock:
+            ids = [id for (id,) in self._conn.execute(
+                "SELECT id FROM flask_cache GROUP BY id HAVING MAX(updated_at) >= ? ORDER BY MIN(updated_at)",
+                (time.time() - self.ttl_seconds,),
+            )]
+        return [{"id": id, **{field: self.get(id=id, field=field) for field in field_list}} for id in ids]
+
+    def delete(self, id):
+        with self._lock:
+            self._conn.execute("DELETE FROM flask_cache WHERE id = ?", (id,))
+            self._conn.commit()
+
+    def close(self):
+        self._conn.close()
@@ -0,0 +1,172 @@
+import json
+import re
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Iterable, Iterator, List, Optional
+
+from instrumentation import current_span
+
+_SPACE_RE = re.compile(r"\s+")
+
+
+def _normalize(value):
+    if isinstance(value, str):
+        return _SPACE_RE.sub(" ", value).strip()
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    return value
+
+
+def request_key(*parts) -> str:
+    """Key for a request: its parts as canonical JSON, with whitespace in strings collapsed."""
+    return json.dumps(_normalize(list(parts)), sort_keys=True, default=str)
+
+
+class _Broadcast:
+    """Items of one upstream iterator, replayed to every follower as they arrive."""
+
+    def __init__(self):
+        self.items: List[Any] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.readers = 0  # followers still reading
+        self.changed = threading.Condition()
+
+    def publish(self, item: Any):
+        with self.changed:
+            self.items.append(item)
+            self.changed.notify_all()
+
+    def follow(self) -> Iterator[Any]:
+        position = 0
+        try:
+            while True:
+                with self.changed:
+                    while position >= len(self.items) and not self.done:
+                        self.changed.wait()
+                    items = self.items[position:]
+                    done, error = self.done, self.error
+                yield from items
+                position += len(items)
+                if done and position >= len(self.items):
+                    if error is not None:
+                        raise error
+                    return
+        finally:
+            with self.changed:
+                self.readers -= 1
+
+
+class SingleFlight:
+    """
+    Request coalescing: while a call for a key is in flight, identical calls
+    wait for it and share its result (or its exception) instead of repeating
+    the work. Nothing is cached once the call finishes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, Future] = {}
+        self._streams: Dict[Hashable, _Broadcast] = {}
+        self.leaders = 0
+        self.followers = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any], share: Optional[Callable[[Any], Any]] = None) -> Any:
+        """
+        fn() once per key at a time. Followers get share(result) when given,
+        e.g. a copy, so no caller sees another's in-place edits.
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+                self.leaders += 1
+            else:
+                self.followers += 1
+        if not leader:
+            current_span().set(coalesced=True)
+            result = future.result()
+            return share(result) if share is not None else result
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    def stream(self, key: Hashable, open_stream: Callable[[], Iterable[Any]]) -> Iterator[Any]:
+        """
+        Streaming variant: the first caller reads open_stream() and every
+        identical concurrent caller replays the same items as they arrive.
+        When the leader stops reading first (its client disconnected, or its
+        statement was complete), a background thread keeps reading for the
+        followers still attached, until they have all stopped too.
+        """
+        with self._lock:
+            broadcast = self._streams.get(key)
+            leader = broadcast is None
+            if leader:
+                broadcast = self._streams[key] = _Broadcast()
+                self.leaders += 1
+            else:
+                self.followers += 1
+                with broadcast.changed:
+                    broadcast.readers += 1
+        if not leader:
+            current_span().set(coalesced=True)
+            yield from broadcast.follow()
+            return
+
+        upstream = iter(open_stream())
+        handed_off = False
+        try:
+            for item in upstream:
+                broadcast.publish(item)
+                yield item
+        except GeneratorExit:
+            with self._lock:
+                with broadcast.changed:
+                    handed_off = broadcast.readers > 0
+                if not handed_off:
+                    del self._streams[key]  # no one joins a stream that is about to be closed
+            if handed_off:
+                threading.Thread(target=self._drain, args=(key, upstream, broadcast), name="single-flight-drain", daemon=True).start()
+            raise
+        except BaseException as e:
+            broadcast.error = e if isinstance(e, Exception) else None
+            raise
+        finally:
+            if not handed_off:
+                self._finish(key, upstream, broadcast)
+
+    def _drain(self, key: Hashable, upstream: Iterator[Any], broadcast: _Broadcast):
+        """Read on for the followers after the leader stopped, while any of them is still reading."""
+        try:
+            for item in upstream:
+                broadcast.publish(item)
+                with broadcast.changed:
+                    if broadcast.readers == 0:
+                        break
+        except Exception as e:
+            broadcast.error = e
+        finally:
+            self._finish(key, upstream, broadcast)
+
+    def _finish(self, key: Hashable, upstream: Iterator[Any], broadcast: _Broadcast):
+        with self._lock:
+            if self._streams.get(key) is broadcast:
+                del self._streams[key]
+        with broadcast.changed:
+            broadcast.done = True
+            broadcast.changed.notify_all()
+        close = getattr(upstream, "close", None)
+        if close is not None:
+            close()
@@ -0,0 +1,138 @@
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Optional, Sequence, Tuple
+
+from llm_transport import LLMTransport, LLMTransportError
+from sql_executor import prepare_sql
+from sql_guard import SQLGuard, SQLGuardError
+from sql_streaming import clean_sql, take_sql_statement
+from instrumentation import current_span
+
+DEFAULT_TEMPERATURES = (0.1, 0.4, 0.7, 1.0)
+
+
+class SpeculativeSQL:
+    """
+    Speculative SQL generation: `k` completions of the same prompt are
+    requested at once, at different temperatures, and the first one that is
+    valid wins. Each candidate streams (and stops as soon as its statement is
+    complete), then is dry-run on its own thread with guard.analyze(): it
+    must compile as an allowed read-only SELECT on the guard's read-only
+    connection and its EXPLAIN QUERY PLAN cost must be within guard.max_cost.
+    Without a guard, any non-empty statement is valid.
+
+    With `grace` > 0 the candidates that finish within that many seconds of
+    the first valid one compete too, and the cheapest plan wins. The streams
+    still running then stop at their next token, which closes the connection
+    and stops the server generating; candidates that have not started are
+    cancelled. When no candidate is valid, the first non-empty one is
+    returned, so repair and error reporting see it as before.
+
+    This trades extra LLM load for tail latency: a hard question no longer
+    waits for a manual retry after one bad or empty completion.
+    """
+
+    def __init__(
+        self,
+        transport: LLMTransport,
+        guard: Optional[SQLGuard] = None,
+        k: int = 3,
+        temperatures: Sequence[float] = DEFAULT_TEMPERATURES,
+        grace: float = 0.0,
+        max_tokens: int = 500,
+    ):
+        if k < 1:
+            raise ValueError(f"k must be at least 1, not {k}")
+        self.transport = transport
+        self.guard = guard
+        self.k = k
+        self.temperatures = [temperatures[i % len(temperatures)] for i in range(k)]
+        self.grace = grace
+        self.max_tokens = max_tokens
+        self.stats = {"requests": 0, "candidates": 0, "valid": 0, "cancelled": 0, "no_valid": 0}
+        self._lock = threading.Lock()
+        # Room for one question's candidates at once; past the transport's limit they queue for its slots anyway.
+        self._executor = ThreadPoolExecutor(max_workers=max(transport.max_concurrency, k), thread_name_prefix="sql-candidate")
+
+    def _count(self, **deltas):
+        with self._lock:
+            for key, delta in deltas.items():
+                self.stats[key] += delta
+
+    def _cost(self, sql: str) -> Optional[float]:
+        """Estimated cost of a valid candidate, None for an invalid one."""
+        if self.guard is None:
+            return 0.0
+        try:
+            report = self.guard.analyze(sql)
+        except SQLGuardError:
+            return None
+        return report["cost"] if report["cost"] <= self.guard.max_cost else None
+
+    def _candidate(self, prompt: str, temperature: float, stop: threading.Event) -> Tuple[str, Optional[float]]:
+        parts = []
+        stream = take_sql_statement(
+            self.transport.stream_complete(prompt, temperature=temperature, max_tokens=self.max_tokens)
+        )
+        try:
+            for token in stream:
+                if stop.is_set():
+                    self._count(cancelled=1)
+                    return "", None
+                parts.append(token)
+        finally:
+            stream.close()
+        sql = clean_sql("".join(parts))
+        if stop.is_set() or not prepare_sql(sql):
+            return sql, None
+        return sql, self._cost(sql)
+
+    def generate(self, prompt: str) -> str:
+        """The winning candidate's SQL ("" when every completion failed or came back empty)."""
+        stop = threading.Event()
+        futures = {
+            self._executor.submit(self._candidate, prompt, temperature, stop): temperature
+            for temperature in self.temperatures
+        }
+        pending = set(futures)
+        best: Optional[Tuple[float, str, float]] = None
+        fallback = ""
+        valid = 0
+        deadline: Optional[float] = None
+        try:
+            while pending:
+                timeout = None if deadline is None else max(deadline - time.monotonic(), 0.0)
+                done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                if not done:
+                    break
+                for future in done:
+                    try:
+                        sql, cost = future.result()
+                    except LLMTransportError as e:
+                        print(f"Error generating an SQL candidate: {e}")
+                        continue
+                    fallback = fallback or sql
+                    if cost is None:
+                        continue
+                    valid += 1
+                    if best is None or cost < best[0]:
+                        best = (cost, sql, futures[future])
+                if best is not None:
+                    if self.grace <= 0:
+                        break
+                    if deadline is None:
+                        deadline = time.monotonic() + self.grace
+        finally:
+            stop.set()
+            for future in pending:
+                if future.cancel():
+                    self._count(cancelled=1)
+        self._count(requests=1, candidates=self.k, valid=valid, no_valid=int(best is None))
+        current_span().set(
+            candidates=self.k, valid_candidates=valid, temperature=best[2] if best is not None else None
+        )
+        return best[1] if best is not None else fallback
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
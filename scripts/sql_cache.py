@@ -0,0 +1,213 @@
+import re
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+import numpy as np
+
+from embeddings import HashingEmbedder
+from instrumentation import span
+
+_SPACE_RE = re.compile(r"\s+")
+_LITERAL_RE = re.compile(
+    r"'[^']*'|\"[^\"]*\"|\d+(?:\.\d+)?|<=|>=|!=|<>|[<>=]|n't\b|[A-Za-z][\w-]*",
+)
+# Words that change which rows a question means; the embedding barely notices them.
+_QUALIFIER_WORDS = {
+    "above", "below", "over", "under", "more", "less", "greater", "fewer", "least", "most", "exceeds",
+    "exceeding", "between", "not", "no", "none", "never", "without", "except", "exactly", "equal", "equals",
+    "before", "after", "since", "until", "last", "ago",
+}
+
+
+def normalize_question(question: str) -> str:
+    """Lower-case, collapse whitespace and drop trailing punctuation."""
+    return _SPACE_RE.sub(" ", question.strip().lower()).rstrip(" ?.!;")
+
+
+def question_literals(question: str) -> str:
+    """
+    The parts of a question its SQL depends on verbatim: quoted strings,
+    numbers, comparison operators and words, negations, and capitalised words
+    after the first (names, codes such as Type-3). Two questions that embed
+    alike but differ here need different SQL.
+    """
+    literals = []
+    for i, match in enumerate(_LITERAL_RE.finditer(question.strip())):
+        token = match.group()
+        if token[0].isalpha():
+            if token.lower() in _QUALIFIER_WORDS:
+                token = token.lower()
+            elif i == 0 or not token[0].isupper():
+                continue
+        literals.append(token)
+    return " ".join(literals)
+
+
+class SemanticSQLCache:
+    """
+    Two-tier question -> SQL cache in front of the LLM call.
+
+    Tier one is an in-process LRU keyed on (schema_version, normalised question).
+    Tier two is a SQLite table holding the question embedding next to the SQL;
+    a miss in tier one falls back to a cosine lookup over the tier-two entries
+    for the same schema version and accepts the best match above `threshold`
+    whose literals (question_literals: numbers, names, quoted values,
+    comparisons, negations) are exactly the question's.
+    Entries expire after `ttl_seconds`, and the table is trimmed to
+    `max_entries` by least-recent use. Seeing a new schema_version drops every
+    entry generated against an older one.
+    """
+
+    def __init__(
+        self,
+        path: str = "sql_cache.db",
+        embedder=None,
+        threshold: float = 0.92,
+        ttl_seconds: float = 24 * 3600,
+        max_entries: int = 5000,
+        lru_size: int = 256,
+    ):
+        self.embedder = embedder or HashingEmbedder()
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.lru_size = lru_size
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._lru: "OrderedDict[Tuple[str, str], str]" = OrderedDict()
+        self._schema_version: Optional[str] = None
+        self._matrix: Optional[np.ndarray] = None
+        self._keys: list = []
+        self._literals = np.zeros(0, dtype=object)
+        self._positions: dict = {}
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute('''
+        CREATE TABLE IF NOT EXISTS sql_cache (
+            schema_version TEXT,
+            question TEXT,
+            embedding BLOB,
+            sql TEXT,
+            created_at REAL,
+            last_used REAL,
+            literals TEXT,
+            PRIMARY KEY (schema_version, question)
+        )
+        ''')
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(sql_cache)")}
+        if "literals" not in columns:
+            # Entries from before the column only ever match their own question.
+            self._conn.execute("ALTER TABLE sql_cache ADD COLUMN literals TEXT")
+        self._conn.commit()
+
+    def _check_version(self, schema_version: str):
+        if schema_version == self._schema_version:
+            return
+        self._schema_version = schema_version
+        self._lru.clear()
+        self._matrix = None
+        self._conn.execute("DELETE FROM sql_cache WHERE schema_version != ?", (schema_version,))
+        self._conn.commit()
+
+    def _load_matrix(self):
+        cutoff = time.time() - self.ttl_seconds
+        rows = self._conn.execute(
+            "SELECT question, embedding, literals FROM sql_cache WHERE schema_version = ? AND created_at >= ?",
+            (self._schema_version, cutoff),
+        ).fetchall()
+        self._keys = [question for question, _, _ in rows]
+        self._literals = np.array([literals for _, _, literals in rows], dtype=object)
+        self._positions = {question: i for i, question in enumerate(self._keys)}
+        if rows:
+            self._matrix = np.frombuffer(b"".join(blob for _, blob, _ in rows), dtype=np.float32).reshape(len(rows), -1)
+        else:
+            self._matrix = np.zeros((0, self.embedder.dim), dtype=np.float32)
+
+    def _remember(self, key: Tuple[str, str], sql: str):
+        self._lru[key] = sql
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
+
+    def get(self, question: str, schema_version: str) -> Optional[str]:
+        with span("sql_cache") as s:
+            sql = self._get(question, schema_version)
+            s.set(cache_hit=sql is not None)
+            return sql
+
+    def _get(self, question: str, schema_version: str) -> Optional[str]:
+        normalized = normalize_question(question)
+        key = (schema_version, normalized)
+        with self._lock:
+            self._check_version(schema_version)
+            sql = self._lru.get(key)
+            if sql is not None:
+                self._lru.move_to_end(key)
+                self.hits += 1
+                return sql
+
+            if self._matrix is None:
+                self._load_matrix()
+            if len(self._keys) == 0:
+                self.misses += 1
+                return None
+            # Only entries with the same literals compete, except the question itself.
+            allowed = self._literals == question_literals(question)
+            exact = self._positions.get(normalized)
+            if exact is not None:
+                allowed[exact] = True
+            scores = np.where(allowed, self._matrix @ self.embedder.embed(normalized), -np.inf)
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                self.misses += 1
+                return None
+            row = self._conn.execute(
+                "SELECT sql, created_at FROM sql_cache WHERE schema_version = ? AND question = ?",
+                (schema_version, self._keys[best]),
+            ).fetchone()
+            if row is None or row[1] < time.time() - self.ttl_seconds:
+                self._matrix = None
+                self.misses += 1
+                return None
+            self._conn.execute(
+                "UPDATE sql_cache SET last_used = ? WHERE schema_version = ? AND question = ?",
+                (time.time(), schema_version, self._keys[best]),
+            )
+            self._conn.commit()
+            self._remember(key, row[0])
+            self.hits += 1
+            if self._keys[best] != normalized:
+                self.semantic_hits += 1
+            return row[0]
+
+    def put(self, question: str, schema_version: str, sql: str):
+        normalized = normalize_question(question)
+        now = time.time()
+        embedding = self.embedder.embed(normalized).astype(np.float32)
+        with self._lock:
+            self._check_version(schema_version)
+            self._remember((schema_version, normalized), sql)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sql_cache VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (schema_version, normalized, embedding.tobytes(), sql, now, now, question_literals(question)),
+            )
+            self._conn.execute("DELETE FROM sql_cache WHERE created_at < ?", (now - self.ttl_seconds,))
+            self._conn.execute(
+                "DELETE FROM sql_cache WHERE rowid IN "
+                "(SELECT rowid FROM sql_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self._conn.commit()
+            self._matrix = None
+
+    def clear(self):
+        with self._lock:
+            self._lru.clear()
+            self._matrix = None
+            self._conn.execute("DELETE FROM sql_cache")
+            self._conn.commit()
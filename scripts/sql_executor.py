@@ -0,0 +1,320 @@
+import os
+import re
+import time
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from sql_streaming import clean_sql
+from instrumentation import span
+from single_flight import SingleFlight
+
+
+def enable_wal(db_path: str):
+    """Switch a database to WAL so pooled readers never block on (or behind) a writer."""
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+    finally:
+        conn.close()
+
+
+DEFAULT_MAX_ROWS = 10000
+
+
+class QueryTimeoutError(sqlite3.OperationalError):
+    """A statement was interrupted for running past its time budget."""
+
+
+@contextmanager
+def time_budget(conn: sqlite3.Connection, seconds: Optional[float], every: int = 10000):
+    """
+    Interrupt whatever conn executes once `seconds` have passed, raising
+    QueryTimeoutError. The progress handler runs every `every` VM instructions,
+    so a runaway join fails within milliseconds of the deadline.
+    """
+    if not seconds:
+        yield
+        return
+    deadline = time.monotonic() + seconds
+    conn.set_progress_handler(lambda: time.monotonic() > deadline, every)
+    try:
+        yield
+    except sqlite3.OperationalError as e:
+        if time.monotonic() > deadline and "interrupt" in str(e):
+            raise QueryTimeoutError(f"Query exceeded its {seconds:g} s time budget") from e
+        raise
+    finally:
+        conn.set_progress_handler(None, every)
+
+_TRAILING_SEMICOLONS_RE = re.compile(r"[\s;]+$")
+# Quoted strings and identifiers and comments are kept verbatim; whitespace anywhere else is collapsed.
+_VERBATIM_OR_SPACE_RE = re.compile(
+    r"(?P<verbatim>'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|`[^`]*`|\[[^\]]*\]|--[^\n]*\n?|/\*.*?(?:\*/|$))|\s+",
+    re.DOTALL,
+)
+
+
+def normalize_whitespace(sql: str) -> str:
+    """Collapse whitespace between tokens only, so 'A  B' and 'A B' stay different queries."""
+    return _VERBATIM_OR_SPACE_RE.sub(lambda m: m.group("verbatim") or " ", sql).strip()
+
+
+def limit_sql(sql: str, max_rows: int, offset: int = 0) -> str:
+    """
+    Wrap a SELECT/WITH statement so it returns at most max_rows rows starting
+    at offset. Wrapping (rather than editing the LIMIT clause) also caps
+    queries that already carry their own, larger LIMIT.
+    """
+    body = _TRAILING_SEMICOLONS_RE.sub("", sql)
+    limited = f"SELECT * FROM (\n{body}\n) LIMIT {int(max_rows)}"
+    if offset:
+        limited += f" OFFSET {int(offset)}"
+    return limited
+
+
+def limit_run_sql(vn, max_rows: int = DEFAULT_MAX_ROWS):
+    """Wrap a connected Vanna instance's run_sql so every query gets the row guard."""
+    run_sql = vn.run_sql
+
+    def run_sql_limited(sql: str, **kwargs):
+        with span("sql") as s:
+            df = run_sql(limit_sql(sql, max_rows), **kwargs)
+            s.set(rows=len(df))
+            return df
+
+    vn.run_sql = run_sql_limited
+    return vn
+
+
+@lru_cache(maxsize=1024)
+def prepare_sql(text: str) -> str:
+    """Cleaned SQL for an LLM response; cached so repeated questions reuse the same text (and statement)."""
+    return clean_sql(text)
+
+
+def _column_array(values: tuple) -> np.ndarray:
+    kinds = set(map(type, values))
+    if kinds == {int}:
+        return np.fromiter(values, dtype=np.int64, count=len(values))
+    if kinds - {type(None)} and kinds <= {int, float, type(None)}:
+        return np.array(values, dtype=np.float64)
+    return np.array(values, dtype=object)
+
+
+class ReadOnlyConnectionPool:
+    """
+    Thread-safe pool of read-only SQLite connections (URI mode=ro, query_only).
+
+    Each connection gets a larger page cache, memory-mapped I/O and a bigger
+    prepared-statement cache (`cached_statements`), so repeated queries skip
+    re-parsing. Connections are reused LIFO, keeping the hottest cache warm.
+    With `query_timeout` set, execute(), execute_columnar() and the streaming
+    iter_rows()/iter_frames()/export_parquet() abort any single query after
+    that many seconds (QueryTimeoutError). With `coalesce`,
+    identical concurrent execute()/execute_columnar() calls against the same
+    database snapshot (file and WAL size and mtime) run the query once.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        size: int = 4,
+        timeout: float = 30.0,
+        cache_size_kib: int = 64 * 1024,
+        mmap_size: int = 256 * 1024 * 1024,
+        cached_statements: int = 256,
+        query_timeout: Optional[float] = None,
+        coalesce: bool = True,
+    ):
+        self.db_path = db_path
+        self.size = size
+        self.timeout = timeout
+        self.cache_size_kib = cache_size_kib
+        self.mmap_size = mmap_size
+        self.cached_statements = cached_statements
+        self.query_timeout = query_timeout
+        self.coalesce = coalesce
+        self._flights = SingleFlight()
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            f"file:{self.db_path}?mode=ro",
+            uri=True,
+            check_same_thread=False,
+            cached_statements=self.cached_statements,
+        )
+        conn.execute("PRAGMA query_only=1")
+        conn.execute(f"PRAGMA cache_size=-{int(self.cache_size_kib)}")
+        conn.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                try:
+                    return self._connect()
+                except sqlite3.Error:
+                    self._created -= 1
+                    raise
+        return self._idle.get(timeout=self.timeout)
+
+    def release(self, conn: sqlite3.Connection):
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def _snapshot(self) -> tuple:
+        """Changes whenever a writer commits: size and mtime of the database and its WAL."""
+        snapshot = []
+        for path in (self.db_path, self.db_path + "-wal"):
+            try:
+                stat = os.stat(path)
+                snapshot.append((stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                snapshot.append(None)
+        return tuple(snapshot)
+
+    def _coalesced(self, kind: str, sql: str, params, run, share):
+        if not self.coalesce:
+            return run(sql, params)
+        frozen = tuple(sorted(params.items())) if isinstance(params, dict) else tuple(params)
+        key = (kind, normalize_whitespace(sql), frozen, self._snapshot())
+        return self._flights.do(key, lambda: run(sql, params), share=share)
+
+    def execute(self, sql: str, params=()) -> Tuple[List[str], List[tuple]]:
+        """Run one query and return (column_names, rows)."""
+        with span("sql") as s:
+            columns, rows = self._coalesced("rows", sql, params, self._execute, lambda r: (list(r[0]), list(r[1])))
+            s.set(rows=len(rows))
+            return columns, rows
+
+    def _execute(self, sql: str, params) -> Tuple[List[str], List[tuple]]:
+        with self.connection() as conn, time_budget(conn, self.query_timeout):
+            cursor = conn.execute(sql, params)
+            columns = [desc[0] for desc in cursor.description or []]
+            return columns, cursor.fetchall()
+
+    def execute_columnar(self, sql: str, params=(), chunk_size: int = 10000) -> Tuple[List[str], List[np.ndarray]]:
+        """
+        Run one query and return (column_names, one ndarray per column). Rows are
+        transposed a chunk at a time, so the full list of row tuples is never
+        held alongside the arrays; numeric columns come back as int64/float64
+        (float64 with NaN where there are NULLs).
+        """
+        with span("sql") as s:
+            columns, arrays = self._coalesced(
+                "columnar", sql, params,
+                lambda sql, params: self._execute_columnar(sql, params, chunk_size),
+                lambda r: (list(r[0]), [a.copy() for a in r[1]]),
+            )
+            s.set(rows=len(arrays[0]) if arrays else 0)
+        return columns, arrays
+
+    def _execute_columnar(self, sql: str, params, chunk_size: int) -> Tuple[List[str], List[np.ndarray]]:
+        with self.connection() as conn, time_budget(conn, self.query_timeout):
+            cursor = conn.execute(sql, params)
+            columns = [desc[0] for desc in cursor.description or []]
+            chunks: List[List[np.ndarray]] = [[] for _ in columns]
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                for i, values in enumerate(zip(*rows)):
+                    chunks[i].append(_column_array(values))
+        arrays = [np.concatenate(parts) if parts else np.array([], dtype=object) for parts in chunks]
+        return columns, arrays
+
+    def execute_df(self, sql: str, params=(), chunk_size: int = 10000) -> pd.DataFrame:
+        columns, arrays = self.execute_columnar(sql, params, chunk_size)
+        df = pd.DataFrame(dict(enumerate(arrays)), copy=False)
+        df.columns = columns
+        return df
+
+    def iter_rows(self, sql: str, params=(), chunk_size: int = 1000) -> Iterator[Tuple[List[str], List[tuple]]]:
+        """
+        Yield (column_names, rows) one fetchmany chunk at a time. The pooled
+        connection is held until the generator is exhausted or closed, and
+        query_timeout bounds the whole read, as for execute().
+        """
+        with self.connection() as conn, time_budget(conn, self.query_timeout):
+            cursor = conn.execute(sql, params)
+            columns = [desc[0] for desc in cursor.description or []]
+            try:
+                while True:
+                    rows = cursor.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    yield columns, rows
+            finally:
+                cursor.close()
+
+    def iter_frames(self, sql: str, params=(), chunk_size: int = 10000) -> Iterator[pd.DataFrame]:
+        for columns, rows in self.iter_rows(sql, params, chunk_size):
+            df = pd.DataFrame(dict(enumerate(_column_array(values) for values in zip(*rows))), copy=False)
+            df.columns = columns
+            yield df
+
+    def fetch_page(self, sql: str, page: int, page_size: int) -> Tuple[pd.DataFrame, bool]:
+        """One page of a query's result and whether another page follows."""
+        df = self.execute_df(limit_sql(sql, page_size + 1, offset=page * page_size))
+        return df.iloc[:page_size], len(df) > page_size
+
+    def export_parquet(self, sql: str, path: str, chunk_size: int = 50000) -> int:
+        """
+        Spill a query's full result to a Parquet file one row group per chunk,
+        so memory stays bounded by chunk_size. Requires pyarrow. Returns rows written.
+        """
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Parquet export requires pyarrow; install it with `pip install pyarrow`")
+
+        writer: Optional["pq.ParquetWriter"] = None
+        total = 0
+        try:
+            for df in self.iter_frames(sql, chunk_size=chunk_size):
+                table = pa.Table.from_pandas(df, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(path, table.schema)
+                else:
+                    table = table.cast(writer.schema)
+                writer.write_table(table)
+                total += len(df)
+        finally:
+            if writer is not None:
+                writer.close()
+        return total
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+        with self._lock:
+            self._created = 0
@@ -0,0 +1,267 @@
+import re
+import sqlite3
+import threading
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from sql_executor import DEFAULT_MAX_ROWS, limit_sql, prepare_sql
+from instrumentation import span
+
+# Authorizer actions a read-only query may perform; anything else (writes,
+# PRAGMA, ATTACH, DDL, transactions) makes the statement fail to compile.
+_ALLOWED_ACTIONS = {sqlite3.SQLITE_SELECT, sqlite3.SQLITE_READ, sqlite3.SQLITE_FUNCTION, sqlite3.SQLITE_RECURSIVE}
+
+DENIED_FUNCTIONS = {"load_extension", "randomblob", "zeroblob", "readfile", "writefile", "edit", "fts3_tokenizer"}
+
+_STATEMENT_RE = re.compile(r"^\s*(SELECT|WITH|VALUES)\b", re.IGNORECASE)
+_TRAILING_LIMIT_RE = re.compile(r"\bLIMIT\s+\d+(\s*(OFFSET|,)\s*\d+)?[\s;]*$", re.IGNORECASE)
+_PLAN_RE = re.compile(r"^(SCAN|SEARCH) (\S+)(.*)$")
+
+# Rows assumed for SEARCH steps and for scans of CTEs/subqueries, whose size
+# EXPLAIN QUERY PLAN does not report.
+SEARCH_ROWS = 10
+DERIVED_ROWS = 1000
+
+
+class SQLGuardError(ValueError):
+    """Generated SQL was rejected before execution."""
+
+
+class SQLGuard:
+    """
+    Pre-execution checks for LLM-generated SQL against a SQLite database:
+
+    - the statement must compile as a single read-only SELECT (an authorizer
+      denies writes, PRAGMA, ATTACH, DDL and dangerous functions);
+    - every table/view it reads must exist in the introspected schema (and be
+      in `allowed_tables` when given); unknown columns fail to compile;
+    - EXPLAIN QUERY PLAN gives a rough row-visit estimate (each nested loop
+      level's rows times those of the levels outside it, summed, with table
+      sizes from sqlite_stat1 or MAX(rowid)); above `max_cost` the query
+      is refused, e.g. an unconstrained parts x part_distributors x distributors join;
+    - a full scan of a table with at least `large_table_rows` rows is either
+      wrapped in a LIMIT of `max_rows` (on_full_scan="limit"), refused
+      ("reject") or let through ("allow").
+
+    check() returns the SQL to run; analyze() returns the findings. Statements
+    that pass are recorded in `workload` (an index_advisor.WorkloadLog) when given.
+    With a `materializer` (materialized.MaterializedAggregates), aggregates a
+    summary table can answer are rewritten to read it instead; they skip the
+    cost and full-scan checks, which apply to the base tables.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        max_cost: float = 50_000_000,
+        large_table_rows: int = 1_000_000,
+        max_rows: int = DEFAULT_MAX_ROWS,
+        on_full_scan: str = "limit",
+        allowed_tables: Optional[Iterable[str]] = None,
+        workload=None,
+        materializer=None,
+    ):
+        if on_full_scan not in ("limit", "reject", "allow"):
+            raise ValueError(f"on_full_scan must be 'limit', 'reject' or 'allow', not {on_full_scan!r}")
+        self.db_path = db_path
+        self.max_cost = max_cost
+        self.large_table_rows = large_table_rows
+        self.max_rows = max_rows
+        self.on_full_scan = on_full_scan
+        self.allowed_tables = {t.lower() for t in allowed_tables} if allowed_tables is not None else None
+        self.workload = workload
+        self.materializer = materializer
+        # A private connection without a statement cache: the authorizer only
+        # runs when a statement is compiled, so cached statements would skip it.
+        self._conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, check_same_thread=False, cached_statements=0)
+        self._conn.execute("PRAGMA query_only=1")
+        self._lock = threading.Lock()
+        self._schema: Optional[Set[str]] = None
+        self._views: Set[str] = set()
+        self._row_counts: Dict[str, int] = {}
+
+    def refresh(self):
+        """Forget the introspected schema and table sizes (after DDL or bulk loads)."""
+        with self._lock:
+            self._schema = None
+            self._row_counts.clear()
+
+    def _tables(self) -> Set[str]:
+        if self._schema is None:
+            rows = self._conn.execute(
+                "SELECT name, type FROM sqlite_master WHERE type IN ('table', 'view') AND name NOT LIKE 'sqlite_%'"
+            ).fetchall()
+            self._schema = {name.lower() for name, _ in rows}
+            self._views = {name.lower() for name, type in rows if type == "view"}
+        return self._schema
+
+    def table_rows(self, table: str) -> int:
+        """Approximate row count: sqlite_stat1 when ANALYZE has run, else MAX(rowid)."""
+        key = table.lower()
+        if key not in self._row_counts:
+            rows = None
+            try:
+                row = self._conn.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = ? COLLATE NOCASE LIMIT 1", (table,)).fetchone()
+                if row and row[0]:
+                    rows = int(row[0].split()[0])
+            except sqlite3.Error:
+                pass
+            if rows is None:
+                try:
+                    rows = self._conn.execute(f'SELECT MAX(rowid) FROM "{table}"').fetchone()[0] or 0
+                except sqlite3.Error:
+                    rows = 0
+            self._row_counts[key] = rows
+        return self._row_counts[key]
+
+    def _aliases(self, sql: str, tables: Set[str]) -> Dict[str, str]:
+        """Alias -> table for the tables the query reads (EXPLAIN QUERY PLAN reports aliases)."""
+        aliases = {t: t for t in tables}
+        for table in tables:
+            for alias in re.findall(rf'\b"?{re.escape(table)}"?\s+(?:AS\s+)?("?\w+"?)', sql, re.IGNORECASE):
+                alias = alias.strip('"').lower()
+                if alias not in _SQL_KEYWORDS:
+                    aliases[alias] = table
+        return aliases
+
+    def _estimate(self, plan: List[Tuple[int, int, str]], aliases: Dict[str, str]) -> Tuple[float, List[Tuple[str, int]]]:
+        children: Dict[int, List[Tuple[int, str]]] = defaultdict(list)
+        for id, parent, detail in plan:
+            children[parent].append((id, detail))
+        full_scans: List[Tuple[str, int]] = []
+
+        def cost(node: int) -> float:
+            # Sibling SCAN / SEARCH rows are the levels of a nested loop: each
+            # visits its rows once per row of the levels before it.
+            loop, total = 1.0, 0.0
+            for id, detail in children.get(node, []):
+                match = _PLAN_RE.match(detail)
+                if match is None:
+                    sub = cost(id)
+                    total += sub * loop if detail.startswith("CORRELATED") else sub
+                    continue
+                kind, name, rest = match.group(1), match.group(2).lower(), match.group(3)
+                table = aliases.get(name)
+                rows = self.table_rows(table) if table else DERIVED_ROWS
+                if kind == "SCAN":
+                    loop *= max(rows, 1)
+                    if table and rows >= self.large_table_rows:
+                        full_scans.append((table, rows))
+                elif "rowid=?" in rest or "PRIMARY KEY" in rest and "=" in rest:
+                    loop *= 1
+                elif ">" in rest or "<" in rest:
+                    loop *= max(rows // 4, 1)
+                else:
+                    loop *= SEARCH_ROWS
+                total += loop
+                if id in children:
+                    total += cost(id) * loop
+            return total
+
+        return cost(0), full_scans
+
+    def analyze(self, sql: str) -> Dict[str, Any]:
+        """
+        Compile the statement under the authorizer and estimate its cost.
+        Returns tables, columns, plan, cost (row visits) and full_scans;
+        raises SQLGuardError when the statement is not an allowed read.
+        """
+        sql = prepare_sql(sql)
+        if not sql:
+            raise SQLGuardError("No SQL statement found")
+        if not _STATEMENT_RE.match(sql):
+            raise SQLGuardError("Only SELECT statements are allowed")
+
+        reads: Set[Tuple[str, str]] = set()
+        denied: List[str] = []
+        with self._lock:
+            # Loaded up front: the authorizer must not run SQL on the connection it is guarding.
+            known = set(self._tables())
+            views = set(self._views)
+
+        def authorizer(action, arg1, arg2, db_name, trigger_or_view):
+            if action not in _ALLOWED_ACTIONS:
+                denied.append(f"action {action}")
+                return sqlite3.SQLITE_DENY
+            if action == sqlite3.SQLITE_FUNCTION and (arg2 or "").lower() in DENIED_FUNCTIONS:
+                denied.append(f"function {arg2}")
+                return sqlite3.SQLITE_DENY
+            if action == sqlite3.SQLITE_READ and arg1:
+                table = arg1.lower()
+                # Reads made on behalf of a view are checked as the view itself. SQLite
+                # also passes a CTE's name here; reads inside a WITH are checked as usual.
+                if trigger_or_view is None or trigger_or_view.lower() not in views:
+                    if table not in known or (self.allowed_tables is not None and table not in self.allowed_tables):
+                        denied.append(f"table {arg1}")
+                        return sqlite3.SQLITE_DENY
+                    reads.add((table, (arg2 or "").lower()))
+            return sqlite3.SQLITE_OK
+
+        with span("sql_guard") as s, self._lock:
+            self._conn.set_authorizer(authorizer)
+            try:
+                plan = [(row[0], row[1], row[3]) for row in self._conn.execute(f"EXPLAIN QUERY PLAN {sql}")]
+            except sqlite3.DatabaseError as e:
+                if denied:
+                    raise SQLGuardError(f"Statement not allowed ({', '.join(sorted(set(denied)))})") from e
+                raise SQLGuardError(f"Invalid SQL: {e}") from e
+            except sqlite3.Warning as e:
+                raise SQLGuardError(f"Only one statement may be executed: {e}") from e
+            finally:
+                self._conn.set_authorizer(None)
+            tables = {table for table, _ in reads}
+            estimated, full_scans = self._estimate(plan, self._aliases(sql, tables))
+            s.set(cost=estimated)
+        return {
+            "sql": sql,
+            "tables": sorted(tables),
+            "columns": sorted(f"{t}.{c}" for t, c in reads if c),
+            "plan": plan,
+            "cost": estimated,
+            "full_scans": full_scans,
+        }
+
+    def check(self, sql: str, auto_limit: bool = True) -> str:
+        """The SQL to execute (possibly wrapped in a LIMIT), or SQLGuardError."""
+        report = self.analyze(sql)
+        sql = report["sql"]
+        rewritten = self.materializer.rewrite(sql) if self.materializer is not None else sql
+        if rewritten == sql and report["cost"] > self.max_cost:
+            raise SQLGuardError(
+                f"Query too expensive: about {report['cost']:,.0f} row visits (limit {self.max_cost:,.0f}); "
+                "add filters or join conditions"
+            )
+        if self.workload is not None:
+            self.workload.record(sql, report["cost"])
+        if rewritten != sql:
+            return rewritten
+        if report["full_scans"] and self.on_full_scan != "allow":
+            scanned = ", ".join(f"{table} ({rows:,} rows)" for table, rows in report["full_scans"])
+            if self.on_full_scan == "reject":
+                raise SQLGuardError(f"Full scan of large table refused: {scanned}")
+            if auto_limit and not _TRAILING_LIMIT_RE.search(sql):
+                sql = limit_sql(sql, self.max_rows)
+        return sql
+
+    def close(self):
+        self._conn.close()
+
+
+_SQL_KEYWORDS = {
+    "where", "join", "inner", "left", "right", "full", "cross", "natural", "on", "using", "group", "order",
+    "limit", "having", "union", "except", "intersect", "window", "as", "set", "values", "select", "from", "and", "or",
+}
+
+
+def guarded_run_sql(vn, pool, guard: SQLGuard, max_rows: int = DEFAULT_MAX_ROWS):
+    """
+    Point a Vanna instance's run_sql at a ReadOnlyConnectionPool, with every
+    query checked by guard, capped at max_rows and bounded by the pool's
+    query_timeout. Call after connect_to_sqlite (which sets the dialect).
+    """
+    def run_sql(sql: str, **kwargs):
+        return pool.execute_df(limit_sql(guard.check(sql, auto_limit=False), max_rows))
+
+    vn.run_sql = run_sql
+    vn.run_sql_is_set = True
+    return vn
@@ -0,0 +1,185 @@
+import re
+import time
+import sqlite3
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Any, Callable, List, Optional, Tuple
+
+from sql_executor import QueryTimeoutError, prepare_sql
+from sql_guard import SQLGuardError
+from instrumentation import span
+
+_SPACE_RE = re.compile(r"\s+")
+_CREATE_RE = re.compile(r'^\s*CREATE\s+(?:TABLE|VIEW)\s+(?:IF\s+NOT\s+EXISTS\s+)?"?(\w+)"?', re.IGNORECASE)
+
+# Errors a better statement can fix; a time-out or a refused write is not one of them.
+REPAIRABLE_ERRORS = (sqlite3.Error, SQLGuardError)
+
+_llm_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="sql-repair")
+
+
+def _normalize(sql: str) -> str:
+    return _SPACE_RE.sub(" ", prepare_sql(sql)).strip().rstrip(";").lower()
+
+
+def _repairable(error: Exception) -> bool:
+    if isinstance(error, QueryTimeoutError):
+        return False
+    if isinstance(error, SQLGuardError) and str(error).startswith("Only SELECT"):
+        return False
+    return isinstance(error, REPAIRABLE_ERRORS)
+
+
+class SQLRepairer:
+    """
+    Automatic correction stage for generated SQL that fails to run.
+
+    run() executes the statement; on a SQLite error (or a SQLGuard refusal
+    such as an unknown column or a too-expensive join) it re-prompts the LLM
+    with the question, the failing SQL, the error and the DDL of the tables
+    involved, up to `max_retries` times, all within `budget_seconds` for the
+    whole request. A correction that works is stored (in `path`, keyed on the
+    failing statement and the schema), so the next time that statement is
+    generated it is swapped for the fix before anything runs.
+    """
+
+    def __init__(
+        self,
+        vn,
+        schema_ddl: List[str],
+        max_retries: int = 2,
+        budget_seconds: float = 20.0,
+        path: str = "sql_cache.db",
+    ):
+        self.vn = vn
+        self.schema_ddl = list(schema_ddl)
+        self.max_retries = max_retries
+        self.budget_seconds = budget_seconds
+        self.schema_version = hashlib.sha256("\n".join(self.schema_ddl).encode("utf-8")).hexdigest()[:16]
+        self.stats = {"failures": 0, "repaired": 0, "unrepaired": 0, "llm_calls": 0, "correction_hits": 0}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute('''
+        CREATE TABLE IF NOT EXISTS sql_corrections (
+            schema_version TEXT,
+            failing_sql TEXT,
+            sql TEXT,
+            error TEXT,
+            hits INTEGER DEFAULT 0,
+            created_at REAL,
+            PRIMARY KEY (schema_version, failing_sql)
+        )
+        ''')
+        self._conn.execute("DELETE FROM sql_corrections WHERE schema_version != ?", (self.schema_version,))
+        self._conn.commit()
+
+    def _count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+
+    def correction(self, sql: str) -> Optional[str]:
+        """The stored fix for a statement known to fail, if any."""
+        key = _normalize(sql)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT sql FROM sql_corrections WHERE schema_version = ? AND failing_sql = ?",
+                (self.schema_version, key),
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE sql_corrections SET hits = hits + 1 WHERE schema_version = ? AND failing_sql = ?",
+                (self.schema_version, key),
+            )
+            self._conn.commit()
+            self.stats["correction_hits"] += 1
+        return row[0]
+
+    def _remember(self, failing: List[Tuple[str, str]], sql: str):
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO sql_corrections (schema_version, failing_sql, sql, error, created_at) VALUES (?, ?, ?, ?, ?)",
+                [(self.schema_version, _normalize(bad), sql, error, now) for bad, error in failing],
+            )
+            self._conn.commit()
+
+    def schema_slice(self, sql: str, error: str) -> List[str]:
+        """DDL of the tables the failing statement (or its error) mentions; all of it when none match."""
+        words = {w.lower() for w in re.findall(r"\w+", f"{sql} {error}")}
+        related = [ddl for ddl in self.schema_ddl if (m := _CREATE_RE.match(ddl)) and m.group(1).lower() in words]
+        return related or [ddl for ddl in self.schema_ddl if _CREATE_RE.match(ddl)]
+
+    def repair_prompt(self, question: str, sql: str, error: str) -> str:
+        schema = "\n\n".join(ddl.strip() for ddl in self.schema_slice(sql, error))
+        return (
+            "The SQLite query below was written to answer a question but failed.\n\n"
+            f"Question: {question}\n\n"
+            f"SQL:\n{sql}\n\n"
+            f"Error: {error}\n\n"
+            f"Schema:\n{schema}\n\n"
+            "Use only the tables and columns in the schema. "
+            "Return only the corrected SQL query, without explanation or markdown."
+        )
+
+    def _ask(self, prompt: str, timeout: float) -> str:
+        vn = self.vn
+        # VannaBase chat backends (OpenAI_Chat, LMStudioChat) take a message log; those whose
+        # submit_prompt() takes the prompt string (llm_studio.LLMStudioVanna) set text_prompts.
+        if getattr(vn, "text_prompts", not hasattr(vn, "get_sql_prompt")):
+            message = prompt
+        else:
+            message = [vn.system_message("You fix SQLite queries."), vn.user_message(prompt)]
+        self._count("llm_calls")
+        future = _llm_executor.submit(vn.submit_prompt, message)
+        try:
+            return prepare_sql(future.result(timeout=timeout) or "")
+        except FutureTimeout:
+            future.cancel()
+            raise
+
+    def run(self, question: str, sql: str, execute: Callable[[str], Any]) -> Tuple[str, Any]:
+        """
+        execute(sql) with corrections applied; returns (the SQL that ran, its
+        result). Raises the last error when no attempt succeeds in budget.
+        """
+        deadline = time.monotonic() + self.budget_seconds
+        sql = self.correction(sql) or sql
+        failing: List[Tuple[str, str]] = []
+        with span("sql_repair") as s:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    result = execute(sql)
+                except Exception as e:
+                    if not _repairable(e):
+                        raise
+                    if attempt == 0:
+                        self._count("failures")
+                    failing.append((sql, str(e)))
+                    remaining = deadline - time.monotonic()
+                    if attempt == self.max_retries or remaining <= 0:
+                        self._count("unrepaired")
+                        s.set(attempts=attempt + 1, repaired=False)
+                        raise
+                    try:
+                        fixed = self._ask(self.repair_prompt(question, sql, str(e)), remaining)
+                    except FutureTimeout:
+                        self._count("unrepaired")
+                        s.set(attempts=attempt + 1, repaired=False)
+                        raise e
+                    if not fixed or _normalize(fixed) in {_normalize(bad) for bad, _ in failing}:
+                        self._count("unrepaired")
+                        s.set(attempts=attempt + 1, repaired=False)
+                        raise
+                    sql = fixed
+                    continue
+                if failing:
+                    self._remember(failing, sql)
+                    self._count("repaired")
+                s.set(attempts=len(failing) + 1, repaired=bool(failing))
+                return sql, result
+
+    def close(self):
+        self._conn.close()
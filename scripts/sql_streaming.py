@@ -0,0 +1,71 @@
+import re
+import json
+import sqlite3
+from typing import Iterable, Iterator
+
+# The first fenced block; its closing fence may not have streamed in yet.
+_FENCED_RE = re.compile(r"```[ \t]*(?:sql|sqlite)?[ \t]*\n?(.*?)(?:```|$)", re.IGNORECASE | re.DOTALL)
+# SELECT, or WITH only as a CTE ("with your table" is prose).
+_STATEMENT_START = r"(?:select\b|with\s+(?:recursive\s+)?\"?\w+\"?\s*(?:\([^)]*\)\s*)?as\s*(?:(?:not\s+)?materialized\s*)?\()"
+_LINE_START_RE = re.compile(rf"^[ \t]*{_STATEMENT_START}", re.IGNORECASE | re.MULTILINE)
+_STATEMENT_START_RE = re.compile(rf"\b{_STATEMENT_START}", re.IGNORECASE)
+
+
+def _statement_start(text: str):
+    return _LINE_START_RE.search(text) or _STATEMENT_START_RE.search(text)
+
+
+def clean_sql(text: str) -> str:
+    """
+    The SQL in an LLM reply: the contents of its first fenced block when it
+    has one, from the first statement start (preferably at the start of a
+    line), without the prose before it.
+    """
+    fenced = _FENCED_RE.search(text)
+    if fenced:
+        text = fenced.group(1)
+    match = _statement_start(text)
+    return text[match.start():].strip() if match else text.strip()
+
+
+def take_sql_statement(tokens: Iterable[str]) -> Iterator[str]:
+    """
+    Pass LLM tokens through until they form one complete SQL statement, then
+    stop and close the upstream stream so the server stops generating.
+    """
+    buffer = ""
+    try:
+        for token in tokens:
+            yield token
+            buffer += token
+            sql = clean_sql(buffer)
+            if _statement_start(sql) and sqlite3.complete_statement(sql):
+                break
+    finally:
+        close = getattr(tokens, "close", None)
+        if close is not None:
+            close()
+
+
+def sse_event(data, event: str = None) -> str:
+    """Format one server-sent event."""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+
+class StreamingSQLMixin:
+    """
+    generate_sql_stream() for Vanna classes whose submit_prompt accepts
+    stream=True; builds the same prompt as VannaBase.generate_sql.
+    """
+
+    def generate_sql_stream(self, question: str, **kwargs) -> Iterator[str]:
+        prompt = self.get_sql_prompt(
+            initial_prompt=self.config.get("initial_prompt") if self.config else None,
+            question=question,
+            question_sql_list=self.get_similar_question_sql(question, **kwargs),
+            ddl_list=self.get_related_ddl(question, **kwargs),
+            doc_list=self.get_related_documentation(question, **kwargs),
+            **kwargs,
+        )
+        yield from take_sql_statement(self.submit_prompt(prompt, stream=True))
@@ -0,0 +1,306 @@
+import re
+import sqlite3
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from instrumentation import current_span
+
+_TEMPLATE_RE = re.compile(
+    r"^\s*SELECT\s+(?P<select>.+?)\s+FROM\s+(?P<table>\w+)(?:\s+WHERE\s+(?P<where>.+?))?\s*;?\s*$",
+    re.IGNORECASE | re.DOTALL,
+)
+_AGGREGATE_RE = re.compile(r"^(?P<func>AVG|SUM|MIN|MAX|COUNT)\s*\(\s*(?P<arg>\*|\w+)\s*\)$", re.IGNORECASE)
+_CONDITION_RE = re.compile(
+    r"^(?P<column>\w+)\s*(?P<op>=|>=|<=|>|<)\s*(?P<literal>'(?:[^']|'')*'|-?\d+(?:\.\d+)?)$"
+)
+_AND_RE = re.compile(r"\s+AND\s+", re.IGNORECASE)
+
+_AGGREGATE_WORDS = {
+    "AVG": r"average|avg|mean",
+    "SUM": r"total|sum",
+    "MAX": r"maximum|max|highest|largest",
+    "MIN": r"minimum|min|lowest|smallest",
+    "COUNT": r"how many|count|number of",
+}
+_AGGREGATE_WORDS_RE = {func: re.compile(rf"\b(?:{words})\b", re.IGNORECASE) for func, words in _AGGREGATE_WORDS.items()}
+_COMPARISON_RE = re.compile(
+    r"(?P<op>greater than or equal to|at least|less than or equal to|at most|above|over|greater than|more than|"
+    r"exceeding|below|under|less than|fewer than|>=|<=|>|<)\s*(?P<number>-?\d+(?:\.\d+)?)",
+    re.IGNORECASE,
+)
+_OPERATORS = {
+    "greater than or equal to": ">=", "at least": ">=", ">=": ">=",
+    "less than or equal to": "<=", "at most": "<=", "<=": "<=",
+    "above": ">", "over": ">", "greater than": ">", "more than": ">", "exceeding": ">", ">": ">",
+    "below": "<", "under": "<", "less than": "<", "fewer than": "<", "<": "<",
+}
+# Question shapes the templates cannot express (grouping, ranking, joins, alternatives, negation): leave them to the LLM.
+_UNSUPPORTED_RE = re.compile(
+    r"\b(?:which|per|each|group|top|rank|order|sort|compare|versus|vs|between|distinct|or|not|without|except"
+    r"|no|none|never|nothing|neither|nor)\b|n't\b"
+    r"|(?<!made )(?<!sold )(?<!supplied )(?<!manufactured )(?<!distributed )\bby\b",
+    re.IGNORECASE,
+)
+# Time qualifiers; unless they are part of a column name, the template has no slot for them.
+_TIME_RE = re.compile(
+    r"\b(?:last|next|this|past|recent|recently|since|before|after|until|ago|during|today|yesterday|tomorrow"
+    r"|year|years|yearly|month|months|monthly|week|weeks|weekly|quarter|quarters|ytd)\b",
+    re.IGNORECASE,
+)
+_NUMBER_RE = re.compile(r"\d+(?:\.\d+)?")
+_NAME_RE = re.compile(r"(?<=\s)[A-Z][\w-]*|'[^']+'|\"[^\"]+\"")
+# Unit suffixes in column names that questions rarely spell out (capacity_kwh -> "capacity").
+_UNITS = {"kg", "kwh", "mm", "days", "usd", "eur", "pct"}
+_NUMERIC_TYPES = ("INT", "REAL", "FLOA", "DOUB", "DEC", "NUM")
+
+
+def _quote(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+def _column_re(column: str) -> Optional["re.Pattern"]:
+    words = [w for w in column.lower().split("_") if w and w not in _UNITS]
+    if not words:
+        return None
+    return re.compile(r"\b" + r"[\s_-]+".join(re.escape(w) + "s?" for w in words) + r"\b", re.IGNORECASE)
+
+
+class SQLTemplates:
+    """
+    Deterministic text-to-SQL for the common question shapes, tried before
+    the LLM.
+
+    Templates are the training SQL examples that are a single-table SELECT
+    with an optional aggregate and AND-ed `column op literal` conditions,
+    e.g. SELECT AVG(capacity_kwh) FROM batteries WHERE manufacturer = 'Tesla'.
+    A question matches one when it asks for the same aggregate over any
+    numeric column and names values for exactly the same filter columns:
+    categorical values are looked up in an in-memory index of the distinct
+    values of the database's low-cardinality text columns, numeric bounds
+    are read from phrases like "above 120" next to a column name. The
+    template's literals (and aggregated column) are then replaced. Anything
+    ambiguous, worded as grouping, ranking, alternatives or a negation, or
+    qualified by time ("last year", "since 2020"), is a miss.
+    """
+
+    def __init__(self, db_path: str, sql_examples: Iterable[str] = (), max_distinct: int = 200):
+        self.db_path = db_path
+        self.max_distinct = max_distinct
+        self.hits = 0
+        self.misses = 0
+        self._templates: Dict[Tuple, Dict[str, Any]] = {}
+        self._columns: Dict[str, Dict[str, str]] = {}
+        self._values: Dict[str, List[Tuple[str, str, str]]] = {}
+        self._values_re: Optional["re.Pattern"] = None
+        self.refresh()
+        for sql in sql_examples:
+            self.add(sql)
+
+    def refresh(self):
+        """(Re)load the column types and the categorical value index from the database."""
+        conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True)
+        try:
+            tables = [name for (name,) in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' "
+                "AND name NOT LIKE 'mv\\_%' ESCAPE '\\'"
+            )]
+            columns: Dict[str, Dict[str, str]] = {}
+            values: Dict[str, List[Tuple[str, str, str]]] = {}
+            for table in tables:
+                columns[table] = {row[1]: (row[2] or "").upper() for row in conn.execute(f'PRAGMA table_info("{table}")')}
+                for column, declared in columns[table].items():
+                    if any(t in declared for t in _NUMERIC_TYPES):
+                        continue
+                    distinct = conn.execute(
+                        f'SELECT DISTINCT "{column}" FROM "{table}" WHERE "{column}" IS NOT NULL LIMIT ?',
+                        (self.max_distinct + 1,),
+                    ).fetchall()
+                    if len(distinct) > self.max_distinct:
+                        continue  # an identifier or free text, not a category
+                    for (value,) in distinct:
+                        if isinstance(value, str) and value.strip():
+                            values.setdefault(value.lower(), []).append((table, column, value))
+        finally:
+            conn.close()
+        self._columns = columns
+        self._values = values
+        # Longest first, so "LG Energy" wins over a shorter value it contains.
+        alternatives = sorted(values, key=len, reverse=True)
+        self._values_re = re.compile(
+            r"(?<!\w)(?:" + "|".join(re.escape(v) for v in alternatives) + r")(?!\w)", re.IGNORECASE
+        ) if alternatives else None
+
+    def add(self, sql: str) -> bool:
+        """Register a training SQL example as a template; False when it is not a supported shape."""
+        match = _TEMPLATE_RE.match(sql.strip())
+        if match is None or match.group("table") not in self._columns:
+            return False
+        table = match.group("table")
+        select = match.group("select").strip()
+        aggregate = _AGGREGATE_RE.match(select)
+        func = aggregate.group("func").upper() if aggregate else None
+        measure = aggregate.group("arg") if aggregate and aggregate.group("arg") != "*" else None
+        if func and func != "COUNT" and measure not in self._columns[table]:
+            return False
+
+        conditions = []
+        where = match.group("where")
+        for part in _AND_RE.split(where) if where else []:
+            condition = _CONDITION_RE.match(part.strip())
+            if condition is None or condition.group("column") not in self._columns[table]:
+                return False
+            column, op, literal = condition.group("column", "op", "literal")
+            if (op == "=") != literal.startswith("'"):
+                return False  # only text equality and numeric bounds are slots
+            conditions.append((column, op))
+        if len(set(conditions)) != len(conditions):
+            return False
+
+        key = (table, func, frozenset(conditions))
+        if key not in self._templates:
+            self._templates[key] = {"table": table, "select": select, "func": func, "measure": measure, "conditions": conditions}
+        return True
+
+    def __len__(self) -> int:
+        return len(self._templates)
+
+    def _mentions(self, question: str, table: str) -> List[Tuple[int, int, str]]:
+        found = []
+        for column, declared in self._columns[table].items():
+            pattern = _column_re(column)
+            if pattern is not None:
+                found.extend((m.start(), m.end(), column) for m in pattern.finditer(question))
+        return sorted(found)
+
+    def match(self, question: str) -> Optional[str]:
+        """SQL for the question from a template, or None."""
+        sql = self._match(question)
+        if sql is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        current_span().set(sql_template=sql is not None)
+        return sql
+
+    def _match(self, question: str) -> Optional[str]:
+        if not self._templates or _UNSUPPORTED_RE.search(question):
+            return None
+        funcs = [func for func, pattern in _AGGREGATE_WORDS_RE.items() if pattern.search(question)]
+        if len(funcs) > 1:
+            return None
+        func = funcs[0] if funcs else None
+
+        # Categorical values, each of which must belong to exactly one column.
+        equal: Dict[Tuple[str, str], str] = {}
+        spans = []
+        for m in self._values_re.finditer(question) if self._values_re else ():
+            owners = self._values[m.group().lower()]
+            if len(owners) != 1:
+                return None
+            table, column, value = owners[0]
+            if equal.get((table, column), value) != value:
+                return None
+            equal[(table, column)] = value
+            spans.append((m.start(), m.end()))
+        # A number or a name the index does not know (a manufacturer with no
+        # rows, say) is a condition the template would silently drop.
+        if any(not any(start <= m.start() < end for start, end in spans) for m in _NAME_RE.finditer(question)):
+            return None
+        tables = {table for table, _ in equal} or set(self._columns)
+        if len(tables) != 1 and equal:
+            return None
+
+        for table in sorted(tables):
+            sql = self._fill(question, func, table, {c: v for (t, c), v in equal.items() if t == table}, spans)
+            if sql is not None:
+                return sql
+        return None
+
+    def _fill(self, question: str, func: Optional[str], table: str, equal: Dict[str, str], spans) -> Optional[str]:
+        numeric = {c for c, declared in self._columns[table].items() if any(t in declared for t in _NUMERIC_TYPES)}
+        found = self._mentions(question, table)
+        # "last year", "since 2020"... would be dropped from the WHERE clause.
+        named = spans + [(start, end) for start, end, _ in found]
+        if any(not any(start <= m.start() < end for start, end in named) for m in _TIME_RE.finditer(question)):
+            return None
+        mentions = [(position, column) for position, _, column in found
+                    if not any(start <= position < end for start, end in spans)]
+
+        # Numeric bounds attach to the nearest numeric column named before them.
+        bounds: Dict[Tuple[str, str], str] = {}
+        used = set()
+        comparisons = list(_COMPARISON_RE.finditer(question))
+        covered = spans + [(m.start("number"), m.end("number")) for m in comparisons]
+        if any(not any(start <= n.start() < end for start, end in covered) for n in _NUMBER_RE.finditer(question)):
+            return None
+        for m in comparisons:
+            before = [(position, column) for position, column in mentions if position < m.start() and column in numeric]
+            if not before:
+                return None
+            position, column = before[-1]
+            op = _OPERATORS[m.group("op").lower()]
+            if (column, op) in bounds:
+                return None
+            bounds[(column, op)] = m.group("number")
+            used.add(position)
+
+        measure = None
+        if func not in (None, "COUNT"):
+            candidates = {column for position, column in mentions if column in numeric and position not in used}
+            if len(candidates) != 1:
+                return None
+            measure = candidates.pop()
+
+        conditions = frozenset([(column, "=") for column in equal] + list(bounds))
+        template = self._templates.get((table, func, conditions))
+        if template is None:
+            return None
+        select = template["select"]
+        if measure is not None:
+            select = f"{func}({measure})"
+        where = []
+        for column, op in template["conditions"]:
+            value = _quote(equal[column]) if op == "=" else bounds[(column, op)]
+            where.append(f"{column} {op} {value}")
+        sql = f"SELECT {select} FROM {table}"
+        return f"{sql} WHERE {' AND '.join(where)}" if where else sql
+
+
+class TemplateSQLMixin:
+    """
+    For Vanna classes: generate_sql() (and its streaming / batch variants)
+    answers from `template_matcher` (an SQLTemplates) when a template fits,
+    and only calls the LLM on a miss. Without a matcher nothing changes.
+    """
+
+    template_matcher: Optional[SQLTemplates] = None
+
+    def template_sql(self, question: str) -> Optional[str]:
+        return self.template_matcher.match(question) if self.template_matcher is not None else None
+
+    def generate_sql(self, question: str, **kwargs) -> str:
+        sql = self.template_sql(question)
+        return sql if sql is not None else super().generate_sql(question, **kwargs)
+
+    def generate_sql_stream(self, question: str, **kwargs):
+        sql = self.template_sql(question)
+        if sql is not None:
+            yield sql
+            return
+        yield from super().generate_sql_stream(question, **kwargs)
+
+    def generate_sql_batch(self, questions: List[str]) -> List[str]:
+        results = [self.template_sql(question) for question in questions]
+        misses = [i for i, sql in enumerate(results) if sql is None]
+        if misses:
+            missed = [questions[i] for i in misses]
+            own = getattr(super(), "generate_sql_batch", None)
+            if own is not None:
+                generated = own(missed)
+            else:
+                # Most backends have no batch call of their own (only llm_studio.LLMStudioVanna does).
+                from batch import generate_each
+
+                generated = generate_each(super().generate_sql, missed)
+            for i, sql in zip(misses, generated):
+                results[i] = sql
+        return results
@@ -1,14 +1,23 @@
 import os
 import sqlite3
-import requests
-import json
+import hashlib
 import numpy as np
-import re
 import streamlit as st
 from typing import List, Dict, Any, Optional
-from openai import AzureOpenAI
-import openai
 import pandas as pd
+from sql_cache import SemanticSQLCache
+from llm_transport import LLMTransportError, get_azure_transport
+from sql_streaming import clean_sql, take_sql_statement
+from sql_executor import ReadOnlyConnectionPool, enable_wal, limit_sql, prepare_sql
+from sql_guard import SQLGuard, SQLGuardError
+from index_advisor import WorkloadLog
+from sql_repair import SQLRepairer
+from schema_sync import sqlite_schema
+from synthetic_data import generate_database
+from prompt_builder import compact_ddl, render_table
+from instrumentation import configure_from_env, instrument
+from masking import Masker
+from result_summary import SUMMARY_MAX_ROWS, summarize_frame, summary_prompt, template_summary
 
 os.environ['http_proxy'] = ''
 os.environ['https_proxy'] = ''
@@ -21,96 +30,170 @@ COLUMN_ALIASES = {
     "carbon_footprint_kg": "Carbon Footprint (kg CO2e)"
 }
 
+BATTERIES_DDL = '''
+CREATE TABLE batteries (
+    id INTEGER PRIMARY KEY,
+    part_number TEXT UNIQUE,
+    type TEXT,
+    capacity_kwh FLOAT,
+    carbon_footprint_kg FLOAT
+)
+'''
+
+# Compact column list (about 40% fewer tokens than an annotated listing);
+# part of the fixed system message, so every call shares one cacheable prefix.
+TABLE_SCHEMA = (
+    f"Table: {render_table(compact_ddl(BATTERIES_DDL.strip()))}\n"
+    "part_number identifies a battery part; capacity in kWh; carbon footprint in kg CO2e. "
+    "`type` is categorical text (e.g. 'Type-1'), never a number."
+)
+
+SYSTEM_MESSAGE = (
+    "You are an AI that provides structured responses for battery carbon footprint analysis. "
+    "Always generate SQL queries using the table `batteries` and its correct column names. "
+    "Return only the SQL query without any markdown formatting (no ```sql ... ```).\n\n"
+    + TABLE_SCHEMA
+)
+
+# Summaries see only a result digest: no schema, and no "return only SQL".
+SUMMARY_SYSTEM_MESSAGE = "You are a helpful data assistant. Summarize query results briefly and accurately."
+
+PAGE_SIZE = 50
+QUERY_TIMEOUT = 30.0  # seconds any one generated query may run
+
+@instrument
 class MyVanna:
     def __init__(self):
-        self.client = AzureOpenAI(
-            azure_endpoint="https://your-endpoint/azure.com/",
+        self.deployment_name = "modelName"  
+        self.transport = get_azure_transport(
+            endpoint="https://your-endpoint/azure.com/",
             api_key="key",
-            api_version="ver"
+            api_version="ver",
+            deployment=self.deployment_name
         )
-        self.deployment_name = "modelName"  
+        self.sql_cache = SemanticSQLCache(path="sql_cache.db")
+        self.schema_version = hashlib.sha256(TABLE_SCHEMA.encode("utf-8")).hexdigest()[:16]
 
-    def submit_prompt(self, prompt: str) -> str:
-        try:
-            table_schema = (
-                "The database has the following table:\n"
-                "Table: batteries\n"
-                "- id (INTEGER PRIMARY KEY)\n"
-                "- part_number (TEXT) -- Unique identifier for the battery part\n"
-                "- type (TEXT) -- The type of battery technology. Must be referenced correctly in queries.\n"
-                "- capacity_kwh (FLOAT) -- The capacity in kWh\n"
-                "- carbon_footprint_kg (FLOAT) -- The carbon footprint in kg CO2e\n"
-                "Ensure all queries correctly use `type` as a categorical value (e.g., 'Type-1') instead of numbers."
-            )
+    def _sql_prompt(self, question: str) -> str:
+        return f"Generate SQL query for \n Don't add ID column in query: {question}\n\nSQL:"
 
-            response = self.client.chat.completions.create(
+    def generate_sql(self, question: str) -> str:
+        cached = self.sql_cache.get(question, self.schema_version)
+        if cached is not None:
+            return cached
+        sql_query = self.submit_prompt(self._sql_prompt(question))
+        if sql_query:
+            self.sql_cache.put(question, self.schema_version, sql_query)
+        return sql_query
+
+    def generate_sql_stream(self, question: str):
+        """Yield SQL tokens as they arrive, stopping once the statement is complete."""
+        cached = self.sql_cache.get(question, self.schema_version)
+        if cached is not None:
+            yield cached
+            return
+        parts = []
+        for token in take_sql_statement(self.submit_prompt(self._sql_prompt(question), stream=True)):
+            parts.append(token)
+            yield token
+        sql_query = clean_sql("".join(parts))
+        if sql_query:
+            self.sql_cache.put(question, self.schema_version, sql_query)
+
+    def _messages(self, prompt: str, system: str = SYSTEM_MESSAGE) -> List[Dict[str, str]]:
+        return [
+            {"role": "system", "content": system},
+            {"role": "user", "content": prompt}
+        ]
+
+    def submit_prompt(self, prompt: str, stream: bool = False, system: str = SYSTEM_MESSAGE):
+        if stream:
+            return self._stream_prompt(prompt, system)
+        try:
+            response = self.transport.chat(
                 model=self.deployment_name,
-                messages=[
-                    {"role": "system", "content": "You are an AI that provides structured responses for battery carbon footprint analysis. "
-                                                      "Always generate SQL queries using the table `batteries` and its correct column names. "
-                                                      "Ensure that the columns exist before generating a query. "
-                                                      "Return only the SQL query without any markdown formatting (no ```sql ... ```)."},
-                    {"role": "user", "content": table_schema + "\n\n" + prompt}
-                ],
+                messages=self._messages(prompt, system),
                 max_tokens=500,
                 temperature=0.3  
             )
-            return response.choices[0].message.content.strip()
-        except requests.exceptions.RequestException as e:
-            print(f"❌ Network error: {e}")
-            return ""
-        except openai.OpenAIError as e:
+            return response.strip()
+        except LLMTransportError as e:
             print(f"❌ OpenAI API Error: {e}")
             return ""
 
-vn = MyVanna()
+    def _stream_prompt(self, prompt: str, system: str = SYSTEM_MESSAGE):
+        try:
+            yield from self.transport.stream_chat(
+                model=self.deployment_name,
+                messages=self._messages(prompt, system),
+                max_tokens=500,
+                temperature=0.3
+            )
+        except LLMTransportError as e:
+            print(f"❌ OpenAI API Error: {e}")
+
+@st.cache_resource
+def get_vanna() -> MyVanna:
+    # One instance per server process: reruns reuse its transport and SQL cache
+    # instead of rebuilding them on every interaction.
+    configure_from_env()
+    return MyVanna()
+
+def get_masker() -> Masker:
+    # Reset with each question: its part numbers and e-mails map to tokens
+    # ([PART_1], ...) that are restored in the generated SQL and the summary.
+    return st.session_state.setdefault("masker", Masker())
+
+@st.cache_resource
+def get_connection_pool() -> ReadOnlyConnectionPool:
+    # Streamlit reruns this script on every interaction; caching the pool keeps
+    # its connections (and their page and statement caches) across reruns.
+    return ReadOnlyConnectionPool('carbon_footprint.db', query_timeout=QUERY_TIMEOUT)
+
+@st.cache_resource
+def get_sql_guard() -> SQLGuard:
+    # Vetted queries land in the workload log that index_advisor.py reads.
+    return SQLGuard('carbon_footprint.db', workload=WorkloadLog())
 
-def mask_part_numbers(query: str) -> str:
-    masked_query = re.sub(r'\b(PART-\d+)\b', '[MASKED]', query)
-    print(f"Before Masking: {query}")
-    print(f"After Masking: {masked_query}")
-    return masked_query
+def checked_sql(sql_query) -> str:
+    """The generated SQL once the guard has vetted it (paging and the digest bound the rows)."""
+    return get_sql_guard().check(prepare_sql(sql_query), auto_limit=False)
+
+@st.cache_resource
+def get_sql_repairer() -> SQLRepairer:
+    return SQLRepairer(get_vanna(), sqlite_schema('carbon_footprint.db'))
+
+def query_database(sql_query, page: int = 0, page_size: int = PAGE_SIZE):
+    """
+    The SQL that ran, one page of its result and whether more rows follow.
+    A failing query is sent back to the LLM with its error and corrected.
+    """
+    def fetch(sql):
+        return get_connection_pool().fetch_page(checked_sql(sql), page, page_size)
 
-def query_database(sql_query):
-    sql_query = sql_query.replace("```sql", "").replace("```", "").strip()
-    conn = sqlite3.connect('carbon_footprint.db')
-    cursor = conn.cursor()
     try:
-        cursor.execute(sql_query)
-        column_names = [desc[0] for desc in cursor.description]  
-        results = cursor.fetchall()
-        conn.close()
-        return results, column_names if results else ([], [])
+        sql_query, (df, has_more) = get_sql_repairer().run(st.session_state.get("question", ""), sql_query, fetch)
+        return sql_query, df, has_more
+    except SQLGuardError as e:
+        st.error(f"Query refused: {e}")
     except sqlite3.Error as e:
-        conn.close()
         print(f"SQLite Error: {e}")
-        return [], []
+    return sql_query, pd.DataFrame(), False
+
+def result_digest(sql_query) -> Dict[str, Any]:
+    """Statistical digest of the query's result, over at most SUMMARY_MAX_ROWS rows."""
+    try:
+        df = get_connection_pool().execute_df(limit_sql(checked_sql(sql_query), SUMMARY_MAX_ROWS))
+    except (SQLGuardError, sqlite3.Error) as e:
+        print(f"SQLite Error: {e}")
+        df = pd.DataFrame()
+    # The digest goes to the LLM, so it is built from the masked rows.
+    return summarize_frame(get_masker().mask_frame(df).rename(columns=COLUMN_ALIASES))
 
 def populate_dummy_data():
-    conn = sqlite3.connect('carbon_footprint.db')
-    cursor = conn.cursor()
-    cursor.execute("DROP TABLE IF EXISTS batteries")
-    cursor.execute('''
-    CREATE TABLE batteries (
-        id INTEGER PRIMARY KEY,
-        part_number TEXT UNIQUE,
-        type TEXT,
-        capacity_kwh FLOAT,
-        carbon_footprint_kg FLOAT
-    )
-    ''')
-    
-    dummy_data = [
-        (f'PART-{i}', f'Type-{i%5}', round(np.random.uniform(50, 150), 2), round(np.random.uniform(5000, 15000), 2))
-        for i in range(1, 50)
-    ]
-    
-    cursor.executemany(
-        'INSERT INTO batteries (part_number, type, capacity_kwh, carbon_footprint_kg) VALUES (?, ?, ?, ?)',
-        dummy_data
-    )
-    conn.commit()
-    conn.close()
+    # Only fills an empty table, so restarts keep the data (and the answers) stable.
+    generate_database('carbon_footprint.db', [BATTERIES_DDL], rows=50, seed=0)
+    enable_wal('carbon_footprint.db')
 
 def chat_ui():
     st.set_page_config(page_title="Battery Carbon Footprint", layout="wide")
@@ -120,29 +203,70 @@ def chat_ui():
     user_input = st.text_input("🔎 Enter your question:")
     if st.button("Ask 📩"): 
         if user_input.strip():
-            masked_query = mask_part_numbers(user_input)
-            sql_query = vn.submit_prompt(f"Generate SQL query for \n Don't add ID column in query: {masked_query}\n\nSQL:")
-            
-            if sql_query:
-                st.markdown("**📝 Generated SQL Query:**")
-                st.code(sql_query, language='sql')
-
-                results, column_names = query_database(sql_query)
-                
-                if results:
-                    alias_columns = [COLUMN_ALIASES.get(col, col) for col in column_names if col != "id"]
-                    df = pd.DataFrame(results, columns=alias_columns)
-                    st.markdown("**📊 Results:**")
-                    st.table(df)
-
-                    summary_prompt = f"Generate a structured AI summary for easy readability, including all relevant column names: {df.to_dict()}"
-                    summary_response = vn.submit_prompt(summary_prompt)
-                    st.markdown(f"💡 AI Summary: {summary_response}")
-                else:
-                    st.warning("⚠️ No valid data found. Please refine your query.")
-            else:
+            st.session_state.masker = Masker()
+            masked_query = get_masker().mask_text(user_input)
+            st.markdown("**📝 Generated SQL Query:**")
+            sql_placeholder = st.empty()
+            sql_query = ""
+            for token in get_vanna().generate_sql_stream(masked_query):
+                sql_query += token
+                sql_placeholder.code(sql_query, language='sql')
+            sql_placeholder.empty()
+            # Kept in session state so paging (which reruns the script) keeps the query.
+            st.session_state.sql_query = get_masker().unmask_text(clean_sql(sql_query))
+            st.session_state.question = masked_query
+            st.session_state.page = 0
+            st.session_state.summary = None
+            if not st.session_state.sql_query:
                 st.error("❌ No valid SQL query generated.")
 
+    sql_query = st.session_state.get("sql_query")
+    if not sql_query:
+        return
+
+    page = st.session_state.get("page", 0)
+    repaired, df, has_more = query_database(sql_query, page)
+    if repaired != sql_query:
+        st.session_state.sql_query = sql_query = repaired
+        st.info("🔧 The generated query failed and was corrected automatically.")
+
+    st.markdown("**📝 Generated SQL Query:**")
+    st.code(sql_query, language='sql')
+
+    if df.empty:
+        st.warning("⚠️ No valid data found. Please refine your query.")
+        return
+
+    df = df.drop(columns=["id"], errors="ignore").rename(columns=COLUMN_ALIASES)
+    st.markdown(f"**📊 Results** (rows {page * PAGE_SIZE + 1}–{page * PAGE_SIZE + len(df)}):")
+    st.dataframe(df)
+    previous_col, next_col = st.columns(2)
+    if previous_col.button("⬅️ Previous", disabled=page == 0):
+        st.session_state.page = page - 1
+        st.rerun()
+    if next_col.button("Next ➡️", disabled=not has_more):
+        st.session_state.page = page + 1
+        st.rerun()
+
+    template = st.checkbox("Template summary (no LLM)", key="template_summary", on_change=lambda: st.session_state.update(summary=None))
+    if st.session_state.get("summary") is None:
+        # Only a fixed-size digest of the result reaches the LLM, never the rows themselves.
+        digest = result_digest(sql_query)
+        if template:
+            st.session_state.summary = template_summary(digest)
+            st.markdown(f"💡 Summary: {st.session_state.summary}")
+        else:
+            st.markdown("💡 AI Summary:")
+            prompt = summary_prompt(st.session_state.get("question", ""), digest)
+            summary_placeholder = st.empty()
+            summary = ""
+            for token in get_vanna().submit_prompt(prompt, stream=True, system=SUMMARY_SYSTEM_MESSAGE):
+                summary += token
+                summary_placeholder.markdown(get_masker().unmask_text(summary))
+            st.session_state.summary = get_masker().unmask_text(summary)
+    else:
+        st.markdown(f"💡 {'Summary' if template else 'AI Summary'}: {st.session_state.summary}")
+
 if __name__ == "__main__":
     populate_dummy_data()
     chat_ui()
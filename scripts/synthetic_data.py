@@ -0,0 +1,313 @@
+"""
+Seeded synthetic data for the demo and load-test databases.
+
+Tables are described by their DDL; every column is filled from a per-table
+spec (or, for columns the spec does not know, from its type and keys), one
+NumPy column at a time. Integer primary keys and unique labels come from the
+row number, so they never collide; foreign keys point at rows of the parent
+table, which is filled first. Rows are bulk-loaded in chunked executemany
+transactions with the journal off, then the database is switched to WAL.
+
+    python synthetic_data.py bench.db --dataset parts --rows 10000000 --seed 0
+"""
+import os
+import sys
+import time
+import zlib
+import sqlite3
+import argparse
+from typing import Any, Callable, Dict, Iterable, List
+
+import numpy as np
+
+BATTERIES_DDL = [
+    """CREATE TABLE batteries (
+    id INTEGER PRIMARY KEY,
+    part_number TEXT UNIQUE,
+    type TEXT,
+    capacity_kwh FLOAT,
+    carbon_footprint_kg FLOAT
+)""",
+]
+
+BATTERY_TYPES = [f"Type-{i}" for i in range(5)]
+BATTERY_MANUFACTURERS = ["Tesla", "Panasonic", "LG Energy", "Samsung SDI", "CATL"]
+BATTERY_DISTRIBUTORS = ["Digi-Key", "Mouser", "Arrow Electronics", "Avnet", "RS Components"]
+BATTERY_SIZES = ["Small", "Medium", "Large"]
+MATERIALS = ["Steel", "Aluminium", "Copper", "Titanium", "Plastic", "Carbon Fibre"]
+COUNTRIES = ["Germany", "Japan", "USA", "China", "Korea", "India"]
+REGIONS = ["EMEA", "APAC", "NA", "LATAM"]
+
+# A column generator gets the table's RNG stream for that column and the
+# 1-based row numbers of the chunk, and returns one Python value per row.
+ColumnGenerator = Callable[[np.random.Generator, range], List[Any]]
+
+
+def sequence() -> ColumnGenerator:
+    return lambda rng, ids: list(ids)
+
+
+def label(template: str) -> ColumnGenerator:
+    """Unique text from the row number, e.g. label("PART-{}")."""
+    return lambda rng, ids: list(map(template.format, ids))
+
+
+def cycle(values: List[Any]) -> ColumnGenerator:
+    return lambda rng, ids: [values[i % len(values)] for i in ids]
+
+
+def choice(values: List[Any]) -> ColumnGenerator:
+    options = np.array(values, dtype=object)
+    return lambda rng, ids: options[rng.integers(0, len(options), len(ids))].tolist()
+
+
+def uniform(low: float, high: float, decimals: int = 2) -> ColumnGenerator:
+    return lambda rng, ids: np.round(rng.uniform(low, high, len(ids)), decimals).tolist()
+
+
+def integers(low: int, high: int) -> ColumnGenerator:
+    """Integers in [low, high)."""
+    return lambda rng, ids: rng.integers(low, high, len(ids)).tolist()
+
+
+def nulls() -> ColumnGenerator:
+    return lambda rng, ids: [None] * len(ids)
+
+
+# Per table: its row count as a fraction of --rows (with a floor), and the
+# generators for the columns it may have. Columns a table lacks are skipped,
+# so both batteries schemas (the plain and the parts-example one) are covered.
+TABLES: Dict[str, Dict[str, Any]] = {
+    "batteries": {
+        "columns": {
+            "part_number": label("PART-{}"),
+            "type": choice(BATTERY_TYPES),
+            "manufacturer": choice(BATTERY_MANUFACTURERS),
+            "distributor": choice(BATTERY_DISTRIBUTORS),
+            "size": choice(BATTERY_SIZES),
+            "connector_length": uniform(0.5, 5.0),
+            "capacity_kwh": uniform(50, 150),
+            "carbon_footprint_kg": uniform(5000, 15000),
+        },
+    },
+    "manufacturers": {
+        "scale": 1 / 1000,
+        "min_rows": 10,
+        "columns": {
+            "name": label("Manufacturer {}"),
+            "country": cycle(COUNTRIES),
+            "contact_email": label("sales{}@example.com"),
+            "quality_rating": uniform(1, 5, 1),
+        },
+    },
+    "distributors": {
+        "scale": 1 / 2000,
+        "min_rows": 5,
+        "columns": {
+            "name": label("Distributor {}"),
+            "region": cycle(REGIONS),
+            "contact_email": label("orders{}@example.com"),
+            "delivery_rating": uniform(1, 5, 1),
+        },
+    },
+    "parts": {
+        "columns": {
+            "name": label("Part {}"),
+            "description": nulls(),
+            "diameter_mm": uniform(1, 500, 1),
+            "weight_kg": uniform(0.01, 50, 3),
+            "material": choice(MATERIALS),
+            "carbon_footprint_kg": uniform(0.1, 100),
+            "price": uniform(1, 1000),
+        },
+    },
+    "part_distributors": {
+        "columns": {
+            # One stocking distributor per part keeps (part_id, distributor_id) unique.
+            "part_id": sequence(),
+            "stock_quantity": integers(0, 10000),
+            "lead_time_days": integers(1, 60),
+        },
+    },
+}
+
+
+def _table_info(conn: sqlite3.Connection, table: str) -> Dict[str, Any]:
+    columns = conn.execute(f'PRAGMA table_info("{table}")').fetchall()
+    foreign = {row[3]: row[2] for row in conn.execute(f'PRAGMA foreign_key_list("{table}")')}
+    unique = set()
+    for index in conn.execute(f'PRAGMA index_list("{table}")'):
+        if index[2]:
+            cols = [row[2] for row in conn.execute(f'PRAGMA index_info("{index[1]}")')]
+            if len(cols) == 1:
+                unique.add(cols[0])
+    pk = [row for row in columns if row[5]]
+    return {
+        "columns": [row[1] for row in columns],
+        "types": {row[1]: (row[2] or "").upper() for row in columns},
+        "notnull": {row[1] for row in columns if row[3]},
+        "rowid_alias": pk[0][1] if len(pk) == 1 and (pk[0][2] or "").upper() == "INTEGER" else None,
+        "foreign": foreign,
+        "unique": unique,
+    }
+
+
+def _run_in_memory(ddl: List[str]):
+    """Per statement, the tables it creates (with their columns), by running the DDL in memory."""
+    conn = sqlite3.connect(":memory:")
+    try:
+        created = []
+        for statement in ddl:
+            before = {name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            conn.execute(statement)
+            after = [name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+            created.append({t: _columns(conn, t) for t in after if t not in before})
+        return created
+    finally:
+        conn.close()
+
+
+def _columns(conn: sqlite3.Connection, table: str) -> List[str]:
+    return [row[1] for row in conn.execute(f'PRAGMA table_info("{table}")')]
+
+
+def _fill_order(conn: sqlite3.Connection, tables: List[str]) -> List[str]:
+    """Parents before the tables whose foreign keys point at them."""
+    parents = {
+        t: {row[2] for row in conn.execute(f'PRAGMA foreign_key_list("{t}")') if row[2] in tables and row[2] != t}
+        for t in tables
+    }
+    order: List[str] = []
+    while len(order) < len(tables):
+        ready = [t for t in tables if t not in order and parents[t] <= set(order)]
+        order.extend(ready or [t for t in tables if t not in order])
+    return order
+
+
+def table_rows(table: str, rows: int) -> int:
+    spec = TABLES.get(table, {})
+    return max(int(rows * spec.get("scale", 1.0)), spec.get("min_rows", 0))
+
+
+def _column_generator(table: str, column: str, info: Dict[str, Any], counts: Dict[str, int]) -> ColumnGenerator:
+    known = TABLES.get(table, {}).get("columns", {})
+    if column in known:
+        return known[column]
+    if column == info["rowid_alias"]:
+        return sequence()
+    if column in info["foreign"] and info["foreign"][column] in counts:
+        return integers(1, counts[info["foreign"][column]] + 1)
+    declared = info["types"][column]
+    if column in info["unique"]:
+        return sequence() if "INT" in declared else label(f"{column.upper()}-{{}}")
+    if "INT" in declared:
+        return integers(0, 1000)
+    if any(t in declared for t in ("REAL", "FLOA", "DOUB", "DEC", "NUM")):
+        return uniform(0, 1000)
+    if column in info["notnull"]:
+        return label(f"{column} {{}}")
+    return nulls()
+
+
+def _fill(conn: sqlite3.Connection, table: str, rows: int, seed: int, counts: Dict[str, int], chunk_size: int):
+    info = _table_info(conn, table)
+    columns = info["columns"]
+    generators = [_column_generator(table, c, info, counts) for c in columns]
+    # One stream per column, so adding a column or changing chunk_size leaves the others' values alone.
+    rngs = [np.random.default_rng([seed, zlib.crc32(f"{table}.{c}".encode("utf-8"))]) for c in columns]
+    names = ", ".join(f'"{c}"' for c in columns)
+    sql = f'INSERT INTO "{table}" ({names}) VALUES ({", ".join("?" for _ in columns)})'
+    for start in range(0, rows, chunk_size):
+        ids = range(start + 1, min(start + chunk_size, rows) + 1)
+        values = [generate(rng, ids) for generate, rng in zip(generators, rngs)]
+        conn.execute("BEGIN")
+        conn.executemany(sql, zip(*values))
+        conn.execute("COMMIT")
+
+
+def generate_database(
+    path: str,
+    ddl: Iterable[str],
+    rows: int,
+    seed: int = 0,
+    replace: bool = False,
+    chunk_size: int = 100000,
+) -> Dict[str, int]:
+    """
+    Fills the tables of `ddl` in the database at `path` with `rows` rows of
+    reproducible data (fewer for lookup tables, see TABLES); same seed, same
+    data. Tables that already hold rows are kept as they are, and missing
+    ones created, unless their columns differ from the DDL, in which case
+    they are rebuilt. replace=True starts from an empty file. Returns the
+    number of rows written per table.
+    """
+    ddl = [statement.strip() for statement in ddl]
+    created = _run_in_memory(ddl)
+    expected = {t: columns for tables in created for t, columns in tables.items()}
+    if replace:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+    conn = sqlite3.connect(path, isolation_level=None)
+    try:
+        existing = {name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        for table in expected:
+            if table in existing and _columns(conn, table) != expected[table]:
+                conn.execute(f'DROP TABLE "{table}"')
+                existing.discard(table)
+        # The DDL may or may not say IF NOT EXISTS; run only what is missing
+        # (an index statement goes with the table before it).
+        run = False
+        for statement, tables in zip(ddl, created):
+            if tables:
+                run = not set(tables) & existing
+            if run:
+                conn.execute(statement)
+        empty = [t for t in expected if conn.execute(f'SELECT 1 FROM "{t}" LIMIT 1').fetchone() is None]
+        counts = {t: conn.execute(f'SELECT COUNT(*) FROM "{t}"').fetchone()[0] for t in expected if t not in empty}
+        if not empty:
+            return {}
+
+        try:
+            conn.execute("PRAGMA journal_mode=OFF")
+        except sqlite3.OperationalError:
+            pass  # another connection has the database open; load through its WAL instead
+        conn.execute("PRAGMA synchronous=OFF")
+        conn.execute("PRAGMA cache_size=-262144")  # 256 MiB, keeps the unique indexes in memory
+        conn.execute("PRAGMA temp_store=MEMORY")
+        written = {}
+        for table in _fill_order(conn, list(expected)):
+            if table in empty:
+                counts[table] = written[table] = table_rows(table, rows)
+                _fill(conn, table, counts[table], seed, counts, chunk_size)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return written
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a synthetic batteries or parts database.")
+    parser.add_argument("db_path")
+    parser.add_argument("--dataset", choices=["batteries", "parts"], default="batteries")
+    parser.add_argument("--rows", type=int, default=100000, help="rows in the main tables (lookup tables get fewer)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--chunk-size", type=int, default=100000, help="rows per insert transaction")
+    parser.add_argument("--append", action="store_true", help="keep the existing file and only fill empty tables")
+    args = parser.parse_args()
+
+    if args.dataset == "parts":
+        sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "parts-example"))
+        from parts_schema import PARTS_DDL as ddl
+    else:
+        ddl = BATTERIES_DDL
+    started = time.perf_counter()
+    written = generate_database(args.db_path, ddl, args.rows, args.seed, replace=not args.append, chunk_size=args.chunk_size)
+    elapsed = time.perf_counter() - started
+    for table, count in written.items():
+        print(f"{table}: {count:,} rows")
+    print(f"Built {args.db_path} in {elapsed:.1f} s ({os.path.getsize(args.db_path) / 2**20:.0f} MiB)")
+
+
+if __name__ == "__main__":
+    main()
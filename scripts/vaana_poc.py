@@ -1,77 +1,13 @@
-from vanna.base import VannaBase
 import sqlite3
-import requests
 import json
 import numpy as np
 from typing import List, Dict, Any, Optional
-
-class LLMStudioVanna(VannaBase):
-    def __init__(self, base_url="http://127.0.0.1:1234"):
-        self.base_url = base_url
-        super().__init__()
-
-    def _call_llm_studio(self, prompt: str) -> str:
-        try:
-            response = requests.post(
-                f"{self.base_url}/v1/completions",
-                json={
-                    "prompt": prompt,
-                    "temperature": 0.1,
-                    "max_tokens": 500
-                }
-            )
-            result = response.json()
-            return result.get('choices', [{}])[0].get('text', '').strip()
-        except Exception as e:
-            print(f"Error calling LLM Studio: {e}")
-            return ""
-
-    def generate_sql(self, question: str) -> str:
-        prompt = f"Generate SQL query for: {question}\n\nSQL:"
-        return self._call_llm_studio(prompt)
-
-    def generate_embedding(self, text: str) -> List[float]:
-        return [0.0] * 384  # Return a 384-dimensional zero vector
-
-    def add_ddl(self, ddl: str) -> bool:
-        return True
-
-    def add_documentation(self, documentation: str) -> bool:
-        return True
-
-    def add_question_sql(self, question: str, sql: str) -> bool:
-        return True
-
-    def get_related_ddl(self, question: str) -> List[str]:
-        return []
-
-    def get_related_documentation(self, question: str) -> List[str]:
-        return []
-
-    def get_similar_question_sql(self, question: str) -> List[Dict[str, str]]:
-        return []
-
-    def get_training_data(self) -> Dict[str, List[Dict[str, Any]]]:
-        return {
-            "ddl": [],
-            "documentation": [],
-            "question_sql": []
-        }
-
-    def remove_training_data(self) -> bool:
-        return True
-
-    def system_message(self) -> str:
-        return "You are a helpful AI assistant that generates SQL queries."
-
-    def user_message(self, question: str) -> str:
-        return f"Please generate a SQL query for: {question}"
-
-    def assistant_message(self, sql: str) -> str:
-        return f"Here's the SQL query: {sql}"
-
-    def submit_prompt(self, prompt: str) -> str:
-        return self._call_llm_studio(prompt)
+from llm_studio import LLMStudioVanna
+from sql_executor import ReadOnlyConnectionPool
+from sql_guard import SQLGuard
+from sql_repair import SQLRepairer
+from schema_sync import sqlite_schema
+from batch import answer_batch
 
 def main():
     vanna_model = LLMStudioVanna()
@@ -124,19 +60,22 @@ def main():
         "What is the average carbon footprint per kWh for each battery type?"
     ]
 
-    for question in questions:
-        print(f"\nQuestion: {question}")
-        try:
-            sql_query = vanna_model.generate_sql(question)
-            print(f"Generated SQL: {sql_query}")
-            
-            cursor.execute(sql_query)
-            results = cursor.fetchall()
-            print(f"Results: {results}")
-        except Exception as e:
-            print(f"Error: {e}")
-
     conn.close()
 
+    pool = ReadOnlyConnectionPool('carbon_footprint.db', query_timeout=30.0)
+    guard = SQLGuard('carbon_footprint.db')
+    # Failing SQL is re-prompted with its error instead of just being reported.
+    repairer = SQLRepairer(vanna_model, sqlite_schema('carbon_footprint.db'))
+    for result in answer_batch(vanna_model, questions, pool, guard=guard, repairer=repairer):
+        print(f"\nQuestion: {result['question']}")
+        print(f"Generated SQL: {result['sql']}")
+        if result['error']:
+            print(f"Error: {result['error']}")
+        else:
+            print(f"Results: {result['rows']}")
+    pool.close()
+    guard.close()
+    repairer.close()
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,567 @@
+import os
+import json
+import hashlib
+import threading
+import time
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from vanna.base import VannaBase
+from vanna.utils import deterministic_uuid
+
+from embeddings import EMBEDDING_DIM, HashingEmbedder
+from embedding_cache import CachedEmbedder, EmbeddingCache
+
+SNAPSHOT_NAME = "snapshot.json"
+
+
+class VectorIndex:
+    """
+    Append-only vector collection persisted as a raw float32 matrix plus a JSONL
+    metadata log. The matrix is memory-mapped on load, so opening a large index
+    costs a stat() rather than a full read, and adds only append to both files.
+    Deletes are tombstones in the log; call compact() to rewrite without them.
+
+    Above ivf_min_rows the matrix is partitioned with spherical k-means and a
+    query only scores the rows of its nprobe nearest centroids (plus anything
+    appended since the partition was built), which keeps top-k search in the
+    low milliseconds at 100k+ rows where a full scan is memory-bound.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str],
+        dim: int = EMBEDDING_DIM,
+        ivf_min_rows: int = 20000,
+        nprobe: int = 8,
+        read_only: bool = False,
+        snapshot: Optional[Dict[str, Any]] = None,
+    ):
+        self.path = path
+        self.dim = dim
+        self.ivf_min_rows = ivf_min_rows
+        self.nprobe = nprobe
+        self.read_only = read_only
+        self._ivf: Optional[Dict[str, np.ndarray]] = None
+        self._lock = threading.RLock()
+        self._ids: List[str] = []
+        self._documents: List[str] = []
+        self._positions: Dict[str, int] = {}
+        self._alive = np.zeros(0, dtype=bool)
+        self._matrix = np.zeros((0, dim), dtype=np.float32)
+        self._mapped_rows = 0
+        # Bytes of the metadata log read so far, and the (log, matrix) inodes they belong to.
+        self._meta_offset = 0
+        self._files: Optional[Tuple[int, int]] = None
+        if path is not None:
+            if not read_only:
+                os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            if snapshot is not None:
+                self.load_snapshot(snapshot)
+            else:
+                self._load()
+
+    @property
+    def _vectors_path(self) -> str:
+        return f"{self.path}.f32"
+
+    @property
+    def _meta_path(self) -> str:
+        return f"{self.path}.jsonl"
+
+    @property
+    def _ivf_path(self) -> str:
+        return f"{self.path}.ivf.npz"
+
+    def _inodes(self) -> Optional[Tuple[int, int]]:
+        try:
+            return os.stat(self._meta_path).st_ino, os.stat(self._vectors_path).st_ino
+        except FileNotFoundError:
+            return None
+
+    def _read_log(
+        self, start: int, stop: Optional[int], ids: List[str], documents: List[str], positions: Dict[str, int], alive: List[bool]
+    ) -> int:
+        """
+        Apply the metadata log's complete lines between byte offsets start and
+        stop (end of file when None) to ids/documents/positions/alive; returns
+        the offset reached. A line still being appended is left for later.
+        """
+        with open(self._meta_path, "rb") as f:
+            f.seek(start)
+            data = f.read() if stop is None else f.read(max(stop - start, 0))
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].decode("utf-8").splitlines():
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if entry.get("deleted"):
+                position = positions.pop(entry["id"], None)
+                if position is not None:
+                    alive[position] = False
+                continue
+            positions[entry["id"]] = len(ids)
+            ids.append(entry["id"])
+            documents.append(entry["document"])
+            alive.append(True)
+        return start + end
+
+    def _read_ivf(self, rows: int) -> Optional[Dict[str, np.ndarray]]:
+        if not os.path.exists(self._ivf_path):
+            return None
+        try:
+            with np.load(self._ivf_path) as data:
+                ivf = {key: data[key] for key in data.files}
+        except FileNotFoundError:
+            return None
+        return ivf if int(ivf["rows"]) <= rows else None
+
+    def _load(self):
+        if not os.path.exists(self._meta_path):
+            return
+        alive: List[bool] = []
+        self._files = self._inodes()
+        self._meta_offset = self._read_log(0, None, self._ids, self._documents, self._positions, alive)
+        self._alive = np.array(alive, dtype=bool)
+        self._remap()
+        self._ivf = self._read_ivf(len(self._ids))
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        (Writer) The index's current extent, for load_snapshot() in other
+        processes: rows, bytes of metadata log and the inodes of both files.
+        The IVF partition is brought up to date first, so readers load it
+        rather than each building their own.
+        """
+        if self.path is None or self.read_only:
+            raise PermissionError("snapshot() needs a writable, file-backed index")
+        with self._lock:
+            if self._mapped_rows != len(self._ids):
+                self._remap()
+            self._ensure_ivf(self._matrix, len(self._alive))
+            files = self._inodes()
+            return {
+                "rows": len(self._ids),
+                "meta_bytes": os.path.getsize(self._meta_path) if files else 0,
+                "files": list(files) if files else None,
+            }
+
+    def load_snapshot(self, snapshot: Dict[str, Any]) -> bool:
+        """
+        (Reader) Move to an extent published by snapshot(). Only the metadata
+        appended since the current one is read (all of it after a compact(),
+        which replaces the files), the matrix is mapped anew and the new state
+        replaces the old in one step, so searches in flight finish on the old
+        one. Returns False, changing nothing, when the files on disk are no
+        longer the ones the snapshot describes; a newer snapshot will follow.
+        """
+        rows = snapshot["rows"]
+        files = tuple(snapshot["files"]) if snapshot["files"] else None
+        ids: List[str] = []
+        documents: List[str] = []
+        positions: Dict[str, int] = {}
+        alive: List[bool] = []
+        offset = 0
+        if files is not None:
+            if self._inodes() != files:
+                return False
+            with self._lock:
+                if self._files == files and self._meta_offset <= snapshot["meta_bytes"]:
+                    ids, documents, positions = list(self._ids), list(self._documents), dict(self._positions)
+                    alive, offset = self._alive.tolist(), self._meta_offset
+            offset = self._read_log(offset, snapshot["meta_bytes"], ids, documents, positions, alive)
+            if len(ids) != rows or os.path.getsize(self._vectors_path) < rows * self.dim * 4:
+                return False
+        if rows:
+            matrix = np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dim))
+        else:
+            matrix = np.zeros((0, self.dim), dtype=np.float32)
+        # A compact() between the checks above and these reads would mix two generations of files.
+        if files is not None and self._inodes() != files:
+            return False
+        ivf = self._read_ivf(rows) if rows else None
+        with self._lock:
+            self._ids, self._documents, self._positions = ids, documents, positions
+            self._alive = np.array(alive, dtype=bool)
+            self._matrix, self._mapped_rows = matrix, rows
+            self._ivf = ivf
+            self._meta_offset, self._files = offset, files
+        return True
+
+    def _remap(self):
+        rows = len(self._ids)
+        if self.path is None or rows == 0:
+            return
+        self._matrix = np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dim))
+        self._mapped_rows = rows
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def __contains__(self, id: str) -> bool:
+        return id in self._positions
+
+    def add(self, ids: List[str], documents: List[str], vectors: np.ndarray) -> List[str]:
+        """Append new items; ids that are already present are skipped."""
+        if self.read_only:
+            raise PermissionError(f"{self.path} is opened read-only")
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        with self._lock:
+            fresh = []
+            seen = set()
+            for i, id in enumerate(ids):
+                if id not in self._positions and id not in seen:
+                    fresh.append(i)
+                    seen.add(id)
+            if not fresh:
+                return []
+            new_vectors = np.ascontiguousarray(vectors[fresh])
+            if self.path is not None:
+                with open(self._vectors_path, "ab") as f:
+                    f.write(new_vectors.tobytes())
+                with open(self._meta_path, "a", encoding="utf-8") as f:
+                    for i in fresh:
+                        f.write(json.dumps({"id": ids[i], "document": documents[i]}, ensure_ascii=False) + "\n")
+            else:
+                self._matrix = np.concatenate([self._matrix, new_vectors])
+            for i in fresh:
+                self._positions[ids[i]] = len(self._ids)
+                self._ids.append(ids[i])
+                self._documents.append(documents[i])
+            self._alive = np.concatenate([self._alive, np.ones(len(fresh), dtype=bool)])
+            return [ids[i] for i in fresh]
+
+    def delete(self, id: str) -> bool:
+        if self.read_only:
+            raise PermissionError(f"{self.path} is opened read-only")
+        with self._lock:
+            position = self._positions.pop(id, None)
+            if position is None:
+                return False
+            self._alive[position] = False
+            if self.path is not None:
+                with open(self._meta_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps({"id": id, "deleted": True}) + "\n")
+            return True
+
+    def items(self) -> List[Tuple[str, str]]:
+        return [(self._ids[p], self._documents[p]) for p in sorted(self._positions.values())]
+
+    def search(self, query: np.ndarray, k: int) -> List[Tuple[str, str, float]]:
+        return self.search_batch(np.asarray(query, dtype=np.float32).reshape(1, -1), k)[0]
+
+    def search_batch(self, queries: np.ndarray, k: int) -> List[List[Tuple[str, str, float]]]:
+        """Cosine top-k for a batch of L2-normalised queries."""
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.dim)
+        with self._lock:
+            if self.path is not None and self._mapped_rows != len(self._ids):
+                self._remap()
+            matrix, alive = self._matrix, self._alive
+            ids, documents = self._ids, self._documents
+            n = len(alive)
+            ivf = self._ensure_ivf(matrix, n)
+        if n == 0 or k <= 0:
+            return [[] for _ in range(len(queries))]
+        if ivf is None:
+            return self._exact_search(queries, k, matrix[:n], alive, np.arange(n), ids, documents)
+        covered = int(ivf["rows"])
+        order, offsets = ivf["order"], ivf["offsets"]
+        nprobe = min(self.nprobe, len(offsets) - 1)
+        probes = np.argpartition(-(queries @ ivf["centroids"].T), nprobe - 1, axis=1)[:, :nprobe]
+        results = []
+        for query, clusters in zip(queries, probes):
+            candidates = np.concatenate(
+                [order[offsets[c]:offsets[c + 1]] for c in clusters] + [np.arange(covered, n)]
+            )
+            candidates.sort()
+            results.extend(
+                self._exact_search(query[None, :], k, matrix[candidates], alive[candidates], candidates, ids, documents)
+            )
+        return results
+
+    @staticmethod
+    def _exact_search(queries, k, rows, alive, row_ids, ids, documents) -> List[List[Tuple[str, str, float]]]:
+        scores = queries @ rows.T
+        if not alive.all():
+            scores[:, ~alive] = -np.inf
+        k = min(k, int(alive.sum()))
+        if k == 0:
+            return [[] for _ in range(len(queries))]
+        m = scores.shape[1]
+        if k < m:
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        else:
+            top = np.broadcast_to(np.arange(m), (len(queries), m))
+        results = []
+        for row, candidates in zip(scores, top):
+            order = candidates[np.argsort(-row[candidates], kind="stable")]
+            results.append([(ids[row_ids[j]], documents[row_ids[j]], float(row[j])) for j in order])
+        return results
+
+    def _ensure_ivf(self, matrix: np.ndarray, n: int) -> Optional[Dict[str, np.ndarray]]:
+        if n < self.ivf_min_rows:
+            return None
+        if self._ivf is not None and n - int(self._ivf["rows"]) <= int(self._ivf["rows"]) // 5:
+            return self._ivf
+        self._ivf = self._build_ivf(matrix[:n])
+        if self.path is not None and not self.read_only:
+            tmp_path = self._ivf_path + ".tmp.npz"
+            np.savez(tmp_path, **self._ivf)
+            os.replace(tmp_path, self._ivf_path)
+        return self._ivf
+
+    @staticmethod
+    def _build_ivf(matrix: np.ndarray, iterations: int = 6, chunk: int = 16384) -> Dict[str, np.ndarray]:
+        n = len(matrix)
+        n_clusters = int(np.clip(np.sqrt(n), 16, 1024))
+        rng = np.random.default_rng(0)
+        sample = np.asarray(matrix[np.sort(rng.choice(n, size=min(n, 40 * n_clusters), replace=False))])
+        centroids = sample[rng.choice(len(sample), size=n_clusters, replace=False)].copy()
+        for _ in range(iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            empty = np.bincount(labels, minlength=n_clusters) == 0
+            sums[empty] = centroids[empty]
+            centroids = sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), 1e-12)
+        labels = np.concatenate(
+            [np.argmax(np.asarray(matrix[i:i + chunk]) @ centroids.T, axis=1) for i in range(0, n, chunk)]
+        )
+        order = np.argsort(labels, kind="stable").astype(np.int64)
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(labels, minlength=n_clusters))]).astype(np.int64)
+        return {"centroids": centroids.astype(np.float32), "order": order, "offsets": offsets, "rows": np.array(n)}
+
+    def compact(self):
+        """Rewrite the files without tombstoned rows."""
+        if self.read_only:
+            raise PermissionError(f"{self.path} is opened read-only")
+        with self._lock:
+            keep = np.flatnonzero(self._alive)
+            matrix = np.array(self._matrix[keep], dtype=np.float32)
+            ids = [self._ids[i] for i in keep]
+            documents = [self._documents[i] for i in keep]
+            if self.path is not None:
+                tmp_vectors, tmp_meta = self._vectors_path + ".tmp", self._meta_path + ".tmp"
+                with open(tmp_vectors, "wb") as f:
+                    f.write(matrix.tobytes())
+                with open(tmp_meta, "w", encoding="utf-8") as f:
+                    for id, document in zip(ids, documents):
+                        f.write(json.dumps({"id": id, "document": document}, ensure_ascii=False) + "\n")
+                os.replace(tmp_vectors, self._vectors_path)
+                os.replace(tmp_meta, self._meta_path)
+            self._ids, self._documents = ids, documents
+            self._positions = {id: i for i, id in enumerate(ids)}
+            self._alive = np.ones(len(ids), dtype=bool)
+            self._matrix = matrix
+            self._mapped_rows = 0 if self.path is not None else len(ids)
+            self._ivf = None
+            if self.path is not None and os.path.exists(self._ivf_path):
+                os.remove(self._ivf_path)
+
+
+class NumpyVectorStore(VannaBase):
+    """
+    Vanna vector store backed by VectorIndex collections for DDL, documentation
+    and question/SQL pairs, using the local HashingEmbedder by default.
+
+    Config keys: path (directory, None for in-memory), embedder, n_results,
+    n_results_ddl, n_results_documentation, n_results_sql, min_score, and
+    embedding_cache_path to keep the embedder's vectors in an EmbeddingCache
+    (worth it for a model-backed embedder; the hashing one is cheap).
+
+    Several processes can share one store directory: a single writer trains
+    and calls publish_snapshot(); stores opened with read_only=True map the
+    published files and switch to a newer snapshot on their next query
+    (checked at most every snapshot_interval seconds), without a restart.
+    """
+
+    def __init__(self, config=None):
+        VannaBase.__init__(self, config=config)
+        config = config or {}
+
+        path = config.get("path", "vector_store")
+        self.embedder = config.get("embedder") or HashingEmbedder(EMBEDDING_DIM)
+        if config.get("embedding_cache_path"):
+            self.embedder = CachedEmbedder(self.embedder, EmbeddingCache(config["embedding_cache_path"]))
+        dim = self.embedder.dim
+        self.n_results_ddl = config.get("n_results_ddl", config.get("n_results", 3))
+        self.n_results_documentation = config.get("n_results_documentation", config.get("n_results", 3))
+        self.n_results_sql = config.get("n_results_sql", config.get("n_results", 5))
+        self.min_score = config.get("min_score", 0.05)
+
+        self.read_only = config.get("read_only", False)
+        self.snapshot_interval = config.get("snapshot_interval", 1.0)
+        self.generation = 0
+        self._snapshot_path = os.path.join(path, SNAPSHOT_NAME) if path else None
+        self._snapshot_stamp: Optional[Tuple[int, int, int]] = None
+        self._snapshot_checked = 0.0
+        self._snapshot_lock = threading.Lock()
+        snapshot = self._read_snapshot() if self.read_only else None
+        if snapshot is not None:
+            self.generation = snapshot["generation"]
+
+        def collection(name):
+            if snapshot is not None:
+                return VectorIndex(os.path.join(path, name), dim, read_only=True, snapshot=snapshot["collections"][name])
+            return VectorIndex(os.path.join(path, name) if path else None, dim, read_only=self.read_only)
+
+        self.ddl_collection = collection("ddl")
+        self.documentation_collection = collection("documentation")
+        self.sql_collection = collection("sql")
+        self._schema_version: Optional[str] = None
+
+    def _collections(self) -> Dict[str, VectorIndex]:
+        return {"ddl": self.ddl_collection, "documentation": self.documentation_collection, "sql": self.sql_collection}
+
+    def _read_snapshot(self) -> Optional[Dict[str, Any]]:
+        if self._snapshot_path is None:
+            return None
+        try:
+            with open(self._snapshot_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def publish_snapshot(self) -> Optional[int]:
+        """
+        (Writer) Record the collections' current extent in snapshot.json,
+        replaced atomically, for read-only stores to move to. Returns the new
+        generation, or None when nothing changed since the last one.
+        """
+        if self._snapshot_path is None or self.read_only:
+            raise PermissionError("publish_snapshot() needs a writable, file-backed store")
+        collections = {name: index.snapshot() for name, index in self._collections().items()}
+        current = self._read_snapshot()
+        if current is not None and current["collections"] == collections:
+            return None
+        self.generation = (current["generation"] if current is not None else 0) + 1
+        tmp_path = self._snapshot_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"generation": self.generation, "published": time.time(), "collections": collections}, f)
+        os.replace(tmp_path, self._snapshot_path)
+        return self.generation
+
+    def refresh_snapshot(self, force: bool = False) -> bool:
+        """
+        (Reader) Switch to a newer published snapshot, if there is one. Costs
+        a stat() at most every snapshot_interval seconds unless forced;
+        returns True when the store moved.
+        """
+        if not self.read_only or self._snapshot_path is None:
+            return False
+        now = time.monotonic()
+        if not force and now - self._snapshot_checked < self.snapshot_interval:
+            return False
+        # One thread refreshes; the others keep searching the current snapshot.
+        if not self._snapshot_lock.acquire(blocking=False):
+            return False
+        try:
+            self._snapshot_checked = now
+            try:
+                stat = os.stat(self._snapshot_path)
+            except FileNotFoundError:
+                return False
+            stamp = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+            if stamp == self._snapshot_stamp:
+                return False
+            snapshot = self._read_snapshot()
+            if snapshot is None:
+                return False
+            if snapshot["generation"] <= self.generation:
+                self._snapshot_stamp = stamp
+                return False
+            moved = [index.load_snapshot(snapshot["collections"][name]) for name, index in self._collections().items()]
+            if not all(moved):
+                return False
+            self.generation = snapshot["generation"]
+            self._snapshot_stamp = stamp
+            self._schema_version = None
+            return True
+        finally:
+            self._snapshot_lock.release()
+
+    def generate_embedding(self, data: str, **kwargs) -> List[float]:
+        return self.embedder.embed(data).tolist()
+
+    def _add(self, index: VectorIndex, ids: List[str], documents: List[str], texts: List[str]) -> List[str]:
+        fresh = [i for i, id in enumerate(ids) if id not in index]
+        if fresh:
+            vectors = self.embedder.embed_batch([texts[i] for i in fresh])
+            index.add([ids[i] for i in fresh], [documents[i] for i in fresh], vectors)
+        return ids
+
+    def schema_version(self) -> str:
+        """Content hash of the trained DDL; changes whenever a table definition is added or removed."""
+        self.refresh_snapshot()
+        if self._schema_version is None:
+            ids = sorted(id for id, _ in self.ddl_collection.items())
+            self._schema_version = hashlib.sha256("\n".join(ids).encode("utf-8")).hexdigest()[:16]
+        return self._schema_version
+
+    def add_ddl(self, ddl: str, **kwargs) -> str:
+        id = deterministic_uuid(ddl) + "-ddl"
+        self._add(self.ddl_collection, [id], [ddl], [ddl])
+        self._schema_version = None
+        return id
+
+    def add_documentation(self, documentation: str, **kwargs) -> str:
+        id = deterministic_uuid(documentation) + "-doc"
+        self._add(self.documentation_collection, [id], [documentation], [documentation])
+        return id
+
+    def add_question_sql(self, question: str, sql: str, **kwargs) -> str:
+        question_sql_json = json.dumps({"question": question, "sql": sql}, ensure_ascii=False)
+        id = deterministic_uuid(question_sql_json) + "-sql"
+        self._add(self.sql_collection, [id], [question_sql_json], [f"{question}\n{sql}"])
+        return id
+
+    def add_ddl_batch(self, ddls: List[str]) -> List[str]:
+        ids = [deterministic_uuid(ddl) + "-ddl" for ddl in ddls]
+        self._add(self.ddl_collection, ids, ddls, ddls)
+        self._schema_version = None
+        return ids
+
+    def add_documentation_batch(self, documentation: List[str]) -> List[str]:
+        ids = [deterministic_uuid(doc) + "-doc" for doc in documentation]
+        return self._add(self.documentation_collection, ids, documentation, documentation)
+
+    def add_question_sql_batch(self, pairs: List[Tuple[str, str]]) -> List[str]:
+        documents = [json.dumps({"question": q, "sql": s}, ensure_ascii=False) for q, s in pairs]
+        ids = [deterministic_uuid(doc) + "-sql" for doc in documents]
+        return self._add(self.sql_collection, ids, documents, [f"{q}\n{s}" for q, s in pairs])
+
+    def _query(self, index: VectorIndex, question: str, k: int) -> List[str]:
+        self.refresh_snapshot()
+        query = self.embedder.embed(question)
+        return [doc for _, doc, score in index.search(query, k) if score >= self.min_score]
+
+    def get_related_ddl(self, question: str, **kwargs) -> list:
+        return self._query(self.ddl_collection, question, self.n_results_ddl)
+
+    def get_related_documentation(self, question: str, **kwargs) -> list:
+        return self._query(self.documentation_collection, question, self.n_results_documentation)
+
+    def get_similar_question_sql(self, question: str, **kwargs) -> list:
+        return [json.loads(doc) for doc in self._query(self.sql_collection, question, self.n_results_sql)]
+
+    def get_training_data(self, **kwargs) -> pd.DataFrame:
+        rows: List[Dict[str, Any]] = []
+        for id, doc in self.sql_collection.items():
+            pair = json.loads(doc)
+            rows.append({"id": id, "question": pair["question"], "content": pair["sql"], "training_data_type": "sql"})
+        for id, doc in self.ddl_collection.items():
+            rows.append({"id": id, "question": None, "content": doc, "training_data_type": "ddl"})
+        for id, doc in self.documentation_collection.items():
+            rows.append({"id": id, "question": None, "content": doc, "training_data_type": "documentation"})
+        return pd.DataFrame(rows, columns=["id", "question", "content", "training_data_type"])
+
+    def remove_training_data(self, id: str, **kwargs) -> bool:
+        if id.endswith("-sql"):
+            return self.sql_collection.delete(id)
+        elif id.endswith("-ddl"):
+            self._schema_version = None
+            return self.ddl_collection.delete(id)
+        elif id.endswith("-doc"):
+            return self.documentation_collection.delete(id)
+        return False
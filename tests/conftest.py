@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The scripts are flat modules that import each other by name, as when run from scripts/.
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "scripts"))
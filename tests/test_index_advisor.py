@@ -0,0 +1,29 @@
+import sqlite3
+
+from index_advisor import IndexAdvisor, WorkloadLog
+
+
+def test_recommended_indexes_quote_identifiers(tmp_path):
+    path = str(tmp_path / "orders.db")
+    conn = sqlite3.connect(path)
+    # A keyword table name and column names that need quoting.
+    conn.execute('CREATE TABLE "order" (id INTEGER PRIMARY KEY, "group" TEXT, "unit price" REAL, note TEXT)')
+    conn.executemany('INSERT INTO "order" ("group", "unit price", note) VALUES (?, ?, ?)',
+                     ((f"g{i % 50}", i * 0.5, "x" * 20) for i in range(5000)))
+    conn.commit()
+    conn.close()
+
+    workload = WorkloadLog(str(tmp_path / "workload.db"))
+    workload.record("SELECT \"unit price\" FROM \"order\" WHERE \"group\" = 'g7'", 5000)
+    advisor = IndexAdvisor(path, workload)
+    proposals = advisor.recommend()
+    assert [p["columns"][0] for p in proposals] == ["group"]
+    assert proposals[0]["sql"].startswith('CREATE INDEX IF NOT EXISTS "advisor_order_group')
+    assert 'ON "order" ("group"' in proposals[0]["sql"]
+
+    assert advisor.apply(proposals)
+    conn = sqlite3.connect(path)
+    indexed = [row[2] for row in conn.execute(f'PRAGMA index_info("{proposals[0]["name"]}")')]
+    conn.close()
+    assert indexed == list(proposals[0]["columns"])
+    workload.close()
@@ -0,0 +1,158 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from llm_stub_server import DEFAULT_RESPONSE, StubState, start_stub_server
+from llm_transport import LLMTransport, LLMTransportError
+
+
+def serve(**kwargs):
+    """A stub server that also counts the TCP connections it accepts."""
+    state = StubState(**kwargs)
+    server = start_stub_server(0, state)
+    server.connections = 0
+    accept = server.process_request
+
+    def counting(request, client_address):
+        server.connections += 1
+        accept(request, client_address)
+
+    server.process_request = counting
+    return server, state
+
+
+@pytest.fixture
+def stub():
+    servers = []
+
+    def start(**kwargs):
+        server, state = serve(**kwargs)
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_port}/v1", server, state
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def test_complete_chat_and_models(stub):
+    url, _, _ = stub()
+    transport = LLMTransport(url)
+    assert transport.complete("prompt") == DEFAULT_RESPONSE
+    assert transport.chat([{"role": "user", "content": "prompt"}]) == DEFAULT_RESPONSE
+    assert transport.list_models() == ["stub-model"]
+    transport.close()
+
+
+def test_retries_retryable_status_with_backoff(stub, monkeypatch):
+    url, _, state = stub(fail_first=2)
+    sleeps = []
+    monkeypatch.setattr("llm_transport.time.sleep", sleeps.append)
+    transport = LLMTransport(url, max_retries=3, backoff_base=0.25, backoff_max=0.4)
+    assert transport.complete("prompt") == DEFAULT_RESPONSE
+    assert state.requests == 3
+    assert transport.metrics()["retries_total"] == 2
+    # Full jitter: each wait is in [0, min(backoff_max, backoff_base * 2 ** attempt)].
+    assert 0 <= sleeps[0] <= 0.25 and 0 <= sleeps[1] <= 0.4
+    transport.close()
+
+
+def test_gives_up_after_max_retries(stub, monkeypatch):
+    url, _, state = stub(fail_first=10)
+    monkeypatch.setattr("llm_transport.time.sleep", lambda seconds: None)
+    transport = LLMTransport(url, max_retries=2)
+    with pytest.raises(LLMTransportError, match="after 3 attempt"):
+        transport.complete("prompt")
+    assert state.requests == 3
+    assert transport.metrics()["errors_total"] == 1
+    transport.close()
+
+
+def test_does_not_retry_client_errors(stub):
+    url, _, _ = stub()
+    transport = LLMTransport(url, max_retries=3)
+    with pytest.raises(LLMTransportError, match="after 1 attempt"):
+        transport.request("POST", "no/such/path", {})
+    assert transport.metrics()["retries_total"] == 0
+    transport.close()
+
+
+def test_connection_errors_are_retried_then_raised(monkeypatch):
+    monkeypatch.setattr("llm_transport.time.sleep", lambda seconds: None)
+    transport = LLMTransport("http://127.0.0.1:9/v1", max_retries=1, timeout=(0.5, 0.5))
+    with pytest.raises(LLMTransportError):
+        transport.complete("prompt")
+    assert transport.metrics()["retries_total"] == 1
+    transport.close()
+
+
+def test_keep_alive_pool_reuses_connections(stub):
+    url, server, _ = stub()
+    transport = LLMTransport(url, coalesce=False)
+    for i in range(10):
+        transport.complete(f"prompt {i}")
+    assert server.connections == 1
+    transport.close()
+
+
+def test_concurrency_is_bounded(stub):
+    url, _, _ = stub(latency=0.2)
+    transport = LLMTransport(url, max_concurrency=2, coalesce=False)
+    peak = []
+
+    def call(i):
+        transport.complete(f"prompt {i}")
+        peak.append(transport.metrics()["in_flight"])
+
+    started = time.monotonic()
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert time.monotonic() - started >= 0.4
+    assert max(peak) <= 2
+    assert transport.metrics()["requests_total"] == 4
+    transport.close()
+
+
+def test_identical_concurrent_requests_are_coalesced(stub):
+    url, _, state = stub(latency=0.2)
+    transport = LLMTransport(url)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(transport.complete("same prompt"))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == [DEFAULT_RESPONSE] * 4
+    assert state.requests == 1
+    assert transport.metrics()["coalesced_total"] == 3
+    transport.close()
+
+
+def test_async_calls_run_concurrently(stub):
+    url, _, _ = stub(latency=0.2)
+    transport = LLMTransport(url, max_concurrency=4, coalesce=False)
+
+    async def main():
+        return await asyncio.gather(*(transport.acomplete(f"prompt {i}") for i in range(4)))
+
+    started = time.monotonic()
+    assert asyncio.run(main()) == [DEFAULT_RESPONSE] * 4
+    assert time.monotonic() - started < 0.6
+    transport.close()
+
+
+def test_streaming_and_batch(stub):
+    url, _, _ = stub(responses=["SELECT 1", "SELECT 2"])
+    transport = LLMTransport(url)
+    prompts = ["a", "b", "c", "d"]
+    batch = transport.complete_batch(prompts)
+    assert batch == [transport.complete(prompt) for prompt in prompts]
+    assert "".join(transport.stream_complete("a")) == batch[0]
+    assert "".join(transport.stream_chat([{"role": "user", "content": "a"}])).strip() in ("SELECT 1", "SELECT 2")
+    transport.close()
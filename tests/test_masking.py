@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+
+from masking import Masker
+
+
+def test_text_round_trip():
+    masker = Masker()
+    text = "PART-12 is supplied by ann@example.com; PART-7 and PART-12 again"
+    masked = masker.mask_text(text)
+    assert masked == "[PART_1] is supplied by [EMAIL_1]; [PART_2] and [PART_1] again"
+    assert masker.unmask_text(masked) == text
+    assert len(masker) == 3
+
+
+def test_tokens_are_stable_across_calls():
+    masker = Masker()
+    first = masker.mask_text("PART-1 PART-2")
+    assert masker.mask_text("PART-2 PART-3 PART-1") == "[PART_2] [PART_3] [PART_1]"
+    assert first == "[PART_1] [PART_2]"
+    assert masker.unmask_text("[PART_3] [PART_9]") == "PART-3 [PART_9]"
+
+
+def test_frame_round_trip():
+    masker = Masker()
+    df = pd.DataFrame({
+        "part_number": ["PART-1", "PART-2", None, "PART-1"],
+        "notes": ["ask bob@example.com", "no contact", "PART-2 replaces PART-3", "ask bob@example.com"],
+        "contact": ["a@example.com", "b@example.com", "a@example.com", np.nan],
+        "qty": [1, 2, 3, 4],
+    })
+    masked = masker.mask_frame(df)
+    assert masked["part_number"].tolist()[:2] == ["[PART_1]", "[PART_2]"]
+    assert pd.isna(masked["part_number"][2])
+    assert masked["notes"].tolist() == ["ask [EMAIL_1]", "no contact", "[PART_2] replaces [PART_3]", "ask [EMAIL_1]"]
+    assert masked["contact"].tolist()[:3] == ["[EMAIL_2]", "[EMAIL_3]", "[EMAIL_2]"]
+    assert masked["qty"].tolist() == [1, 2, 3, 4]
+    for column in ("part_number", "notes", "contact"):
+        restored = [masker.unmask_text(v) if isinstance(v, str) else v for v in masked[column]]
+        assert restored[:3] == df[column].tolist()[:3]
+    assert masker.mask_text("PART-3 and bob@example.com") == "[PART_3] and [EMAIL_1]"
+
+
+def test_digest_keys_and_values():
+    masker = Masker()
+    digest = {"top": {"PART-5": 3}, "rows": ["PART-5 by c@example.com"]}
+    assert masker.mask_digest(digest) == {"top": {"[PART_1]": 3}, "rows": ["[PART_1] by [EMAIL_1]"]}
@@ -0,0 +1,65 @@
+import threading
+import time
+
+from single_flight import SingleFlight
+
+
+def slow_stream(items, closed, delay=0.02):
+    try:
+        for item in items:
+            time.sleep(delay)
+            yield item
+    finally:
+        closed.set()
+
+
+def test_followers_replay_the_leaders_stream():
+    flights = SingleFlight()
+    closed = threading.Event()
+    leader = flights.stream("k", lambda: slow_stream(range(5), closed))
+    first = next(leader)
+    follower = flights.stream("k", lambda: slow_stream(range(99), closed))
+    followed = [next(follower)]
+    reader = threading.Thread(target=lambda: followed.extend(follower))
+    reader.start()
+    assert [first, *leader] == [0, 1, 2, 3, 4]
+    reader.join(1)
+    assert followed == [0, 1, 2, 3, 4]
+    assert flights.leaders == 1 and flights.followers == 1
+    assert closed.is_set()
+
+
+def test_followers_get_the_whole_stream_when_the_leader_disconnects():
+    flights = SingleFlight()
+    closed = threading.Event()
+    leader = flights.stream("k", lambda: slow_stream(range(10), closed))
+    assert next(leader) == 0
+    follower = flights.stream("k", lambda: slow_stream(range(99), closed))
+    assert next(follower) == 0
+    leader.close()  # the leader's client went away mid-stream
+    assert not closed.is_set()
+    assert [0, *follower] == list(range(10))
+    assert closed.wait(1)
+
+
+def test_upstream_closes_once_every_reader_stopped():
+    flights = SingleFlight()
+    closed = threading.Event()
+    leader = flights.stream("k", lambda: slow_stream(range(1000), closed))
+    next(leader)
+    follower = flights.stream("k", lambda: slow_stream(range(99), closed))
+    next(follower)
+    leader.close()
+    follower.close()
+    assert closed.wait(1)
+    # A new caller starts a fresh upstream instead of joining the closed one.
+    assert list(flights.stream("k", lambda: iter([7]))) == [7]
+
+
+def test_leader_alone_closes_upstream_immediately():
+    flights = SingleFlight()
+    closed = threading.Event()
+    leader = flights.stream("k", lambda: slow_stream(range(1000), closed))
+    next(leader)
+    leader.close()
+    assert closed.is_set()
@@ -0,0 +1,48 @@
+import sqlite3
+
+import pytest
+
+from sql_executor import QueryTimeoutError, ReadOnlyConnectionPool
+
+# A cross join SQLite cannot finish within the test's time budget.
+RUNAWAY_SQL = "SELECT a.n, b.n, c.n FROM nums a, nums b, nums c WHERE a.n + b.n + c.n < 0"
+
+
+@pytest.fixture
+def pool(tmp_path):
+    path = str(tmp_path / "nums.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE nums (n INTEGER)")
+    conn.executemany("INSERT INTO nums VALUES (?)", ((i,) for i in range(2000)))
+    conn.commit()
+    conn.close()
+    pool = ReadOnlyConnectionPool(path, query_timeout=0.2)
+    yield pool
+    pool.close()
+
+
+def test_execute_is_bounded(pool):
+    with pytest.raises(QueryTimeoutError):
+        pool.execute(RUNAWAY_SQL)
+
+
+def test_iter_rows_is_bounded(pool):
+    with pytest.raises(QueryTimeoutError):
+        list(pool.iter_rows(RUNAWAY_SQL))
+
+
+def test_iter_frames_is_bounded(pool):
+    with pytest.raises(QueryTimeoutError):
+        list(pool.iter_frames(RUNAWAY_SQL))
+
+
+def test_export_parquet_is_bounded(pool, tmp_path):
+    pytest.importorskip("pyarrow")
+    with pytest.raises(QueryTimeoutError):
+        pool.export_parquet(RUNAWAY_SQL, str(tmp_path / "out.parquet"))
+
+
+def test_iter_rows_streams_chunks(pool):
+    chunks = list(pool.iter_rows("SELECT n FROM nums ORDER BY n", chunk_size=500))
+    assert [len(rows) for _, rows in chunks] == [500] * 4
+    assert chunks[0][0] == ["n"] and chunks[-1][1][-1] == (1999,)
@@ -0,0 +1,103 @@
+import sqlite3
+
+import pytest
+
+from sql_guard import SQLGuard, SQLGuardError
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    # Row counts come from MAX(rowid) without ANALYZE, so a few rows stand in for big tables.
+    path = str(tmp_path / "parts.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE parts (part_id INTEGER PRIMARY KEY, name TEXT, distributor_id INTEGER)")
+    conn.execute("CREATE TABLE distributors (distributor_id INTEGER PRIMARY KEY, name TEXT)")
+    conn.execute("CREATE VIEW part_names AS SELECT name FROM parts")
+    conn.executemany("INSERT INTO parts VALUES (?, ?, ?)", [(1, "Bolt", 1), (2000, "Nut", 200)])
+    conn.executemany("INSERT INTO distributors VALUES (?, ?)", [(1, "Acme"), (200, "Globex")])
+    conn.commit()
+    conn.close()
+    return path
+
+
+@pytest.fixture
+def guard(db_path):
+    guard = SQLGuard(db_path, large_table_rows=1000)
+    yield guard
+    guard.close()
+
+
+def test_allows_plain_select(guard):
+    report = guard.analyze("SELECT name FROM parts WHERE part_id = 1")
+    assert report["tables"] == ["parts"]
+    assert report["columns"] == ["parts.name", "parts.part_id"]
+    assert report["cost"] == 1
+
+
+@pytest.mark.parametrize("sql", [
+    "DELETE FROM parts",
+    "PRAGMA table_info(parts)",
+    "SELECT * FROM parts; DROP TABLE parts",
+    "SELECT load_extension('x')",
+    "SELECT * FROM sqlite_master",
+    "SELECT * FROM no_such_table",
+    "SELECT no_such_column FROM parts",
+])
+def test_denies(guard, sql):
+    with pytest.raises(SQLGuardError):
+        guard.analyze(sql)
+
+
+def test_allowed_tables(db_path):
+    guard = SQLGuard(db_path, allowed_tables=["distributors"])
+    try:
+        guard.analyze("SELECT name FROM distributors")
+        with pytest.raises(SQLGuardError):
+            guard.analyze("SELECT name FROM parts")
+        with pytest.raises(SQLGuardError):
+            guard.analyze("WITH x AS (SELECT * FROM parts) SELECT * FROM x")
+        with pytest.raises(SQLGuardError):
+            guard.analyze("WITH x AS (SELECT * FROM sqlite_master) SELECT * FROM x")
+    finally:
+        guard.close()
+
+
+def test_view_reads_are_checked_as_the_view(db_path):
+    guard = SQLGuard(db_path, allowed_tables=["part_names"])
+    try:
+        assert guard.analyze("SELECT name FROM part_names")["tables"] == ["part_names"]
+    finally:
+        guard.close()
+
+
+def test_leaf_scan_cost(guard):
+    report = guard.analyze("SELECT * FROM parts")
+    assert report["cost"] == 2000
+    assert report["full_scans"] == [("parts", 2000)]
+
+
+def test_join_cost(guard):
+    report = guard.analyze("SELECT p.name, d.name FROM parts p JOIN distributors d ON d.distributor_id = p.distributor_id")
+    assert report["cost"] == 2000 + 2000
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT * FROM parts, distributors",
+    "WITH x AS (SELECT p.name FROM parts p, distributors d) SELECT * FROM x",
+])
+def test_cross_join_cost(guard, sql):
+    report = guard.analyze(sql)
+    assert report["tables"] == ["distributors", "parts"]
+    assert report["cost"] >= 2000 * 200
+    assert ("parts", 2000) in report["full_scans"]
+
+
+def test_check_limits_or_refuses(db_path):
+    guard = SQLGuard(db_path, large_table_rows=1000, max_rows=10)
+    try:
+        assert guard.check("SELECT * FROM parts").endswith("LIMIT 10")
+        guard.max_cost = 1000
+        with pytest.raises(SQLGuardError, match="too expensive"):
+            guard.check("SELECT * FROM parts, distributors")
+    finally:
+        guard.close()
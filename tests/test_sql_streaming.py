@@ -0,0 +1,32 @@
+import pytest
+
+from sql_streaming import clean_sql, take_sql_statement
+
+
+@pytest.mark.parametrize("text, sql", [
+    ("SELECT 1", "SELECT 1"),
+    (" SELECT name FROM parts;", "SELECT name FROM parts;"),
+    ("Here is a query that works with your table: ```sql SELECT name FROM parts```", "SELECT name FROM parts"),
+    ("Here is a query that works with your table:\n```sql\nSELECT name FROM parts;\n```\nIt lists names.", "SELECT name FROM parts;"),
+    ("This works with your table:\nSELECT name FROM parts", "SELECT name FROM parts"),
+    ("Sure, with a CTE:\nWITH big AS (SELECT * FROM parts) SELECT * FROM big", "WITH big AS (SELECT * FROM parts) SELECT * FROM big"),
+    ("The query is: SELECT 1", "SELECT 1"),
+    ("with recursive n(x) as (select 1) select x from n", "with recursive n(x) as (select 1) select x from n"),
+])
+def test_clean_sql(text, sql):
+    assert clean_sql(text) == sql
+
+
+def test_take_sql_statement_stops_after_the_statement():
+    closed = []
+
+    def tokens():
+        try:
+            yield from ["Works with your table:\n", "```sql\n", "SELECT name ", "FROM parts;", "\n```", " Extra prose."]
+        finally:
+            closed.append(True)
+
+    taken = list(take_sql_statement(tokens()))
+    assert clean_sql("".join(taken)) == "SELECT name FROM parts;"
+    assert taken[-1] == "FROM parts;"
+    assert closed == [True]
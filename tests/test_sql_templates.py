@@ -0,0 +1,66 @@
+import sqlite3
+
+import pytest
+
+from batch import answer_batch
+from sql_executor import ReadOnlyConnectionPool
+from sql_templates import SQLTemplates, TemplateSQLMixin
+
+LLM_SQL = "SELECT COUNT(*) FROM batteries WHERE type = 'LFP'"
+
+
+class StubBackend:
+    """A backend like VannaBase + a chat mixin: generate_sql only, no batch call."""
+
+    def __init__(self):
+        self.asked = []
+
+    def generate_sql(self, question, **kwargs):
+        self.asked.append(question)
+        return LLM_SQL
+
+
+class StubVanna(TemplateSQLMixin, StubBackend):
+    pass
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "batteries.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE batteries (id INTEGER PRIMARY KEY, manufacturer TEXT, type TEXT, capacity_kwh REAL)")
+    conn.executemany(
+        "INSERT INTO batteries (manufacturer, type, capacity_kwh) VALUES (?, ?, ?)",
+        [("Tesla", "NMC", 60), ("Tesla", "LFP", 80), ("LG Energy", "LFP", 120)],
+    )
+    conn.commit()
+    conn.close()
+    return path
+
+
+@pytest.fixture
+def vn(db_path):
+    vn = StubVanna()
+    vn.template_matcher = SQLTemplates(db_path, ["SELECT COUNT(*) FROM batteries WHERE capacity_kwh > 50"])
+    return vn
+
+
+def test_batch_without_backend_batch_call(vn):
+    sqls = vn.generate_sql_batch(["How many batteries have capacity above 70?", "Which battery type is most common?"])
+    assert sqls == ["SELECT COUNT(*) FROM batteries WHERE capacity_kwh > 70", LLM_SQL]
+    assert vn.asked == ["Which battery type is most common?"]
+
+
+def test_answer_batch_with_hit_and_miss(vn, db_path):
+    pool = ReadOnlyConnectionPool(db_path, size=2)
+    try:
+        results = answer_batch(vn, ["How many batteries have capacity above 70?", "Which battery type is most common?"], pool)
+    finally:
+        pool.close()
+    assert [r["error"] for r in results] == [None, None]
+    assert [r["rows"] for r in results] == [[(2,)], [(2,)]]
+
+
+def test_negation_and_time_qualifiers_miss(vn):
+    assert vn.template_sql("How many batteries have no capacity above 50?") is None
+    assert vn.template_sql("How many batteries have capacity above 100 last year?") is None